@@ -1,12 +1,28 @@
 """
 Compress PDF API endpoints - Reduce PDF file size
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import get_db, SessionLocal
 from app.db.models import Job
 from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, abandon_job, finish_job, cancel_job
+from app.services.uploads import ARCHIVE_KINDS, PDF_KINDS, extract_archive, save_upload
+from app.services.result_cache import result_cache
+from app.services.zip_generator import zip_generator
+from app.tools.pdf_compressor import COMPRESSION_METHODS, estimate_compression
+from typing import List
+import asyncio
+import json
+import shutil
 import uuid
 import os
 from datetime import datetime, timedelta
@@ -14,6 +30,67 @@ import fitz
 
 router = APIRouter()
 
+# A batch is done once none of its files is in one of these
+UNFINISHED_STATUSES = ("pending", "queued", "processing")
+
+
+def _compress_mode(quality: str, compress_by_percent: int, max_file_size_mb: float) -> str:
+    """Validate the compression options and encode them for Job.output_format."""
+    if not compress_by_percent and not max_file_size_mb:
+        if quality not in ['low', 'medium', 'high']:
+            raise HTTPException(
+                status_code=400,
+                detail="Quality must be 'low', 'medium', or 'high'"
+            )
+    
+    if compress_by_percent:
+        return f"percent:{compress_by_percent}"
+    elif max_file_size_mb:
+        return f"maxsize:{max_file_size_mb}"
+    else:
+        return f"quality:{quality}"
+
+
+def _compress_options(method: str, optimize: bool, strip_metadata: bool, compress_mode: str) -> dict:
+    """Validate the method and lossless options, stored as Job.params."""
+    if method not in COMPRESSION_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail="Method must be 'rasterize', 'images' or 'lossless'"
+        )
+    if method == 'lossless' and not compress_mode.startswith('quality:'):
+        raise HTTPException(
+            status_code=400,
+            detail="The lossless method does not take a target size"
+        )
+    return {"method": method, "optimize": optimize, "strip_metadata": strip_metadata}
+
+
+def _job_options(job: Job) -> dict:
+    options = {"method": "rasterize", "optimize": False, "strip_metadata": False}
+    if job.params:
+        options.update(json.loads(job.params))
+    return options
+
+
+def _complete_from_cache(job: Job) -> bool:
+    """Same PDF compressed with the same settings before: reuse that result."""
+    compression_info = result_cache.lookup(
+        "compress_pdf",
+        [job.input_path],
+        {"mode": job.output_format or 'quality:medium', **_job_options(job)},
+        job.output_dir,
+        digests=[job.input_sha256] if job.input_sha256 else None
+    )
+    if compression_info is None:
+        return False
+    
+    job.status = "completed"
+    job.processed_pages = job.total_pages
+    job.zip_path = f"{job.output_dir}/compressed.pdf"
+    job.page_order = json.dumps(compression_info)
+    return True
+
 
 @router.post("/compress-pdf/jobs", response_model=JobStatus)
 async def create_compress_job(
@@ -21,6 +98,9 @@ async def create_compress_job(
     quality: str = Form('medium'),
     compress_by_percent: int = Form(None),
     max_file_size_mb: float = Form(None),
+    method: str = Form('rasterize'),
+    optimize: bool = Form(False),
+    strip_metadata: bool = Form(False),
     db: Session = Depends(get_db)
 ):
     """
@@ -29,18 +109,20 @@ async def create_compress_job(
     - quality: 'low', 'medium', 'high' (used if compress_by_percent and max_file_size_mb are None)
     - compress_by_percent: Target compression percentage (e.g., 50 = reduce by 50%)
     - max_file_size_mb: Target maximum file size in MB (e.g., 5.0 = max 5MB)
+    - method: 'rasterize' (every page becomes an image), 'images'
+      (only embedded images are recompressed; text and vectors are kept)
+      or 'lossless' (unused/duplicate objects, stream deflation, font
+      subsetting and object streams; nothing is re-encoded)
+    - optimize: with 'images', run the lossless pass first
+    - strip_metadata: the lossless pass also removes document metadata
     """
     # Validate PDF
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
     
-    # Validate quality if using quality mode
-    if not compress_by_percent and not max_file_size_mb:
-        if quality not in ['low', 'medium', 'high']:
-            raise HTTPException(
-                status_code=400,
-                detail="Quality must be 'low', 'medium', or 'high'"
-            )
+    # Validate options; the mode is stored in output_format
+    compress_mode = _compress_mode(quality, compress_by_percent, max_file_size_mb)
+    options = _compress_options(method, optimize, strip_metadata, compress_mode)
     
     job_id = str(uuid.uuid4())
     job_dir = f"storage/jobs/{job_id}"
@@ -48,25 +130,15 @@ async def create_compress_job(
     
     input_path = f"{job_dir}/input.pdf"
     
-    # Save uploaded file
-    content = await file.read()
-    with open(input_path, "wb") as f:
-        f.write(content)
+    # Save uploaded file (streamed to disk, size-limited)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
     # Get page count and file size
     pdf = fitz.open(input_path)
     total_pages = len(pdf)
     pdf.close()
     
-    original_size = len(content)
-    
-    # Store compression mode in output_format
-    if compress_by_percent:
-        compress_mode = f"percent:{compress_by_percent}"
-    elif max_file_size_mb:
-        compress_mode = f"maxsize:{max_file_size_mb}"
-    else:
-        compress_mode = f"quality:{quality}"
+    original_size = upload.size
     
     # Create job record
     job = Job(
@@ -76,10 +148,12 @@ async def create_compress_job(
         original_filename=file.filename,
         mime_type=file.content_type,
         file_size_bytes=original_size,
+        input_sha256=upload.sha256,
         input_path=input_path,
         output_dir=job_dir,
         total_pages=total_pages,
         output_format=compress_mode,  # Store compression mode
+        params=json.dumps(options),
         created_at=datetime.utcnow(),
         expires_at=datetime.utcnow() + timedelta(minutes=5)
     )
@@ -100,13 +174,13 @@ async def create_compress_job(
     )
 
 
-@router.post("/compress-pdf/jobs/{job_id}/process")
-async def process_compress_job(
+@router.post("/compress-pdf/jobs/{job_id}/process", status_code=202)
+def process_compress_job(
     job_id: str,
     db: Session = Depends(get_db)
 ):
     """
-    Start PDF compression.
+    Queue PDF compression. Poll the job status endpoint for completion.
     """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -115,10 +189,28 @@ async def process_compress_job(
     if job.status != "pending":
         raise HTTPException(status_code=400, detail="Job already processed")
     
+    if _complete_from_cache(job):
+        db.commit()
+        return {"status": "completed", "job_id": job_id, "cached": True}
+    
     # Update job status
-    job.status = "processing"
+    job.status = "queued"
     db.commit()
     
+    job_queue.notify()
+    
+    return {"status": "queued", "job_id": job_id}
+
+
+def run_compress_job(job_id: str):
+    """Job queue handler: compress the job's PDF and store the results."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+    
     # Compress PDF
     from app.tools.pdf_compressor import compress_pdf
     
@@ -139,9 +231,9 @@ async def process_compress_job(
     else:
         quality = compress_mode  # Backwards compatibility
     
-    def progress_callback(current, total):
-        job.processed_pages = current
-        db.commit()
+    options = _job_options(job)
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner)
     
     try:
         result = compress_pdf(
@@ -150,33 +242,65 @@ async def process_compress_job(
             quality=quality,
             compress_by_percent=compress_by_percent,
             max_file_size_mb=max_file_size_mb,
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            **options
         )
         
-        job.status = "completed"
         job.processed_pages = job.total_pages
         job.zip_path = output_path
         # Store compression results in page_order field as JSON
-        import json
-        job.page_order = json.dumps({
+        compression_info = {
             'original_size': result['original_size'],
             'compressed_size': result['compressed_size'],
             'reduction_percent': result['reduction_percent'],
             'quality': result['quality']
-        })
-        db.commit()
-        
-        return {
-            "status": "completed",
-            "job_id": job_id,
-            **result
         }
+        # The process endpoint no longer returns the result, so keep the warning for polling
+        if result.get('warning'):
+            compression_info['warning'] = result['warning']
+        for key in ('images', 'structure', 'page_classes'):
+            if result.get(key):
+                compression_info[key] = result[key]
+        job.page_order = json.dumps(compression_info)
         
+        if finish_job(db, job, owner, "completed", output_path, output_path + ".tmp"):
+            result_cache.store(
+                "compress_pdf",
+                [job.input_path],
+                {"mode": compress_mode, **options},
+                [output_path],
+                compression_info,
+                digests=[job.input_sha256] if job.input_sha256 else None
+            )
+        
+    except JobCancelled:
+        abandon_job(db, job, owner, output_path, output_path + ".tmp")
     except Exception as e:
-        job.status = "failed"
         job.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_job(db, job, owner, "failed", output_path, output_path + ".tmp")
+    finally:
+        if job.batch_id:
+            _finish_batch(db, job.batch_id)
+        db.close()
+
+
+@router.delete("/compress-pdf/jobs/{job_id}")
+def cancel_compress_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a compression job that has not finished yet.
+    A running job stops at the next page and its partial output is deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    if job.batch_id:
+        _finish_batch(db, job.batch_id)
+    
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @router.get("/compress-pdf/jobs/{job_id}")
@@ -217,8 +341,36 @@ async def get_compress_job_status(job_id: str, db: Session = Depends(get_db)):
     }
 
 
+@router.get("/compress-pdf/jobs/{job_id}/estimate")
+async def estimate_compress_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Estimated output size of each quality preset, from a few sampled pages,
+    so the UI can show it before the job is processed.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not job.input_path or not os.path.exists(job.input_path):
+        raise HTTPException(status_code=404, detail="Uploaded PDF not found")
+
+    # Runs on the executor's reserved compress_estimate worker, not behind queued jobs
+    future = executor.submit("compress_estimate", estimate_compression, job.input_path)
+    try:
+        estimate = await asyncio.wait_for(
+            asyncio.wrap_future(future), settings.COMPRESS_ESTIMATE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        executor.cancel(future)
+        raise HTTPException(status_code=503, detail="Compression estimate timed out, try again later")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not estimate compression: {e}")
+
+    return {"job_id": job.id, **estimate}
+
+
 @router.get("/compress-pdf/jobs/{job_id}/download")
-async def download_compressed_pdf(job_id: str, db: Session = Depends(get_db)):
+def download_compressed_pdf(job_id: str, request: Request, db: Session = Depends(get_db)):
     """Download compressed PDF."""
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -235,8 +387,325 @@ async def download_compressed_pdf(job_id: str, db: Session = Depends(get_db)):
     base_name = os.path.splitext(job.original_filename)[0]
     filename = f"{base_name}_compressed_{quality}.pdf"
     
-    return FileResponse(
+    return file_download(
+        request,
         job.zip_path,
         media_type="application/pdf",
         filename=filename
     )
+
+
+def _finish_batch(db: Session, batch_id: str):
+    """
+    Mark a batch completed once none of its files is still waiting or running.
+    Called by every file as it finishes; the compare-and-set on the batch's
+    status means only one of them does it.
+    """
+    unfinished = (
+        db.query(Job.id)
+        .filter(Job.batch_id == batch_id, Job.status.in_(UNFINISHED_STATUSES))
+        .exists()
+    )
+    total_pages = (
+        db.query(func.coalesce(func.sum(Job.total_pages), 0))
+        .filter(Job.batch_id == batch_id)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Job)
+        .where(Job.id == batch_id, Job.status == "processing", ~unfinished)
+        .values(status="completed", processed_pages=total_pages)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _create_batch_files(
+    db: Session,
+    batch: Job,
+    sources: List[tuple],
+    compress_mode: str,
+    options: dict,
+    expires_at: datetime
+) -> List[Job]:
+    """
+    Move each saved PDF into its own compress_pdf job (queued, or completed
+    straight from the result cache) and attach it to the batch.
+    """
+    files = []
+    for filename, upload in sources:
+        job_id = str(uuid.uuid4())
+        job_dir = f"storage/jobs/{job_id}"
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = f"{job_dir}/input.pdf"
+        os.replace(upload.path, input_path)
+        
+        job = Job(
+            id=job_id,
+            tool="compress_pdf",
+            status="queued",
+            batch_id=batch.id,
+            original_filename=filename,
+            mime_type="application/pdf",
+            file_size_bytes=upload.size,
+            input_sha256=upload.sha256,
+            input_path=input_path,
+            output_dir=job_dir,
+            output_format=compress_mode,
+            params=json.dumps(options),
+            created_at=datetime.utcnow(),
+            expires_at=expires_at
+        )
+        
+        try:
+            pdf = fitz.open(input_path)
+            job.total_pages = len(pdf)
+            pdf.close()
+        except Exception as e:
+            job.status = "failed"
+            job.total_pages = 0
+            job.error_message = f"Invalid PDF: {e}"
+        
+        if job.status == "queued":
+            _complete_from_cache(job)
+        
+        db.add(job)
+        files.append(job)
+    
+    batch.total_pages = sum(job.total_pages for job in files)
+    db.commit()
+    return files
+
+
+@router.post("/compress-pdf/batch", status_code=202)
+async def create_compress_batch(
+    files: List[UploadFile] = File(...),
+    quality: str = Form('medium'),
+    compress_by_percent: int = Form(None),
+    max_file_size_mb: float = Form(None),
+    method: str = Form('rasterize'),
+    optimize: bool = Form(False),
+    strip_metadata: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """
+    Compress many PDFs with the same options in one batch.
+    Upload PDFs and/or ZIP archives of PDFs. Each PDF becomes a compress job
+    on the shared job queue, so files run in parallel on the worker pool
+    (bounded like any other compress job). Poll the batch status endpoint for
+    overall and per-file progress, then download one ZIP.
+    """
+    compress_mode = _compress_mode(quality, compress_by_percent, max_file_size_mb)
+    options = _compress_options(method, optimize, strip_metadata, compress_mode)
+    
+    batch_id = str(uuid.uuid4())
+    batch_dir = f"storage/jobs/{batch_id}"
+    os.makedirs(batch_dir, exist_ok=True)
+    max_files = settings.COMPRESS_BATCH_MAX_FILES
+    
+    sources = []
+    skipped = []
+    try:
+        for index, file in enumerate(files):
+            upload_path = f"{batch_dir}/upload_{index}"
+            try:
+                upload = await save_upload(
+                    file, upload_path, kinds=PDF_KINDS | ARCHIVE_KINDS,
+                    max_bytes=settings.MAX_REQUEST_SIZE_MB * 1024 * 1024
+                )
+            except HTTPException as e:
+                skipped.append({"filename": file.filename, "error": e.detail})
+                continue
+            
+            if upload.kind == "pdf":
+                if upload.size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+                    os.remove(upload_path)
+                    skipped.append({
+                        "filename": file.filename,
+                        "error": f"{file.filename} is larger than {settings.MAX_UPLOAD_SIZE_MB} MB"
+                    })
+                    continue
+                sources.append((file.filename, upload))
+            else:
+                archive_dir = f"{batch_dir}/archive_{index}"
+                os.makedirs(archive_dir, exist_ok=True)
+                extracted, archive_skipped = await run_in_threadpool(
+                    extract_archive, upload_path, archive_dir, PDF_KINDS,
+                    max_files - len(sources),
+                    settings.MAX_REQUEST_SIZE_MB * 1024 * 1024
+                )
+                os.remove(upload_path)
+                sources.extend(extracted)
+                skipped.extend(archive_skipped)
+            
+            if len(sources) > max_files:
+                raise HTTPException(status_code=400, detail=f"At most {max_files} PDFs per batch")
+        
+        if not sources:
+            raise HTTPException(status_code=400, detail="No PDF files in the upload")
+        
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=settings.TOOL_JOB_TTL_MINUTES)
+        batch = Job(
+            id=batch_id,
+            tool="compress_pdf_batch",
+            status="processing",
+            original_filename=files[0].filename if len(files) == 1 else "compressed_pdfs",
+            input_path=batch_dir,
+            output_dir=batch_dir,
+            output_format=compress_mode,
+            params=json.dumps({"skipped": skipped, **options}),
+            created_at=now,
+            expires_at=expires_at
+        )
+        db.add(batch)
+        
+        batch_files = await run_in_threadpool(
+            _create_batch_files, db, batch, sources, compress_mode, options, expires_at
+        )
+    finally:
+        # Only the per-file job directories are kept
+        shutil.rmtree(batch_dir, ignore_errors=True)
+    
+    _finish_batch(db, batch_id)  # Every file may have been a cache hit
+    job_queue.notify()
+    
+    return {
+        "batch_id": batch_id,
+        "status": "queued",
+        "total_files": len(batch_files),
+        "total_pages": batch.total_pages,
+        "skipped": skipped
+    }
+
+
+def _get_batch(db: Session, batch_id: str) -> Job:
+    batch = db.query(Job).filter(Job.id == batch_id, Job.tool == "compress_pdf_batch").first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@router.get("/compress-pdf/batch/{batch_id}")
+def get_compress_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    """Get overall batch progress and each file's status and results."""
+    batch = _get_batch(db, batch_id)
+    
+    # Also catches files whose worker died (failed by the job queue, not the handler)
+    if batch.status == "processing":
+        _finish_batch(db, batch_id)
+        db.refresh(batch)
+    
+    batch_files = db.query(Job).filter(Job.batch_id == batch_id).order_by(Job.created_at).all()
+    
+    items = []
+    counts = {"completed": 0, "failed": 0, "cancelled": 0}
+    processed_pages = 0
+    original_size = 0
+    compressed_size = 0
+    for job in batch_files:
+        if job.status in counts:
+            counts[job.status] += 1
+        
+        done = job.status in ("completed", "failed", "cancelled")
+        processed_pages += (job.total_pages or 0) if done else (job.processed_pages or 0)
+        
+        compression_info = {}
+        if job.page_order and job.status == "completed":
+            compression_info = json.loads(job.page_order)
+            original_size += compression_info.get('original_size', 0)
+            compressed_size += compression_info.get('compressed_size', 0)
+        
+        items.append({
+            "job_id": job.id,
+            "filename": job.original_filename,
+            "status": job.status,
+            "progress": {
+                "percent": 100 if job.status == "completed" else (
+                    int((job.processed_pages or 0) / job.total_pages * 100) if job.total_pages else 0
+                ),
+                "processed_pages": job.processed_pages,
+                "total_pages": job.total_pages
+            },
+            "error": job.error_message,
+            **compression_info
+        })
+    
+    total_pages = batch.total_pages or 0
+    
+    return {
+        "batch_id": batch.id,
+        "status": batch.status,
+        "progress": {
+            "percent": 100 if batch.status == "completed" else (
+                int(processed_pages / total_pages * 100) if total_pages else 0
+            ),
+            "processed_pages": processed_pages,
+            "total_pages": total_pages,
+            "total_files": len(items),
+            **counts
+        },
+        "original_size": original_size,
+        "compressed_size": compressed_size,
+        "reduction_percent": round((1 - compressed_size / original_size) * 100, 2) if original_size else 0,
+        "files": items,
+        "skipped": json.loads(batch.params or "{}").get("skipped", []),
+        "created_at": batch.created_at,
+        "expires_at": batch.expires_at
+    }
+
+
+@router.delete("/compress-pdf/batch/{batch_id}")
+def cancel_compress_batch(batch_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel every file of a batch that has not finished yet.
+    Files already compressed stay downloadable.
+    """
+    batch = _get_batch(db, batch_id)
+    
+    if not cancel_job(db, batch):
+        raise HTTPException(status_code=409, detail=f"Batch already {batch.status}")
+    
+    cancelled = 0
+    for job in db.query(Job).filter(Job.batch_id == batch_id, Job.status.in_(UNFINISHED_STATUSES)).all():
+        if cancel_job(db, job):
+            cancelled += 1
+    
+    return {"status": "cancelled", "batch_id": batch.id, "cancelled_files": cancelled}
+
+
+def _batch_entries(batch_files: List[Job]):
+    used = set()
+    manifest = []
+    for job in batch_files:
+        item = {"filename": job.original_filename, "status": job.status, "error": job.error_message}
+        if job.status == "completed" and job.zip_path and os.path.exists(job.zip_path):
+            base_name = os.path.splitext(job.original_filename or "document")[0]
+            arcname, n = f"{base_name}_compressed.pdf", 1
+            while arcname in used:
+                arcname = f"{base_name}_compressed_{n}.pdf"
+                n += 1
+            used.add(arcname)
+            item["output"] = arcname
+            yield arcname, job.zip_path
+        manifest.append(item)
+    yield "manifest.json", json.dumps(manifest, indent=2).encode()
+
+
+@router.get("/compress-pdf/batch/{batch_id}/download")
+def download_compress_batch(batch_id: str, db: Session = Depends(get_db)):
+    """Download every compressed PDF of a finished (or cancelled) batch as one streamed ZIP."""
+    batch = _get_batch(db, batch_id)
+    
+    if batch.status not in ("completed", "cancelled"):
+        raise HTTPException(status_code=400, detail="Batch not completed")
+    
+    batch_files = db.query(Job).filter(Job.batch_id == batch_id).order_by(Job.created_at).all()
+    
+    # Compressed PDFs are usually stored as they are; the generator deflates
+    # only entries whose sample shrinks (e.g. PDFs with uncompressed streams)
+    return StreamingResponse(
+        zip_generator.stream_zip(_batch_entries(batch_files), workers=settings.ZIP_COMPRESS_WORKERS),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="compressed_pdfs.zip"'}
+    )
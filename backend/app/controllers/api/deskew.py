@@ -1,12 +1,16 @@
 """
 Deskew PDF API endpoints - Automatically straighten skewed documents
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.db.models import Job
 from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, abandon_job, finish_job, cancel_job
+from app.services.uploads import PDF_KINDS, save_upload
 import uuid
 import os
 from datetime import datetime, timedelta
@@ -31,10 +35,8 @@ async def create_deskew_job(
     
     input_path = f"{job_dir}/input.pdf"
     
-    # Save uploaded file
-    content = await file.read()
-    with open(input_path, "wb") as f:
-        f.write(content)
+    # Save uploaded file (streamed to disk, size-limited)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
     # Get page count
     pdf = fitz.open(input_path)
@@ -48,7 +50,8 @@ async def create_deskew_job(
         status="pending",
         original_filename=file.filename,
         mime_type=file.content_type,
-        file_size_bytes=len(content),
+        file_size_bytes=upload.size,
+        input_sha256=upload.sha256,
         input_path=input_path,
         output_dir=job_dir,
         total_pages=total_pages,
@@ -72,12 +75,12 @@ async def create_deskew_job(
     )
 
 
-@router.post("/deskew-pdf/jobs/{job_id}/process")
-async def process_deskew_job(
+@router.post("/deskew-pdf/jobs/{job_id}/process", status_code=202)
+def process_deskew_job(
     job_id: str,
     db: Session = Depends(get_db)
 ):
-    """Start deskewing PDF."""
+    """Queue deskewing PDF. Poll the job status endpoint for completion."""
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -86,17 +89,30 @@ async def process_deskew_job(
         raise HTTPException(status_code=400, detail="Job already processed")
     
     # Update job status
-    job.status = "processing"
+    job.status = "queued"
     db.commit()
     
+    job_queue.notify()
+    
+    return {"status": "queued", "job_id": job_id}
+
+
+def run_deskew_job(job_id: str):
+    """Job queue handler: deskew the job's PDF and store the detected angles."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+    
     # Run deskew
     from app.tools.pdf_deskewer import deskew_pdf
     
     output_path = f"{job.output_dir}/deskewed.pdf"
     
-    def progress_callback(current, total):
-        job.processed_pages = current
-        db.commit()
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner)
     
     try:
         results = deskew_pdf(
@@ -105,7 +121,6 @@ async def process_deskew_job(
             progress_callback=progress_callback
         )
         
-        job.status = "completed"
         job.processed_pages = job.total_pages
         job.zip_path = output_path
         
@@ -115,20 +130,31 @@ async def process_deskew_job(
             'avg_angle_corrected': results['avg_angle'],
             'angles_per_page': results['angles_corrected']
         })
-        db.commit()
-        
-        return {
-            "status": "completed",
-            "job_id": job_id,
-            "total_pages": results['total_pages'],
-            "average_angle_corrected": results['avg_angle']
-        }
+        finish_job(db, job, owner, "completed", output_path)
         
+    except JobCancelled:
+        abandon_job(db, job, owner, output_path)
     except Exception as e:
-        job.status = "failed"
         job.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_job(db, job, owner, "failed", output_path)
+    finally:
+        db.close()
+
+
+@router.delete("/deskew-pdf/jobs/{job_id}")
+def cancel_deskew_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a deskew job that has not finished yet.
+    A running job stops at the next page and its partial output is deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @router.get("/deskew-pdf/jobs/{job_id}")
@@ -170,8 +196,9 @@ async def get_deskew_job_status(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/deskew-pdf/jobs/{job_id}/download")
-async def download_deskewed_pdf(
+def download_deskewed_pdf(
     job_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Download deskewed PDF."""
@@ -189,7 +216,8 @@ async def download_deskewed_pdf(
     base_name = os.path.splitext(job.original_filename)[0]
     filename = f"{base_name}_deskewed.pdf"
     
-    return FileResponse(
+    return file_download(
+        request,
         job.zip_path,
         media_type="application/pdf",
         filename=filename
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
 from pathlib import Path
+from app.services.downloads import file_download
 from app.services.storage import storage
 
 router = APIRouter()
 
 @router.get("/{job_id}/{filename}")
-def get_file(job_id: str, filename: str):
+def get_file(job_id: str, filename: str, request: Request):
     job_dir = storage.get_job_dir(job_id)
     
     # Check simple paths
@@ -19,4 +19,4 @@ def get_file(job_id: str, filename: str):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
         
-    return FileResponse(file_path)
+    return file_download(request, file_path)
@@ -0,0 +1,77 @@
+"""
+Job Events API - Server-Sent Events and long-poll status for any tool job
+
+Works for every job id the other endpoints hand out, whichever tool it
+belongs to. Clients should prefer the SSE stream and fall
+back to /wait when EventSource is unavailable or keeps failing.
+"""
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.services.job_events import job_events
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+MAX_WAIT_SECONDS = 30
+
+
+def _sse(watch) -> str:
+    return f"event: status\nid: {watch.version}\ndata: {json.dumps(watch.payload())}\n\n"
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Stream `status` events until the job completes, fails or is cancelled."""
+    watch = await job_events.locate(job_id)
+    if watch is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async with job_events.subscribe(watch) as current:
+            # Tell EventSource to wait a little before reconnecting
+            yield "retry: 2000\n\n"
+            yield _sse(current)
+            version = current.version
+            last_sent = time.monotonic()
+
+            while not current.finished:
+                if await request.is_disconnected():
+                    return
+                changed = await job_events.wait_for_change(current, version, timeout=1.0)
+                if changed:
+                    version = current.version
+                    last_sent = time.monotonic()
+                    yield _sse(current)
+                elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
+
+
+@router.get("/jobs/{job_id}/wait")
+async def wait_for_job(job_id: str, version: str = "", timeout: float = 25):
+    """
+    Long-poll fallback: returns as soon as the job's version differs from
+    `version`, or with the unchanged state after `timeout` seconds.
+    """
+    watch = await job_events.locate(job_id)
+    if watch is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    timeout = max(0.0, min(timeout, MAX_WAIT_SECONDS))
+    async with job_events.subscribe(watch) as current:
+        if not current.finished:
+            await job_events.wait_for_change(current, version, timeout)
+        return current.payload()
@@ -1,30 +1,57 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from pathlib import Path
+from typing import List, Optional
 from datetime import datetime, timedelta
+from urllib.parse import quote
+import json
+import os
+import re
 import uuid
 
 from app.db.session import get_db
 from app.db.models import Job
 from app.schemas.job import JobCreate, JobStatus, JobResult, Jobimage
+from app.services.downloads import file_download
 from app.services.storage import storage
-from app.worker import process_job
+from app.services.zip_generator import zip_generator
+from app.services.job_events import job_events
+from app.services.job_queue import job_queue
+from app.services.cancellation import cancel_job
+from app.services.pdf_engine import DEFAULT_QUALITY, IMAGE_FORMATS
 from app.core.config import settings
 
 router = APIRouter()
 
 @router.post("/pdf-to-images/jobs", response_model=JobStatus, status_code=201)
 async def create_job(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     dpi: int = Form(200),
     format: str = Form("png"),
     zip: bool = Form(True),
+    quality: int = Form(DEFAULT_QUALITY),
+    zip_only: bool = Form(False),
     db: Session = Depends(get_db)
 ):
+    """
+    Render every page of a PDF to png, jpg or webp at `dpi`.
+    quality (1-100) applies to jpg and webp. With zip_only the pages are
+    encoded straight into pages.zip and no per-page files are written;
+    results then list no images, only zip_url once the job completes.
+    """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
+    format = format.lower()
+    if format == "jpeg":
+        format = "jpg"
+    if format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(IMAGE_FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="Quality must be between 1 and 100")
+    
     # Create Job Record
     job = Job(
         id=str(uuid.uuid4()),
@@ -32,14 +59,16 @@ async def create_job(
         original_filename=file.filename,
         output_format=format,
         dpi=dpi,
+        params=json.dumps({"quality": quality, "zip": zip or zip_only, "zip_only": zip_only}),
         created_at=datetime.utcnow(),
         expires_at=datetime.utcnow() + timedelta(minutes=settings.JOB_TTL_MINUTES if hasattr(settings, 'JOB_TTL_MINUTES') else 30)
     )
     
     # Save Upload
-    file_content = await file.read()
-    input_path = await storage.save_upload(job.id, file_content, file.filename)
-    job.input_path = input_path
+    upload = await storage.save_upload(job.id, file)
+    job.input_path = str(upload.path)
+    job.file_size_bytes = upload.size
+    job.input_sha256 = upload.sha256
     
     print(f"DEBUG: Creating job {job.id} with status {job.status}")
     db.add(job)
@@ -47,8 +76,8 @@ async def create_job(
     db.refresh(job)
     print(f"DEBUG: Job {job.id} commited to DB")
     
-    # Trigger Worker
-    background_tasks.add_task(process_job, job.id)
+    # Wake the job queue; any worker sharing the database may pick it up
+    job_queue.notify()
     
     return JobStatus(
         job_id=job.id,
@@ -68,13 +97,11 @@ def get_job_status(job_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Job not found")
     print(f"DEBUG: Found job {job_id} status={job.status}")
         
-    # Calculate simple progress (MVP)
     percent = 0
     if job.status == "completed":
         percent = 100
-    elif job.status == "processing":
-        # If we had real-time page updates we would use job.processed_pages / job.total_pages
-        percent = 50 
+    elif job.status == "processing" and job.total_pages:
+        percent = int((job.processed_pages or 0) / job.total_pages * 100)
         
     return JobStatus(
         job_id=job.id,
@@ -86,50 +113,151 @@ def get_job_status(job_id: str, db: Session = Depends(get_db)):
         expires_at=job.expires_at
     )
 
+@router.delete("/pdf-to-images/jobs/{job_id}")
+def cancel_job_request(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a job that has not finished yet.
+    A running job stops at the next page and its rendered pages are deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    return {"status": "cancelled", "job_id": job_id}
+
 @router.get("/pdf-to-images/jobs/{job_id}/results", response_model=JobResult)
 def get_job_results(job_id: str, db: Session = Depends(get_db)):
+    """
+    Pages rendered so far. Poll while the job is processing: pages appear as
+    soon as each one is written; zip_url is set once the job completes.
+    """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
         
-    if job.status != "completed":
-        raise HTTPException(status_code=400, detail="Job not completed yet")
+    if job.status not in ("queued", "processing", "completed"):
+        raise HTTPException(status_code=400, detail=f"Job {job.status}")
         
-    images = []
-    # Generate image URLs (assuming files served under /files/{job_id}/{filename})
-    # We need to know how many files or list them from dir. 
-    # Since we didn't store every file in DB for MVP, we can infer or list dir.
-    # Ideally, PDF Engine returns list and we might save it, but for MVP we know pattern: page_0001.png
+    # Files are served under /files/{job_id}/{filename}, named page_0001.png etc.
+    if job.params and json.loads(job.params).get("zip_only"):
+        pages = []  # Pages only exist inside pages.zip
+    elif job.status == "completed":
+        pages = range(1, job.total_pages + 1)
+    else:
+        # Still rendering: list the pages written so far. The engine renames
+        # each page into place once it is complete, and parallel renders
+        # finish out of order, so this is not always 1..processed_pages.
+        pages = _rendered_pages(job)
     
-    for i in range(job.total_pages):
-        filename = f"page_{i+1:04d}.{job.output_format}"
-        images.append(Jobimage(
-            page=i+1,
-            url=f"/files/{job.id}/{filename}"
-        ))
+    images = [
+        Jobimage(page=page, url=f"/files/{job.id}/page_{page:04d}.{job.output_format}")
+        for page in pages
+    ]
         
     return JobResult(
         job_id=job.id,
         status=job.status,
-        total_pages=job.total_pages,
+        total_pages=job.total_pages or 0,
         images=images,
-        zip_url=f"/files/{job.id}/pages.zip" if job.zip_path else None
+        zip_url=_zip_url(job)
     )
 
-from fastapi.responses import FileResponse
-import os
+
+def _zip_url(job: Job) -> Optional[str]:
+    if job.zip_path:
+        return f"/files/{job.id}/pages.zip"  # zip_only: the archive the job wrote
+    params = json.loads(job.params) if job.params else {}
+    if job.status == "completed" and params.get("zip", True):
+        return f"{settings.API_V1_STR}/pdf-to-images/jobs/{job.id}/assets/download"
+    return None
+
+
+def _rendered_pages(job: Job) -> List[int]:
+    return _listed_pages(storage.get_job_dir(job.id) / "output", job.output_format)
+
+
+def _listed_pages(output_dir: Path, fmt: str) -> List[int]:
+    """Numbers of the page files in output_dir, in order."""
+    pattern = re.compile(rf"page_(\d+)\.{re.escape(fmt)}")
+    try:
+        names = os.listdir(output_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(pattern.fullmatch, names) if match)
+
+# Statuses whose pages can be streamed: still rendering or done
+STREAMABLE_STATUSES = ("queued", "processing", "completed")
+
+
+async def _stream_pages(job_id: str, fmt: str):
+    """
+    (arcname, path) for every page in order. Pages not rendered yet are
+    waited for, so a download can start while the job is still running.
+    Raises if the job fails, is cancelled or its files disappear, which
+    aborts the response instead of sending a silently truncated ZIP.
+
+    Job status comes from the job_events hub, which reads every watched job
+    in one query per tick; while pages are missing, the output directory is
+    listed again (in the threadpool) every tick.
+    """
+    watch = await job_events.locate(job_id)
+    if watch is None:
+        raise RuntimeError(f"Job {job_id} not found")
+    
+    output_dir = storage.get_job_dir(job_id) / "output"
+    page = 1
+    async with job_events.subscribe(watch) as current:
+        while True:
+            version = current.version
+            status = current.state.get("status")
+            total_pages = current.state.get("progress", {}).get("total_pages")
+            
+            if total_pages and page <= total_pages:
+                rendered = set(await run_in_threadpool(_listed_pages, output_dir, fmt))
+                while page <= total_pages and page in rendered:
+                    name = f"page_{page:04d}.{fmt}"
+                    yield name, str(output_dir / name)
+                    page += 1
+            
+            if total_pages and page > total_pages:
+                return
+            if status not in STREAMABLE_STATUSES or status == "completed":
+                raise RuntimeError(f"Job {job_id} {status} before page {page} was available")
+            await job_events.wait_for_change(current, version, timeout=settings.JOB_EVENTS_INTERVAL_MS / 1000)
+
 
 @router.get("/pdf-to-images/jobs/{job_id}/assets/download")
-def download_job_assets(job_id: str, db: Session = Depends(get_db)):
+def download_job_assets(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    All pages as a ZIP. A zip_only job serves the archive it wrote; otherwise
+    the ZIP is streamed from the page files, starting while pages are still
+    being rendered.
+    """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-        
-    if not job.zip_path or not os.path.exists(job.zip_path):
+    
+    filename = f"{job.original_filename}_converted.zip"
+    
+    if job.zip_path and os.path.exists(job.zip_path):
+        return file_download(
+            request,
+            job.zip_path, 
+            media_type='application/zip', 
+            filename=filename
+        )
+    
+    params = json.loads(job.params) if job.params else {}
+    if params.get("zip_only") or job.status not in STREAMABLE_STATUSES:
         raise HTTPException(status_code=404, detail="Download not available")
-        
-    return FileResponse(
-        job.zip_path, 
-        media_type='application/zip', 
-        filename=f"{job.original_filename}_converted.zip"
+    
+    # Pages are PNG/JPEG/WebP, so they are stored as they are, each one
+    # going out as soon as it is rendered
+    return StreamingResponse(
+        zip_generator.stream_zip_async(_stream_pages(job.id, job.output_format)),
+        media_type='application/zip',
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
     )
@@ -1,12 +1,16 @@
 """
 Merge PDF API endpoints - Combine multiple PDFs into one
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.db.models import Job
 from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, abandon_job, finish_job, cancel_job
+from app.services.uploads import PDF_KINDS, save_upload
 from pydantic import BaseModel
 from typing import List
 import uuid
@@ -57,10 +61,7 @@ async def create_merge_job(
     
     for i, file in enumerate(files):
         file_path = f"{job_dir}/input_{i+1}.pdf"
-        content = await file.read()
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
+        upload = await save_upload(file, file_path, kinds=PDF_KINDS)
         
         # Get page count
         pdf = fitz.open(file_path)
@@ -71,11 +72,12 @@ async def create_merge_job(
             "index": i,
             "filename": file.filename,
             "pages": page_count,
-            "size": len(content)
+            "size": upload.size,
+            "sha256": upload.sha256
         })
         
         total_pages += page_count
-        total_size += len(content)
+        total_size += upload.size
     
     # Create job record
     job = Job(
@@ -109,14 +111,14 @@ async def create_merge_job(
     )
 
 
-@router.post("/merge-pdf/jobs/{job_id}/process")
-async def process_merge_job(
+@router.post("/merge-pdf/jobs/{job_id}/process", status_code=202)
+def process_merge_job(
     job_id: str,
     request: MergeJobRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Merge PDFs in specified order.
+    Queue merging PDFs in specified order. Poll the job status endpoint for completion.
     """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -148,17 +150,32 @@ async def process_merge_job(
         input_files.append(file_path)
     
     # Update job status
-    job.status = "processing"
+    job.status = "queued"
+    job.params = json.dumps({"input_files": input_files})
     db.commit()
     
+    job_queue.notify()
+    
+    return {"status": "queued", "job_id": job_id}
+
+
+def run_merge_job(job_id: str):
+    """Job queue handler: merge the job's PDFs in the requested order."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+    
     # Merge PDFs
     from app.tools.pdf_merger import merge_pdfs
     
     output_path = f"{job.output_dir}/merged.pdf"
+    input_files = json.loads(job.params)["input_files"]
     
-    def progress_callback(current, total):
-        job.processed_pages = current
-        db.commit()
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner)
     
     try:
         result = merge_pdfs(
@@ -167,23 +184,33 @@ async def process_merge_job(
             progress_callback=progress_callback
         )
         
-        job.status = "completed"
         job.processed_pages = result["total_files"]
         job.zip_path = output_path
-        db.commit()
-        
-        return {
-            "status": "completed",
-            "job_id": job_id,
-            "total_files": result["total_files"],
-            "total_pages": result["total_pages"]
-        }
+        finish_job(db, job, owner, "completed", output_path)
         
+    except JobCancelled:
+        abandon_job(db, job, owner, output_path)
     except Exception as e:
-        job.status = "failed"
         job.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_job(db, job, owner, "failed", output_path)
+    finally:
+        db.close()
+
+
+@router.delete("/merge-pdf/jobs/{job_id}")
+def cancel_merge_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a merge job that has not finished yet.
+    A running job stops at the next page and its partial output is deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @router.get("/merge-pdf/jobs/{job_id}")
@@ -218,7 +245,7 @@ async def get_merge_job_status(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/merge-pdf/jobs/{job_id}/download")
-async def download_merged_pdf(job_id: str, db: Session = Depends(get_db)):
+def download_merged_pdf(job_id: str, request: Request, db: Session = Depends(get_db)):
     """Download merged PDF."""
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -230,7 +257,8 @@ async def download_merged_pdf(job_id: str, db: Session = Depends(get_db)):
     if not job.zip_path or not os.path.exists(job.zip_path):
         raise HTTPException(status_code=404, detail="Merged PDF not found")
     
-    return FileResponse(
+    return file_download(
+        request,
         job.zip_path,
         media_type="application/pdf",
         filename=job.original_filename
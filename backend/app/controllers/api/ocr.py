@@ -1,12 +1,18 @@
 """
 OCR PDF API endpoints - Extract text from scanned PDFs
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Request
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.db.models import Job
 from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, finish_job, cancel_job
+from app.services.result_cache import result_cache
+from app.services.uploads import PDF_KINDS, check_upload, save_upload
+import json
 import uuid
 import os
 from datetime import datetime, timedelta
@@ -46,23 +52,20 @@ async def create_ocr_job(
     
     input_path = f"{job_dir}/input.pdf"
     
-    # Save uploaded file
-    content = await file.read()
-    
+    # Save uploaded file (streamed to disk, size-limited)
     if file.content_type.startswith('image/'):
-        # Convert image to PDF
+        # Convert image to PDF, reading straight from the spooled upload
+        upload = await check_upload(file, kinds={"jpeg", "png"})
         from PIL import Image
-        import io
         try:
-            image = Image.open(io.BytesIO(content))
+            image = Image.open(file.file)
             image = image.convert('RGB')
             image.save(input_path, "PDF")
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid image file: {e}")
     else:
         # Save PDF directly
-        with open(input_path, "wb") as f:
-            f.write(content)
+        upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
     # Get page count
     pdf = fitz.open(input_path)
@@ -80,7 +83,8 @@ async def create_ocr_job(
         status="pending",
         original_filename=file.filename,
         mime_type=file.content_type,
-        file_size_bytes=len(content),
+        file_size_bytes=upload.size,
+        input_sha256=upload.sha256,
         input_path=input_path,
         output_dir=job_dir,
         total_pages=total_pages,
@@ -105,13 +109,13 @@ async def create_ocr_job(
     )
 
 
-@router.post("/ocr-pdf/jobs/{job_id}/process")
-async def process_ocr_job(
+@router.post("/ocr-pdf/jobs/{job_id}/process", status_code=202)
+def process_ocr_job(
     job_id: str,
     db: Session = Depends(get_db)
 ):
     """
-    Start OCR text extraction.
+    Queue OCR text extraction. Poll the job status endpoint for completion.
     """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -120,56 +124,83 @@ async def process_ocr_job(
     if job.status != "pending":
         raise HTTPException(status_code=400, detail="Job already processed")
     
+    # Same PDF read with the same language and mode before: reuse that text
+    language, mode = _ocr_options(job)
+    ocr_info = result_cache.lookup(
+        "ocr_pdf",
+        [job.input_path],
+        {"language": language, "mode": mode},
+        job.output_dir,
+        digests=[job.input_sha256] if job.input_sha256 else None
+    )
+    if ocr_info is not None:
+        job.status = "completed"
+        job.total_pages = ocr_info.pop('total_pages', job.total_pages)
+        job.processed_pages = job.total_pages
+        job.zip_path = f"{job.output_dir}/extracted_text.txt"
+        job.page_order = json.dumps({
+            **ocr_info,
+            'text_file': job.zip_path,
+            'json_file': f"{job.output_dir}/extracted_text.json"
+        })
+        db.commit()
+        return {"status": "completed", "job_id": job_id, "cached": True}
+    
     # Update job status
-    job.status = "processing"
+    job.status = "queued"
     db.commit()
     
-    # Parse lang and mode
+    job_queue.notify()
+    
+    return {"status": "queued", "job_id": job_id}
+
+
+def _ocr_options(job: Job):
+    """(language, mode) stored as "lang|mode" in output_format."""
     lang_mode = job.output_format.split('|')
     language = lang_mode[0]
     mode = lang_mode[1] if len(lang_mode) > 1 else 'standard'
+    return language, mode
+
+
+def run_ocr_job(job_id: str):
+    """Job queue handler: run OCR on the job's PDF and save TXT/JSON results."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+    
+    language, mode = _ocr_options(job)
     
     from app.tools.pdf_ocr import extract_text_from_pdf, save_results_as_text, save_results_as_json
-    from app.tools.enhanced_ocr import extract_text_enhanced
-    from fastapi.concurrency import run_in_threadpool
     
-    def progress_callback(current, total):
-        # Note: In a real async/threaded env, writing to DB from callback 
-        # might need careful scoping, but since we await the threadpool, 
-        # this callback runs in the thread. We should ensure the session is robust.
-        # For simple threading offload, this usually works as the session object 
-        # is passed in.
-        try:
-             # Re-query might be safer if session isdetached, but simple update is fine
-             job.processed_pages = current
-             db.commit()
-        except:
-             pass
+    text_path = f"{job.output_dir}/extracted_text.txt"
+    json_path = f"{job.output_dir}/extracted_text.json"
+    
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner)
 
     try:
         if mode == 'enhanced':
-            results = await run_in_threadpool(
-                extract_text_enhanced,
+            from app.tools.enhanced_ocr import extract_text_enhanced
+            results = extract_text_enhanced(
                 input_pdf_path=job.input_path,
                 language=language,
                 progress_callback=progress_callback
             )
         else:
-             results = await run_in_threadpool(
-                extract_text_from_pdf,
+            results = extract_text_from_pdf(
                 input_pdf_path=job.input_path,
                 language=language,
                 progress_callback=progress_callback
             )
         
         # Save results
-        text_path = f"{job.output_dir}/extracted_text.txt"
-        json_path = f"{job.output_dir}/extracted_text.json"
-        
         save_results_as_text(results, text_path)
         save_results_as_json(results, json_path)
         
-        job.status = "completed"
         # Update total pages from actual results (crucial if detection changed it or initial count was 0)
         job.total_pages = results.get('total_pages', job.total_pages) 
         job.processed_pages = job.total_pages
@@ -184,21 +215,46 @@ async def process_ocr_job(
             'text_file': text_path,
             'json_file': json_path
         })
-        db.commit()
-        
-        return {
-            "status": "completed",
-            "job_id": job_id,
-            "total_characters": results['total_characters'],
-            "total_pages": results['total_pages'],
-            "mode": mode
+        cache_info = {
+            'total_characters': results['total_characters'],
+            'language': results['language'],
+            'mode': mode,
+            'total_pages': job.total_pages
         }
         
+        if finish_job(db, job, owner, "completed", text_path, json_path):
+            result_cache.store(
+                "ocr_pdf",
+                [job.input_path],
+                {"language": language, "mode": mode},
+                [text_path, json_path],
+                cache_info,
+                digests=[job.input_sha256] if job.input_sha256 else None
+            )
+        
+    except JobCancelled:
+        pass  # Results are only written once every page is done
     except Exception as e:
-        job.status = "failed"
         job.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_job(db, job, owner, "failed", text_path, json_path)
+    finally:
+        db.close()
+
+
+@router.delete("/ocr-pdf/jobs/{job_id}")
+def cancel_ocr_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a OCR job that has not finished yet.
+    A running job stops at the next page and its partial output is deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @router.get("/ocr-pdf/jobs/{job_id}")
@@ -240,9 +296,10 @@ async def get_ocr_job_status(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/ocr-pdf/jobs/{job_id}/download/{format}")
-async def download_ocr_results(
+def download_ocr_results(
     job_id: str,
     format: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Download OCR results as TXT or JSON."""
@@ -273,7 +330,8 @@ async def download_ocr_results(
     
     media_type = "text/plain" if format == 'txt' else "application/json"
     
-    return FileResponse(
+    return file_download(
+        request,
         file_path,
         media_type=media_type,
         filename=filename
@@ -1,20 +1,30 @@
 """
 Organize PDF API endpoints - Reorder and rearrange PDF pages
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.db.models import Job
 from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, abandon_job, finish_job, cancel_job
+from app.services.raster_cache import raster_cache
+from app.services.thumbnails import DEFAULT_WIDTH, MAX_WIDTH, MIN_WIDTH, thumbnail_service
+from app.services.uploads import PDF_KINDS, save_upload
 from pydantic import BaseModel
 from typing import List
 import uuid
 import os
+import re
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
+THUMBNAIL_NAME = re.compile(r"thumb_(\d+)\.(webp|jpg|png)")
+
 
 class OrganizeJobRequest(BaseModel):
     page_order: List[int]
@@ -35,29 +45,25 @@ async def create_organize_job(
     
     job_id = str(uuid.uuid4())
     job_dir = f"storage/jobs/{job_id}"
-    thumbnails_dir = f"{job_dir}/thumbnails"
-    os.makedirs(thumbnails_dir, exist_ok=True)
+    os.makedirs(job_dir, exist_ok=True)
     
     input_path = f"{job_dir}/input.pdf"
     
-    # Save uploaded file
-    content = await file.read()
-    with open(input_path, "wb") as f:
-        f.write(content)
+    # Save uploaded file (streamed to disk, size-limited)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
-    # Get page count and generate thumbnails
+    # Get page count
     import fitz
-    from app.tools.pdf_organizer import generate_page_thumbnails
     
     pdf = fitz.open(input_path)
     total_pages = len(pdf)
     pdf.close()
     
-    # Generate thumbnails for preview
-    try:
-        generate_page_thumbnails(input_path, thumbnails_dir, thumbnail_width=200)
-    except Exception as e:
-        print(f"Error generating thumbnails: {e}")
+    # Thumbnails are rendered on demand; start on the first pages so the
+    # preview's initial requests find them ready
+    thumbnail_service.prefetch(
+        input_path, upload.sha256, range(min(thumbnail_service.prefetch_pages, total_pages)), DEFAULT_WIDTH, "webp"
+    )
     
     # Create job record
     job = Job(
@@ -66,7 +72,8 @@ async def create_organize_job(
         status="pending",  # Waiting for user to confirm page order
         original_filename=file.filename,
         mime_type=file.content_type,
-        file_size_bytes=len(content),
+        file_size_bytes=upload.size,
+        input_sha256=upload.sha256,
         input_path=input_path,
         output_dir=job_dir,
         total_pages=total_pages,
@@ -87,14 +94,15 @@ async def create_organize_job(
     )
 
 
-@router.post("/organize-pdf/jobs/{job_id}/process")
-async def process_organize_job(
+@router.post("/organize-pdf/jobs/{job_id}/process", status_code=202)
+def process_organize_job(
     job_id: str,
     request: OrganizeJobRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Process PDF reorganization with user-specified page order.
+    Queue PDF reorganization with user-specified page order.
+    Poll the job status endpoint for completion.
     """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -117,39 +125,68 @@ async def process_organize_job(
         )
     
     # Update job status
-    job.status = "processing"
+    job.status = "queued"
     job.page_order = ",".join(map(str, request.page_order))
     db.commit()
     
+    job_queue.notify()
+    
+    return {"status": "queued", "job_id": job_id}
+
+
+def run_organize_job(job_id: str):
+    """Job queue handler: write the job's PDF with pages in the stored order."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+    
     # Process PDF reorganization
     from app.tools.pdf_organizer import reorder_pdf_pages
     
     output_path = f"{job.output_dir}/organized.pdf"
+    page_order = [int(i) for i in job.page_order.split(",")]
     
-    def progress_callback(current, total):
-        job.processed_pages = current
-        db.commit()
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner)
     
     try:
-        result = reorder_pdf_pages(
+        reorder_pdf_pages(
             input_pdf_path=job.input_path,
             output_pdf_path=output_path,
-            page_order=request.page_order,
+            page_order=page_order,
             progress_callback=progress_callback
         )
         
-        job.status = "completed"
         job.processed_pages = job.total_pages
         job.zip_path = output_path  # Reuse this field for organized PDF
-        db.commit()
-        
-        return {"status": "completed", "job_id": job_id}
+        finish_job(db, job, owner, "completed", output_path)
         
+    except JobCancelled:
+        abandon_job(db, job, owner, output_path)
     except Exception as e:
-        job.status = "failed"
         job.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_job(db, job, owner, "failed", output_path)
+    finally:
+        db.close()
+
+
+@router.delete("/organize-pdf/jobs/{job_id}")
+def cancel_organize_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a organize job that has not finished yet.
+    A running job stops at the next page and its partial output is deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @router.get("/organize-pdf/jobs/{job_id}")
@@ -183,7 +220,7 @@ async def get_organize_job_status(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/organize-pdf/jobs/{job_id}/download")
-async def download_organized_pdf(job_id: str, db: Session = Depends(get_db)):
+def download_organized_pdf(job_id: str, request: Request, db: Session = Depends(get_db)):
     """
     Download reorganized PDF.
     """
@@ -197,7 +234,8 @@ async def download_organized_pdf(job_id: str, db: Session = Depends(get_db)):
     if not job.zip_path or not os.path.exists(job.zip_path):
         raise HTTPException(status_code=404, detail="Organized PDF not found")
     
-    return FileResponse(
+    return file_download(
+        request,
         job.zip_path,
         media_type="application/pdf",
         filename=f"organized_{job.original_filename}"
@@ -205,17 +243,32 @@ async def download_organized_pdf(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/organize-pdf/jobs/{job_id}/thumbnails/{filename}")
-async def get_thumbnail(job_id: str, filename: str, db: Session = Depends(get_db)):
+async def get_thumbnail(
+    job_id: str,
+    filename: str,
+    request: Request,
+    width: int = Query(DEFAULT_WIDTH, ge=MIN_WIDTH, le=MAX_WIDTH),
+    db: Session = Depends(get_db)
+):
     """
     Serve thumbnail images for page preview.
+    filename is thumb_NNNN.<webp|jpg|png> with NNNN the 1-based page number;
+    the image is rendered on first request.
     """
-    job = db.query(Job).filter(Job.id == job_id).first()
+    job = db.query(Job).filter(Job.id == job_id, Job.tool == "organize_pdf").first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    thumbnail_path = f"storage/jobs/{job_id}/thumbnails/{filename}"
+    match = THUMBNAIL_NAME.fullmatch(filename)
+    if not match or not job.input_path or not os.path.exists(job.input_path):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    page_index, fmt = int(match.group(1)) - 1, match.group(2)
+    doc_key = job.input_sha256 or await run_in_threadpool(raster_cache.document_key, job.input_path)
     
-    if not os.path.exists(thumbnail_path):
+    try:
+        path = await thumbnail_service.get(job.input_path, doc_key, page_index, job.total_pages, width, fmt)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Thumbnail not found")
     
-    return FileResponse(thumbnail_path, media_type="image/png")
+    return thumbnail_service.response(request, path, doc_key, fmt)
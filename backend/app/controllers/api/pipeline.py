@@ -0,0 +1,298 @@
+"""
+Pipeline API endpoints - Run several tools over one upload in a single job
+
+Upload a PDF or an image, then POST the steps to run, e.g.
+    {"steps": [{"op": "deskew"}, {"op": "ocr", "options": {"language": "eng"}},
+               {"op": "compress", "options": {"quality": "medium"}}]}
+Pages (or the image) are decoded once and passed between steps in memory.
+"""
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.db.session import get_db, SessionLocal
+from app.db.models import Job
+from app.schemas.job import JobStatus
+from app.services.downloads import file_download
+from app.services.job_queue import job_queue
+from app.services.progress import ProgressWriter
+from app.services.cancellation import JobCancelled, abandon_job, finish_job, cancel_job
+from app.services.uploads import PDF_KINDS, IMAGE_KINDS, save_upload
+from app.services.result_cache import result_cache
+from typing import Any, Dict, List
+import json
+import uuid
+import os
+from datetime import datetime, timedelta
+import fitz
+
+router = APIRouter()
+
+
+class PipelineStep(BaseModel):
+    op: str
+    options: Dict[str, Any] = {}
+
+
+class PipelineRequest(BaseModel):
+    steps: List[PipelineStep]
+
+
+def _output_files(job: Job, result: dict) -> List[str]:
+    return [f"{job.output_dir}/{name}" for name in result['outputs'].values()]
+
+
+@router.post("/pipeline/jobs", response_model=JobStatus)
+async def create_pipeline_job(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """Upload a PDF or image to run a pipeline on."""
+    job_id = str(uuid.uuid4())
+    job_dir = f"storage/jobs/{job_id}"
+    os.makedirs(job_dir, exist_ok=True)
+
+    ext = os.path.splitext(file.filename or "")[1].lower() or ".bin"
+    input_path = f"{job_dir}/input{ext}"
+
+    # Save uploaded file (streamed to disk, size-limited, type sniffed)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS | IMAGE_KINDS)
+    kind = "pdf" if upload.kind in PDF_KINDS else "image"
+
+    total_pages = 0
+    if kind == "pdf":
+        pdf = fitz.open(input_path)
+        total_pages = len(pdf)
+        pdf.close()
+
+    # Create job record
+    job = Job(
+        id=job_id,
+        tool="pipeline",
+        status="pending",
+        original_filename=file.filename,
+        mime_type=file.content_type,
+        file_size_bytes=upload.size,
+        input_sha256=upload.sha256,
+        input_path=input_path,
+        output_dir=job_dir,
+        total_pages=total_pages,
+        params=json.dumps({"kind": kind}),
+        created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + timedelta(minutes=5)
+    )
+
+    db.add(job)
+    db.commit()
+
+    return JobStatus(
+        job_id=job_id,
+        filename=file.filename,
+        status="pending",
+        progress={
+            "percent": 0,
+            "total_pages": total_pages
+        },
+        created_at=job.created_at,
+        expires_at=job.expires_at
+    )
+
+
+@router.post("/pipeline/jobs/{job_id}/process", status_code=202)
+def process_pipeline_job(
+    job_id: str,
+    request: PipelineRequest,
+    db: Session = Depends(get_db)
+):
+    """Queue the pipeline's steps. Poll the job status endpoint for completion."""
+    from app.tools.pipeline import validate_steps
+
+    job = db.query(Job).filter(Job.id == job_id, Job.tool == "pipeline").first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status != "pending":
+        raise HTTPException(status_code=400, detail="Job already processed")
+
+    kind = json.loads(job.params)["kind"]
+    try:
+        steps = validate_steps(kind, [step.dict() for step in request.steps])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job.params = json.dumps({"kind": kind, "steps": steps})
+    if kind == "image":
+        job.total_pages = len(steps)  # Progress is counted in steps
+
+    # Same file through the same steps before: reuse that result
+    result = result_cache.lookup(
+        "pipeline",
+        [job.input_path],
+        {"steps": steps},
+        job.output_dir,
+        digests=[job.input_sha256] if job.input_sha256 else None
+    )
+    if result is not None:
+        job.status = "completed"
+        job.processed_pages = job.total_pages
+        job.result = json.dumps(result)
+        db.commit()
+        return {"status": "completed", "job_id": job_id, "cached": True}
+
+    # Update job status
+    job.status = "queued"
+    db.commit()
+
+    job_queue.notify()
+
+    return {"status": "queued", "job_id": job_id}
+
+
+def _partial_outputs(job: Job) -> List[str]:
+    """Output files a run of the job may have written so far."""
+    from app.tools.pipeline import OCR_JSON_OUTPUT, OCR_TEXT_OUTPUT, PDF_OUTPUT
+    return [
+        f"{job.output_dir}/{name}" for name in os.listdir(job.output_dir)
+        if name in (PDF_OUTPUT, OCR_TEXT_OUTPUT, OCR_JSON_OUTPUT) or name.startswith("output.")
+    ]
+
+
+def run_pipeline_job(job_id: str):
+    """Job queue handler: run the job's steps and store their combined result."""
+    db = SessionLocal()
+    job = db.query(Job).filter(Job.id == job_id).first()
+
+    if not job or job.status == "cancelled":
+        db.close()
+        return
+
+    from app.tools.pipeline import run_image_pipeline, run_pdf_pipeline
+
+    params = json.loads(job.params)
+    run = run_pdf_pipeline if params["kind"] == "pdf" else run_image_pipeline
+
+    owner = job.lease_owner
+    progress_callback = ProgressWriter(db, job_id, owner, update_total=params["kind"] == "image")
+
+    try:
+        result = run(
+            job.input_path,
+            job.output_dir,
+            params["steps"],
+            progress_callback=progress_callback
+        )
+
+        job.processed_pages = job.total_pages
+        job.result = json.dumps(result)
+        output_files = _output_files(job, result)
+
+        if finish_job(db, job, owner, "completed", *_partial_outputs(job)):
+            result_cache.store(
+                "pipeline",
+                [job.input_path],
+                {"steps": params["steps"]},
+                output_files,
+                result,
+                digests=[job.input_sha256] if job.input_sha256 else None
+            )
+
+    except JobCancelled:
+        abandon_job(db, job, owner, *_partial_outputs(job))
+    except Exception as e:
+        job.error_message = str(e)
+        finish_job(db, job, owner, "failed", *_partial_outputs(job))
+    finally:
+        db.close()
+
+
+@router.delete("/pipeline/jobs/{job_id}")
+def cancel_pipeline_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a pipeline job that has not finished yet.
+    A running job stops at the next page (or step) and its partial outputs are deleted.
+    """
+    job = db.query(Job).filter(Job.id == job_id, Job.tool == "pipeline").first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not cancel_job(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+
+    return {"status": "cancelled", "job_id": job_id}
+
+
+@router.get("/pipeline/jobs/{job_id}")
+def get_pipeline_job_status(job_id: str, db: Session = Depends(get_db)):
+    """Get pipeline job status, and each step's results once completed."""
+    job = db.query(Job).filter(Job.id == job_id, Job.tool == "pipeline").first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    percent = 0
+    if job.status == "completed":
+        percent = 100
+    elif job.status == "processing" and job.total_pages > 0:
+        percent = int((job.processed_pages / job.total_pages) * 100)
+
+    params = json.loads(job.params) if job.params else {}
+
+    return {
+        "job_id": job.id,
+        "filename": job.original_filename,
+        "status": job.status,
+        "kind": params.get("kind"),
+        "steps": params.get("steps"),
+        "progress": {
+            "percent": percent,
+            "processed_pages": job.processed_pages,
+            "total_pages": job.total_pages
+        },
+        "result": json.loads(job.result) if job.result and job.status == "completed" else None,
+        "error": job.error_message,
+        "created_at": job.created_at,
+        "expires_at": job.expires_at
+    }
+
+
+def _completed_output(job_id: str, output: str, db: Session) -> tuple:
+    job = db.query(Job).filter(Job.id == job_id, Job.tool == "pipeline").first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status != "completed":
+        raise HTTPException(status_code=400, detail="Job not completed")
+
+    name = json.loads(job.result)["outputs"].get(output)
+    if not name:
+        raise HTTPException(status_code=404, detail=f"This pipeline has no {output} output")
+
+    path = f"{job.output_dir}/{name}"
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Output file not found")
+
+    return job, path
+
+
+@router.get("/pipeline/jobs/{job_id}/download")
+def download_pipeline_output(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """Download the processed PDF or image."""
+    job, path = _completed_output(job_id, "document", db)
+
+    base_name = os.path.splitext(job.original_filename or "document")[0]
+    ext = os.path.splitext(path)[1]
+    media_type = "application/pdf" if ext == ".pdf" else f"image/{ext.lstrip('.').replace('jpg', 'jpeg')}"
+
+    return file_download(request, path, media_type=media_type, filename=f"{base_name}_processed{ext}")
+
+
+@router.get("/pipeline/jobs/{job_id}/download/text")
+def download_pipeline_text(job_id: str, request: Request, format: str = "txt", db: Session = Depends(get_db)):
+    """Download the OCR step's text (format: txt or json)."""
+    if format not in ("txt", "json"):
+        raise HTTPException(status_code=400, detail="Format must be 'txt' or 'json'")
+
+    job, path = _completed_output(job_id, "text" if format == "txt" else "json", db)
+
+    base_name = os.path.splitext(job.original_filename or "document")[0]
+    media_type = "text/plain" if format == "txt" else "application/json"
+
+    return file_download(request, path, media_type=media_type, filename=f"{base_name}_ocr.{format}")
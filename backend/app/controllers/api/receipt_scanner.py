@@ -7,6 +7,9 @@ import re
 from datetime import datetime
 import dateparser
 
+from app.services.pixmaps import pixmap_to_image
+from app.services.uploads import IMAGE_KINDS, PDF_KINDS, check_upload
+
 router = APIRouter()
 
 class ReceiptScanner:
@@ -184,7 +187,13 @@ class ReceiptScanner:
     def process_receipt(image_bytes: bytes) -> dict:
         try:
             image = Image.open(io.BytesIO(image_bytes))
-            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Receipt scanning failed: {str(e)}")
+        return ReceiptScanner.process_receipt_image(image)
+
+    @staticmethod
+    def process_receipt_image(image: Image.Image) -> dict:
+        try:
             # OCR
             # Use --psm 6 or 4. 
             text = pytesseract.image_to_string(image, lang='eng', config='--psm 4')
@@ -213,6 +222,7 @@ async def scan_receipt(file: UploadFile = File(...)):
     if not file.content_type.startswith('image/') and not file.filename.lower().endswith('.pdf'):
          raise HTTPException(status_code=400, detail="Invalid file type. Please upload an Image or PDF.")
     
+    await check_upload(file, kinds=PDF_KINDS | IMAGE_KINDS)
     content = await file.read()
     
     # If PDF, convert first page to image (simple handling for now)
@@ -222,9 +232,11 @@ async def scan_receipt(file: UploadFile = File(...)):
             doc = fitz.open(stream=content, filetype="pdf")
             page = doc[0]
             pix = page.get_pixmap()
-            content = pix.tobytes("png")
+            # Hand the pixels straight to Pillow instead of a PNG round trip
+            result = ReceiptScanner.process_receipt_image(pixmap_to_image(pix))
         except ImportError:
              raise HTTPException(status_code=500, detail="PDF support requires PyMuPDF (fitz).")
+    else:
+        result = ReceiptScanner.process_receipt(content)
 
-    result = ReceiptScanner.process_receipt(content)
     return JSONResponse(content=result)
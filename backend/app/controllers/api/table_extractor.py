@@ -4,13 +4,15 @@ import pdfplumber
 import pandas as pd
 import io
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, BinaryIO
+
+from app.services.uploads import PDF_KINDS, check_upload
 
 router = APIRouter()
 
 class TableExtractor:
     @staticmethod
-    def extract_preview(file_bytes: bytes, flavor: str = "lattice") -> List[Dict[str, Any]]:
+    def extract_preview(pdf_file: BinaryIO, flavor: str = "lattice") -> List[Dict[str, Any]]:
         """
         Extracts tables from a PDF and returns them structured for JSON preview.
         flavor: 'lattice' (for bordered tables) or 'stream' (for whitespace tables)
@@ -41,7 +43,7 @@ class TableExtractor:
         # else default is effectively lattice-like or mixed. 
         
         try:
-            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            with pdfplumber.open(pdf_file) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     tables = page.extract_tables(table_settings=settings)
                     for table_idx, table in enumerate(tables):
@@ -65,7 +67,7 @@ class TableExtractor:
         return tables_data
 
     @staticmethod
-    def extract_and_export(file_bytes: bytes, format: str, flavor: str = "lattice") -> tuple[io.BytesIO, str, str]:
+    def extract_and_export(pdf_file: BinaryIO, format: str, flavor: str = "lattice") -> tuple[io.BytesIO, str, str]:
         """
         Extracts tables and exports them to a single CSV (all tables merged) or Excel (sheets per table).
         """
@@ -75,7 +77,7 @@ class TableExtractor:
             settings = {"vertical_strategy": "text", "horizontal_strategy": "text"}
 
         try:
-            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            with pdfplumber.open(pdf_file) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     tables = page.extract_tables(table_settings=settings)
                     for table_idx, table in enumerate(tables):
@@ -136,8 +138,9 @@ async def extract_tables_api(file: UploadFile = File(...), flavor: str = Form("l
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF.")
     
-    content = await file.read()
-    results = TableExtractor.extract_preview(content, flavor)
+    # Parse straight from the spooled upload instead of copying it into memory
+    await check_upload(file, kinds=PDF_KINDS)
+    results = TableExtractor.extract_preview(file.file, flavor)
     
     return JSONResponse(content={"tables": results, "count": len(results)})
 
@@ -147,8 +150,8 @@ async def download_tables_api(file: UploadFile = File(...), format: str = Form("
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF.")
     
-    content = await file.read()
-    output_stream, media_type, filename = TableExtractor.extract_and_export(content, format, flavor)
+    await check_upload(file, kinds=PDF_KINDS)
+    output_stream, media_type, filename = TableExtractor.extract_and_export(file.file, format, flavor)
     
     return StreamingResponse(
         output_stream, 
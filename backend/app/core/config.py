@@ -47,10 +47,60 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # Limits
-    MAX_UPLOAD_SIZE_MB: int = 50
+    MAX_UPLOAD_SIZE_MB: int = 50  # Per uploaded file
+    MAX_REQUEST_SIZE_MB: int = 500  # Whole request body (merge takes up to 10 files)
     MAX_PAGES: int = 200
     DEFAULT_DPI: int = 200
-    
+
+    # PDF to images: executor tasks rendering one job's pages at once (0 = whatever the executor has free)
+    PDF_RENDER_WORKERS: int = 0
+    PDF_RENDER_PARALLEL_MIN_PAGES: int = 16  # Smaller documents render in a single task
+
+    # Streamed ZIP downloads: threads deflating compressible entries ahead of the one being sent
+    ZIP_COMPRESS_WORKERS: int = 2
+
+    # Job Executor (process pool for CPU-heavy tools)
+    EXECUTOR_MAX_WORKERS: int = 0  # 0 = CPU count - 1
+    EXECUTOR_DEFAULT_TOOL_LIMIT: int = 0  # 0 = no per-tool cap beyond pool size
+    # pdf_to_images has no limit: its tasks are page shards, so a job can use every idle worker
+    EXECUTOR_TOOL_LIMITS: dict[str, int] = {
+        "pdf_to_word": 2,
+        "thumbnails": 2,  # Prefetching previews must not crowd out real jobs
+    }
+    # Extra workers that only these tools use, so their requests never queue behind jobs
+    EXECUTOR_RESERVED_WORKERS: dict[str, int] = {
+        "compress_estimate": 1,  # Size previews for the compress form
+    }
+    COMPRESS_ESTIMATE_TIMEOUT_SECONDS: float = 15
+    EVENT_LOOP_LAG_WARN_MS: int = 5  # Log when the API event loop is blocked longer than this
+
+    # Job Queue (jobs table shared by every API process and `python -m app.worker`)
+    JOB_QUEUE_EMBEDDED: bool = True  # Also claim and run jobs inside the API process
+    JOB_LEASE_SECONDS: int = 60  # A job whose lease is not renewed in time is picked up again
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+
+    # Page progress is written to the jobs table at most this often
+    PROGRESS_FLUSH_INTERVAL_MS: int = 500
+    PROGRESS_FLUSH_PAGES: int = 25
+    JOB_EVENTS_INTERVAL_MS: int = 250  # How often SSE/long-poll watchers re-read job state
+
+    # Result cache (outputs keyed by input SHA-256 + tool parameters)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_DIR: str = "data/result_cache"
+    RESULT_CACHE_MAX_MB: int = 2048  # Least recently used entries are evicted beyond this
+
+    # Raster cache (rendered PDF pages keyed by document SHA-256 + page + DPI, shared by the tools)
+    RASTER_CACHE_ENABLED: bool = True
+    RASTER_CACHE_DIR: str = "data/raster_cache"
+    RASTER_CACHE_MAX_MB: int = 2048
+    THUMBNAIL_PREFETCH_PAGES: int = 8  # Organize/split thumbnails queued ahead of the one requested
+
+    # Split, PDF to Word and image tool jobs (app/services/job_store.py) are deleted after this
+    TOOL_JOB_TTL_MINUTES: int = 60
+    IMAGE_BATCH_MAX_FILES: int = 500  # Images per /image-batch/jobs request
+    COMPRESS_BATCH_MAX_FILES: int = 500  # PDFs per /compress-pdf/batch (archives included)
+
     class Config:
         env_file = ".env"
 
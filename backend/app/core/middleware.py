@@ -0,0 +1,107 @@
+"""
+Request body size limit
+
+Rejects a request with 413 as soon as its declared Content-Length, or the
+bytes actually received so far, exceed the limit, before FastAPI parses
+the multipart body.
+
+Multipart bodies are also split on their boundary as they arrive, so a single
+file (part) larger than the per-file limit is refused while it is still
+streaming instead of after Starlette has spooled all of it to disk.
+"""
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Allowance for a part's own headers (Content-Disposition with a long filename, ...)
+PART_OVERHEAD = 64 * 1024
+
+
+def _multipart_delimiter(content_type: bytes) -> Optional[bytes]:
+    """b"\\r\\n--<boundary>" for a multipart/form-data Content-Type, else None."""
+    media_type, _, params = content_type.partition(b";")
+    if media_type.strip().lower() != b"multipart/form-data":
+        return None
+    for param in params.split(b";"):
+        name, _, value = param.strip().partition(b"=")
+        if name.lower() == b"boundary" and value:
+            return b"\r\n--" + value.strip(b'"')
+    return None
+
+
+class BodySizeLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_bytes: int,
+        max_part_bytes: Optional[int] = None,
+        part_limit_exempt: Iterable[str] = ()
+    ):
+        """
+        max_bytes caps the whole body; max_part_bytes (plus PART_OVERHEAD)
+        each multipart part, except on the paths in part_limit_exempt, whose
+        endpoints take larger parts (such as archives) and check them
+        themselves.
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_part_bytes = max_part_bytes
+        self.part_limit_exempt = set(part_limit_exempt)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body is larger than {self.max_bytes // (1024 * 1024)} MB"
+        delimiter = None
+
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    response = JSONResponse({"detail": detail}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+            elif name == b"content-type":
+                delimiter = _multipart_delimiter(value)
+
+        if self.max_part_bytes is None or scope["path"] in self.part_limit_exempt:
+            delimiter = None
+        part_detail = f"Uploaded file is larger than {(self.max_part_bytes or 0) // (1024 * 1024)} MB"
+
+        received = 0
+        part = 0
+        # The body starts with "--<boundary>", i.e. the delimiter minus its CRLF
+        tail = b"\r\n"
+
+        async def limited_receive() -> Message:
+            nonlocal received, part, tail
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if received > self.max_bytes:
+                    # Chunked upload without (or lying about) Content-Length.
+                    # Raised inside the route's body parsing, so FastAPI turns it into a 413.
+                    raise HTTPException(status_code=413, detail=detail)
+
+                if delimiter is not None and body:
+                    # Keep the end of the previous chunk: a delimiter may straddle two
+                    data = tail + body
+                    start = data.rfind(delimiter)
+                    if start == -1:
+                        part += len(body)
+                    else:
+                        part = len(data) - start - len(delimiter)
+                    tail = data[-(len(delimiter) - 1):]
+                    if part > self.max_part_bytes + PART_OVERHEAD:
+                        raise HTTPException(status_code=413, detail=part_detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
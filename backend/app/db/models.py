@@ -13,6 +13,7 @@ class Job(Base):
     original_filename = Column(String(255))
     mime_type = Column(String(100))
     file_size_bytes = Column(BigInteger)
+    input_sha256 = Column(String(64), nullable=True, index=True)
     
     input_path = Column(String(512))
     output_dir = Column(String(512))
@@ -24,12 +25,20 @@ class Job(Base):
     total_pages = Column(Integer, nullable=True)
     processed_pages = Column(Integer, default=0)
     page_order = Column(Text, nullable=True)  # CSV of page indices for organize tool
+    params = Column(Text, nullable=True)  # JSON run arguments for queued jobs (e.g. merge file order)
+    result = Column(Text, nullable=True)  # JSON tool output for job_store tools (sizes, dimensions, ...)
+    batch_id = Column(String(36), nullable=True, index=True)  # Parent job of a batch (e.g. batch compress)
     
     error_code = Column(String(50), nullable=True)
     error_message = Column(Text, nullable=True)
     
     request_ip = Column(String(45), nullable=True)
     
+    # Job queue lease (see app/services/job_queue.py)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    attempts = Column(Integer, default=0)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     expires_at = Column(DateTime, index=True)
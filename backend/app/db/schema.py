@@ -0,0 +1,45 @@
+"""
+Schema upgrade - Add model columns that are missing from existing tables
+
+create_all() only creates tables that do not exist yet, so databases created
+by an older release would lack newly added columns. New columns are always
+nullable (or have a Python-side default), so adding them in place is safe.
+"""
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from app.db.session import Base
+from app.db import models  # noqa: F401  Registers tables on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(engine: Engine):
+    """Create missing tables, then add any missing columns and their indexes."""
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+            except DBAPIError:
+                # Another API/worker process starting at the same time may have added it
+                current = {c["name"] for c in inspect(engine).get_columns(table.name)}
+                if column.name not in current:
+                    raise
+
+        missing_names = {column.name for column in missing}
+        for index in table.indexes:
+            if missing_names & {column.name for column in index.columns}:
+                index.create(bind=engine, checkfirst=True)
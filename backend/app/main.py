@@ -9,17 +9,35 @@ app = FastAPI(
 # Cleanup scheduler
 from app.services.cleanup import cleanup_old_jobs_on_startup
 from app.services.scheduler import scheduler
+from app.services.executor import executor
+from app.services.loop_monitor import loop_monitor
+from app.services.job_queue import job_queue
+from app.services.job_events import job_events
+from app.services.job_store import job_store
+from app.services.result_cache import result_cache
+from app.services.raster_cache import raster_cache
 
 @app.on_event("startup")
 async def startup_event():
-    """Run cleanup on startup and start periodic scheduler."""
+    """Run cleanup on startup and start periodic scheduler, job executor, job store, job queue, job events and loop monitor."""
     cleanup_old_jobs_on_startup()
     scheduler.start()
+    executor.start()
+    job_store.start()
+    if settings.JOB_QUEUE_EMBEDDED:
+        job_queue.start()
+    job_events.start()
+    loop_monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Stop scheduler on shutdown."""
+    """Stop scheduler, job queue, job store, job executor, job events and loop monitor on shutdown."""
+    loop_monitor.stop()
+    job_events.stop()
     scheduler.stop()
+    job_queue.stop()
+    job_store.stop()
+    executor.stop()
 
 from fastapi import Request
 from fastapi.responses import HTMLResponse
@@ -35,6 +53,7 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.middleware import BodySizeLimitMiddleware
 
 # Security Headers (Basic)
 app.add_middleware(
@@ -50,6 +69,15 @@ app.add_middleware(
     allowed_hosts=settings.ALLOWED_HOSTS
 )
 
+# Reject oversize request bodies, and oversize files in them, before they are parsed
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.MAX_REQUEST_SIZE_MB * 1024 * 1024,
+    max_part_bytes=settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+    # ZIP archives of PDFs, limited per extracted file
+    part_limit_exempt=[f"{settings.API_V1_STR}/compress-pdf/batch"]
+)
+
 # Mount static directory for assets (CSS/JS)
 # Mount static directory for assets (CSS/JS)
 import os
@@ -65,7 +93,15 @@ def read_root(request: Request):
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "event_loop": loop_monitor.stats(),
+        "executor": executor.stats(),
+        "job_queue": job_queue.stats(),
+        "job_events": job_events.stats(),
+        "result_cache": result_cache.stats(),
+        "raster_cache": raster_cache.stats()
+    }
 
 # API Controllers (JSON)
 from app.controllers.api import jobs as api_jobs
@@ -76,7 +112,9 @@ from app.controllers.api import merge as api_merge
 from app.controllers.api import compress as api_compress
 from app.controllers.api import ocr as api_ocr # Added for OCR
 from app.controllers.api import deskew as api_deskew # Added for Deskew
+from app.controllers.api import pipeline as api_pipeline
 from app.controllers.api import cleanup_admin
+from app.controllers.api import job_events as api_job_events
 from app.routers import split_pdf  # Split PDF router
 from app.routers import pdf_to_word  # PDF to Word router
 from app.routers import image_converter  # Image Converter router
@@ -86,14 +124,16 @@ from app.routers import image_cropper  # Image Cropper router
 from app.routers import image_filters  # Image Filters router
 from app.routers import image_rotate  # Image Rotate & Flip router
 from app.routers import image_watermark  # Image Watermark router
+from app.routers import image_batch  # Image Batch router
 from app.routers import markdown_pdf  # Markdown to PDF router
 from app.controllers.api import table_extractor # Added for Table Extractor
 from app.controllers.api import receipt_scanner # Added for Receipt Scanner
 from app.controllers.api import network_tools # Added for Network Tools
 from app.controllers.api import security_tools # Added for Security Tools
-from app.db.session import Base, engine
+from app.db.session import engine
+from app.db.schema import upgrade_schema
 
-Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app.include_router(api_jobs.router, prefix=settings.API_V1_STR, tags=["api_jobs"])
 app.include_router(api_files.router, prefix="/files", tags=["api_files"])
@@ -103,6 +143,8 @@ app.include_router(api_merge.router, prefix=settings.API_V1_STR, tags=["api_merg
 app.include_router(api_compress.router, prefix=settings.API_V1_STR, tags=["api_compress"])
 app.include_router(api_ocr.router, prefix=settings.API_V1_STR, tags=["api_ocr"])
 app.include_router(api_deskew.router, prefix=settings.API_V1_STR, tags=["api_deskew"])
+app.include_router(api_pipeline.router, prefix=settings.API_V1_STR, tags=["api_pipeline"])
+app.include_router(api_job_events.router, prefix=settings.API_V1_STR, tags=["api_job_events"])
 app.include_router(table_extractor.router, prefix=settings.API_V1_STR, tags=["api_table_extractor"])
 app.include_router(split_pdf.router, prefix=settings.API_V1_STR, tags=["split_pdf"])
 app.include_router(pdf_to_word.router, prefix=settings.API_V1_STR, tags=["pdf_to_word"])
@@ -113,6 +155,7 @@ app.include_router(image_cropper.router, prefix=settings.API_V1_STR, tags=["imag
 app.include_router(image_filters.router, prefix=settings.API_V1_STR, tags=["image_filters"])
 app.include_router(image_rotate.router, prefix=settings.API_V1_STR, tags=["image_rotate"])
 app.include_router(image_watermark.router, prefix=settings.API_V1_STR, tags=["image_watermark"])
+app.include_router(image_batch.router, prefix=settings.API_V1_STR, tags=["image_batch"])
 app.include_router(markdown_pdf.router, prefix=settings.API_V1_STR, tags=["markdown_pdf"])
 app.include_router(receipt_scanner.router, prefix=settings.API_V1_STR, tags=["Receipt Scanner"])
 app.include_router(network_tools.router, prefix=settings.API_V1_STR, tags=["Network Tools"])
@@ -0,0 +1,281 @@
+"""
+Image Batch API Router
+Runs one image tool with one set of options over many images in a single
+request and streams the results back as a ZIP while they finish
+"""
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from concurrent.futures import as_completed
+from typing import List, Optional
+from pathlib import Path
+import json
+import shutil
+import time
+import uuid
+
+from app.core.config import settings
+from app.tools.image_compressor import ImageCompressorTool
+from app.tools.image_converter import ImageConverterTool
+from app.tools.image_cropper import ImageCropperTool
+from app.tools.image_filters import ImageFiltersTool
+from app.tools.image_resizer import ImageResizerTool
+from app.tools.image_rotate import ImageRotateTool
+from app.tools.image_watermark import ImageWatermarkTool
+from app.schemas.image import (
+    ApplyFiltersRequest,
+    CompressRequest,
+    ConvertRequest,
+    CropRequest,
+    ResizeRequest,
+    TransformRequest,
+    WatermarkRequest,
+)
+from app.services.executor import executor
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.zip_generator import zip_generator
+
+router = APIRouter(prefix="/image-batch", tags=["image-batch"])
+
+# Batch working directory (removed once the ZIP has been sent)
+JOBS_DIR = Path("data/image_batch_jobs")
+JOBS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Tool name -> the options model its single-image endpoint takes
+BATCH_TOOLS = {
+    "image_compressor": CompressRequest,
+    "image_converter": ConvertRequest,
+    "image_resizer": ResizeRequest,
+    "image_cropper": CropRequest,
+    "image_filters": ApplyFiltersRequest,
+    "image_rotate": TransformRequest,
+    "image_watermark": WatermarkRequest,
+}
+
+
+def _output_ext(input_path: Path, output_format: Optional[str]) -> str:
+    if not output_format:
+        return input_path.suffix.lower()
+    output_format = output_format.lower()
+    return ".jpg" if output_format == "jpeg" else f".{output_format}"
+
+
+def process_batch_item(
+    tool: str,
+    input_path: str,
+    output_stem: str,
+    options: dict,
+    logo_path: Optional[str] = None
+) -> dict:
+    """Worker task: run one tool on one image of a batch, as its single-image endpoint would"""
+    input_path = Path(input_path)
+    options = dict(options)
+
+    if tool == "image_converter":
+        target_format = options.pop("format").lower()
+        output_path = f"{output_stem}{_output_ext(input_path, target_format)}"
+        return ImageConverterTool().convert_image(str(input_path), output_path, target_format, **options)
+
+    if tool == "image_rotate":
+        rotate_tool = ImageRotateTool(str(input_path))
+        transformed_image = rotate_tool.apply_transforms(options["rotation"], options["flip_h"], options["flip_v"])
+        output_format = options["output_format"] or rotate_tool.original_format.lower()
+        output_path = f"{output_stem}.{output_format}"
+        return rotate_tool.save(output_path, transformed_image, output_format, options["quality"])
+
+    if tool == "image_watermark":
+        watermark_tool = ImageWatermarkTool(str(input_path))
+        if options["type"] == "text":
+            watermark_tool.add_text_watermark(
+                text=options["text"],
+                size=options["text_size"],
+                color=options["text_color"],
+                opacity=options["opacity"],
+                rotation=options["rotation"],
+                position=options["position"]
+            )
+        else:
+            watermark_tool.add_logo_watermark(
+                logo_path=logo_path,
+                scale=options["logo_scale"],
+                opacity=options["opacity"],
+                rotation=options["rotation"],
+                position=options["position"]
+            )
+        output_format = options["output_format"] or watermark_tool.original_format.lower()
+        output_path = f"{output_stem}.{output_format}"
+        return watermark_tool.save(output_path, format=output_format, quality=options["quality"])
+
+    output_path = f"{output_stem}{_output_ext(input_path, options.get('output_format'))}"
+    if tool == "image_compressor":
+        result = ImageCompressorTool().compress_image(str(input_path), output_path, **options)
+    elif tool == "image_resizer":
+        result = ImageResizerTool().resize_image(str(input_path), output_path, **options)
+    elif tool == "image_cropper":
+        result = ImageCropperTool().crop_image(str(input_path), output_path, **options)
+    else:
+        result = ImageFiltersTool().apply_filters(str(input_path), output_path, **options)
+    result.setdefault("output_path", output_path)
+    return result
+
+
+def _parse_options(tool: str, options: str, logo: Optional[UploadFile]) -> dict:
+    if tool not in BATCH_TOOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported tool. Supported: {', '.join(BATCH_TOOLS)}"
+        )
+
+    try:
+        parsed = BATCH_TOOLS[tool](**json.loads(options or "{}")).dict()
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid options for {tool}: {e}")
+
+    if tool == "image_converter" and parsed["format"].lower() not in ImageConverterTool.SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format. Supported: {ImageConverterTool.SUPPORTED_FORMATS}"
+        )
+    if tool == "image_watermark":
+        if parsed["type"] not in ("text", "logo"):
+            raise HTTPException(status_code=400, detail="Watermark type must be 'text' or 'logo'")
+        if parsed["type"] == "text" and not parsed["text"]:
+            raise HTTPException(status_code=400, detail="Text is required for text watermark")
+        if parsed["type"] == "logo" and logo is None:
+            raise HTTPException(status_code=400, detail="A logo file is required for logo watermark")
+
+    return parsed
+
+
+def _remove_stale_batches():
+    """Drop working directories left behind by batches whose process died mid-stream."""
+    cutoff = time.time() - settings.TOOL_JOB_TTL_MINUTES * 60
+    for batch_dir in JOBS_DIR.iterdir():
+        try:
+            if batch_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(batch_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def _unique_name(name: str, used: set) -> str:
+    stem, suffix = Path(name).stem, Path(name).suffix
+    candidate, n = name, 1
+    while candidate in used:
+        candidate = f"{stem}_{n}{suffix}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def _stream_results(batch_dir: Path, tool: str, options: dict, items: List[dict], futures: dict):
+    """
+    Yield ZIP entries as their items finish (completion order, not upload
+    order), then a manifest.json with every item's result or error.
+    """
+    used_names = set()
+    try:
+        for future in as_completed(futures):
+            item = items[futures[future]]
+            try:
+                result = future.result()
+            except Exception as e:
+                item.update(status="failed", error=str(e))
+                continue
+
+            output_path = Path(result["output_path"])
+            arcname = _unique_name(f"{Path(item['filename']).stem}{output_path.suffix}", used_names)
+            item.update(status="completed", output=arcname, result=result)
+            result.pop("output_path", None)
+            yield arcname, str(output_path)
+
+        manifest = {
+            "tool": tool,
+            "options": options,
+            "total": len(items),
+            "completed": sum(1 for item in items if item["status"] == "completed"),
+            "failed": sum(1 for item in items if item["status"] == "failed"),
+            "items": items
+        }
+        yield "manifest.json", json.dumps(manifest, indent=2, default=str).encode()
+    finally:
+        # Client went away (or we are done): drop work that has not started yet
+        for future in futures:
+            executor.cancel(future)
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+@router.post("/jobs")
+async def create_image_batch(
+    files: List[UploadFile] = File(...),
+    tool: str = Form(...),
+    options: str = Form("{}"),
+    logo: Optional[UploadFile] = File(None)
+):
+    """
+    Run `tool` with `options` (JSON, same fields as that tool's single-image
+    endpoint) over every uploaded image. Images are processed in parallel on
+    the worker pool and the response is a ZIP streamed as they complete;
+    manifest.json at the end lists each image's result or error, so one bad
+    file does not fail the batch.
+    """
+    parsed = _parse_options(tool, options, logo)
+
+    if len(files) > settings.IMAGE_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.IMAGE_BATCH_MAX_FILES} images per batch"
+        )
+
+    await run_in_threadpool(_remove_stale_batches)
+
+    batch_id = str(uuid.uuid4())
+    batch_dir = JOBS_DIR / batch_id
+    batch_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        logo_path = None
+        if logo is not None and parsed.get("type") == "logo":
+            logo_path = batch_dir / "logo"
+            await save_upload(logo, logo_path, kinds=IMAGE_KINDS)
+
+        items = []
+        inputs = []
+        for index, file in enumerate(files):
+            item = {"filename": file.filename, "status": "processing"}
+            items.append(item)
+
+            input_path = batch_dir / f"{index}_input{Path(file.filename or '').suffix.lower()}"
+            try:
+                await save_upload(file, input_path, kinds=IMAGE_KINDS)
+            except HTTPException as e:
+                # Not an image or too large: report it, keep the rest
+                item.update(status="failed", error=e.detail)
+                continue
+            inputs.append((index, input_path))
+    except BaseException:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise
+
+    futures = {
+        executor.submit(
+            "image_batch",
+            process_batch_item,
+            tool,
+            str(input_path),
+            str(batch_dir / f"{index}_output"),
+            parsed,
+            str(logo_path) if logo_path else None
+        ): index
+        for index, input_path in inputs
+    }
+
+    # Entries are compressed serially (workers=1) so each goes out as soon
+    # as it finishes; JPEG/PNG/WebP outputs are stored, BMP/TIFF deflated
+    return StreamingResponse(
+        zip_generator.stream_zip(_stream_results(batch_dir, tool, parsed, items, futures)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{tool}_batch.zip"'}
+    )
@@ -3,16 +3,22 @@ Image Compressor API Router
 Handles image compression with quality control
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
 from pathlib import Path
 import uuid
-import json
 
 from app.tools.image_compressor import ImageCompressorTool
+from app.schemas.image import CompressRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/image-compressor", tags=["image-compressor"])
 
@@ -27,18 +33,9 @@ class CreateJobResponse(BaseModel):
     image_info: dict
 
 
-class CompressRequest(BaseModel):
-    quality: int = 85  # Quality (1-100)
-    target_size_kb: Optional[int] = None  # Target file size in KB
-    max_width: Optional[int] = None  # Maximum width for resizing
-    max_height: Optional[int] = None  # Maximum height for resizing
-    output_format: Optional[str] = None  # Output format (jpg, png, webp, avif, etc.)
-    preset: Optional[str] = None  # Quality preset (maximum, high, balanced, compress, max_compress)
-
-
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     error: Optional[str] = None
     result: Optional[dict] = None  # Compression results when completed
 
@@ -62,11 +59,9 @@ async def create_image_compressor_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / f"input{file_ext}"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     # Get image info
     compressor = ImageCompressorTool()
@@ -78,16 +73,12 @@ async def create_image_compressor_job(file: UploadFile = File(...)):
         shutil.rmtree(job_dir)
         raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'filename': file.filename,
-        'image_info': image_info
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "image_compressor", job_id, file.filename, input_path, job_dir,
+        params={'image_info': image_info},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -97,29 +88,37 @@ async def create_image_compressor_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/compress")
-async def compress_image(job_id: str, request: CompressRequest, background_tasks: BackgroundTasks):
+def compress_image(job_id: str, request: CompressRequest):
     """Compress the image with specified quality"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_compressor")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
+    job_dir = JOBS_DIR / job_id
     
     # Validate quality
     quality = max(1, min(100, request.quality))
     
-    # Update metadata
-    metadata['status'] = 'processing'
-    metadata['quality'] = quality
+    # Claim the job so a double submit cannot start it twice
+    params = {**job['params'], 'quality': quality}
+    if not job_store.claim(job_id, error=None, params=params):
+        raise HTTPException(status_code=409, detail="Job is already processing")
     
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Same image with the same options before: reuse that result
+    input_file = next(job_dir.glob("input.*"), None)
+    digests = [job['input_sha256']] if job['input_sha256'] else None
+    result = None
+    if input_file:
+        result = result_cache.lookup("image_compressor", [input_file], request.dict(), job_dir, digests)
+    if result is not None:
+        if 'output_path' in result:
+            result['output_path'] = str(job_dir / Path(result['output_path']).name)
+        job_store.update(job_id, expect=('processing',), status='completed', result=result)
+        return {"message": "Compression completed", "job_id": job_id, "cached": True}
     
     # Process in background
-    background_tasks.add_task(
+    track_task(job_id, executor.submit(
+        "image_compressor",
         process_image_compression, 
         job_id, 
         quality,
@@ -127,8 +126,9 @@ async def compress_image(job_id: str, request: CompressRequest, background_tasks
         request.max_width,
         request.max_height,
         request.output_format,
-        request.preset
-    )
+        request.preset,
+        cache_params=request.dict()
+    ))
     
     return {"message": "Compression started", "job_id": job_id}
 
@@ -140,7 +140,8 @@ def process_image_compression(
     max_width: Optional[int] = None,
     max_height: Optional[int] = None,
     output_format: Optional[str] = None,
-    preset: Optional[str] = None
+    preset: Optional[str] = None,
+    cache_params: Optional[dict] = None
 ):
     """Background task to compress image with advanced options"""
     job_dir = JOBS_DIR / job_id
@@ -152,13 +153,7 @@ def process_image_compression(
         break
     
     if not input_file:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        metadata['status'] = 'failed'
-        metadata['error'] = 'Input file not found'
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        job_store.update(job_id, expect=('processing',), status='failed', error='Input file not found')
         return
     
     # Determine output format and extension
@@ -170,6 +165,9 @@ def process_image_compression(
     output_path = job_dir / f"output{output_ext}"
     
     try:
+        # A cached result may be hard-linked here; replace rather than overwrite it
+        remove_partial_outputs(str(output_path))
+        
         compressor = ImageCompressorTool()
         result = compressor.compress_image(
             str(input_file), 
@@ -182,51 +180,57 @@ def process_image_compression(
             preset=preset
         )
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
+            return
         
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if cache_params is not None:
+            result_cache.store("image_compressor", [input_file], cache_params, [output_path], result)
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_image_compressor_job(job_id: str):
+    """Cancel a queued or running compression job and discard its output"""
+    
+    job = job_store.get(job_id, "image_compressor")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_image_compressor_status(job_id: str):
+def get_image_compressor_status(job_id: str):
     """Get compression job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_compressor")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        error=metadata.get('error'),
-        result=metadata.get('result')
+        job_id=job_id,
+        status=job['status'],
+        error=job['error'],
+        result=job['result']
     )
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_compressed_image(job_id: str):
+def download_compressed_image(job_id: str, request: Request):
     """Download the compressed image"""
     
+    job = job_store.get(job_id, "image_compressor")
     job_dir = JOBS_DIR / job_id
     
     # Find output file
@@ -235,14 +239,10 @@ async def download_compressed_image(job_id: str):
         output_file = f
         break
     
-    if not output_file or not output_file.exists():
+    if job is None or job['status'] != 'completed' or not output_file or not output_file.exists():
         raise HTTPException(status_code=404, detail="Compressed image not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = Path(metadata.get('filename', 'image')).stem
+    original_name = Path(job['filename'] or 'image').stem
     output_name = f"{original_name}_compressed{output_file.suffix}"
     
     # Determine media type
@@ -255,7 +255,8 @@ async def download_compressed_image(job_id: str):
     
     media_type = media_types.get(output_file.suffix.lower(), 'application/octet-stream')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_file,
         media_type=media_type,
         filename=output_name
@@ -3,16 +3,22 @@ Image Converter API Router
 Handles image format conversion
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
 from pathlib import Path
 import uuid
-import json
 
 from app.tools.image_converter import ImageConverterTool
+from app.schemas.image import ConvertRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/image-converter", tags=["image-converter"])
 
@@ -27,18 +33,9 @@ class CreateJobResponse(BaseModel):
     image_info: dict
 
 
-class ConvertRequest(BaseModel):
-    format: str  # Target format
-    quality: int = 85  # Quality (1-100) for lossy formats
-    target_size_kb: Optional[int] = None  # Target file size in KB
-    max_width: Optional[int] = None  # Maximum width for resizing
-    max_height: Optional[int] = None  # Maximum height for resizing
-    preserve_exif: bool = True  # Preserve EXIF metadata
-
-
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     error: Optional[str] = None
     result: Optional[dict] = None  # Conversion results when completed
 
@@ -62,11 +59,9 @@ async def create_image_converter_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / f"input{file_ext}"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     # Get image info
     converter = ImageConverterTool()
@@ -78,16 +73,12 @@ async def create_image_converter_job(file: UploadFile = File(...)):
         shutil.rmtree(job_dir)
         raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'filename': file.filename,
-        'image_info': image_info
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "image_converter", job_id, file.filename, input_path, job_dir,
+        params={'image_info': image_info},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -97,16 +88,13 @@ async def create_image_converter_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/convert")
-async def convert_image(job_id: str, request: ConvertRequest, background_tasks: BackgroundTasks):
+def convert_image(job_id: str, request: ConvertRequest):
     """Convert the image to specified format"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_converter")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
+    job_dir = JOBS_DIR / job_id
     
     # Validate format
     converter = ImageConverterTool()
@@ -117,16 +105,26 @@ async def convert_image(job_id: str, request: ConvertRequest, background_tasks:
             detail=f"Unsupported format. Supported: {converter.SUPPORTED_FORMATS}"
         )
     
-    # Update metadata
-    metadata['status'] = 'processing'
-    metadata['target_format'] = target_format
-    metadata['quality'] = request.quality
+    # Claim the job so a double submit cannot start it twice
+    params = {**job['params'], 'target_format': target_format, 'quality': request.quality}
+    if not job_store.claim(job_id, error=None, params=params):
+        raise HTTPException(status_code=409, detail="Job is already processing")
     
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Same image with the same options before: reuse that result
+    input_file = next(job_dir.glob("input.*"), None)
+    digests = [job['input_sha256']] if job['input_sha256'] else None
+    result = None
+    if input_file:
+        result = result_cache.lookup("image_converter", [input_file], request.dict(), job_dir, digests)
+    if result is not None:
+        if 'output_path' in result:
+            result['output_path'] = str(job_dir / Path(result['output_path']).name)
+        job_store.update(job_id, expect=('processing',), status='completed', result=result)
+        return {"message": "Conversion completed", "job_id": job_id, "cached": True}
     
     # Process in background
-    background_tasks.add_task(
+    track_task(job_id, executor.submit(
+        "image_converter",
         process_image_conversion, 
         job_id, 
         target_format, 
@@ -134,8 +132,9 @@ async def convert_image(job_id: str, request: ConvertRequest, background_tasks:
         request.target_size_kb,
         request.max_width,
         request.max_height,
-        request.preserve_exif
-    )
+        request.preserve_exif,
+        cache_params=request.dict()
+    ))
     
     return {"message": "Conversion started", "job_id": job_id}
 
@@ -147,7 +146,8 @@ def process_image_conversion(
     target_size_kb: Optional[int] = None,
     max_width: Optional[int] = None,
     max_height: Optional[int] = None,
-    preserve_exif: bool = True
+    preserve_exif: bool = True,
+    cache_params: Optional[dict] = None
 ):
     """Background task to convert image with advanced options"""
     job_dir = JOBS_DIR / job_id
@@ -159,13 +159,7 @@ def process_image_conversion(
         break
     
     if not input_file:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        metadata['status'] = 'failed'
-        metadata['error'] = 'Input file not found'
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        job_store.update(job_id, expect=('processing',), status='failed', error='Input file not found')
         return
     
     # Normalize format extension
@@ -173,6 +167,9 @@ def process_image_conversion(
     output_path = job_dir / f"output.{format_ext}"
     
     try:
+        # A cached result may be hard-linked here; replace rather than overwrite it
+        remove_partial_outputs(str(output_path))
+        
         converter = ImageConverterTool()
         result = converter.convert_image(
             str(input_file),
@@ -185,51 +182,57 @@ def process_image_conversion(
             preserve_exif=preserve_exif
         )
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
+            return
         
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if cache_params is not None:
+            result_cache.store("image_converter", [input_file], cache_params, [output_path], result)
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_image_converter_job(job_id: str):
+    """Cancel a queued or running conversion job and discard its output"""
+    
+    job = job_store.get(job_id, "image_converter")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_image_converter_status(job_id: str):
+def get_image_converter_status(job_id: str):
     """Get conversion job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_converter")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        error=metadata.get('error'),
-        result=metadata.get('result')
+        job_id=job_id,
+        status=job['status'],
+        error=job['error'],
+        result=job['result']
     )
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_converted_image(job_id: str):
+def download_converted_image(job_id: str, request: Request):
     """Download the converted image"""
     
+    job = job_store.get(job_id, "image_converter")
     job_dir = JOBS_DIR / job_id
     
     # Find output file
@@ -238,15 +241,11 @@ async def download_converted_image(job_id: str):
         output_file = f
         break
     
-    if not output_file or not output_file.exists():
+    if job is None or job['status'] != 'completed' or not output_file or not output_file.exists():
         raise HTTPException(status_code=404, detail="Converted image not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = Path(metadata.get('filename', 'image')).stem
-    target_format = metadata.get('target_format', 'png')
+    original_name = Path(job['filename'] or 'image').stem
+    target_format = job['params'].get('target_format', 'png')
     output_name = f"{original_name}.{target_format}"
     
     # Determine media type
@@ -262,7 +261,8 @@ async def download_converted_image(job_id: str):
     
     media_type = media_types.get(target_format, 'application/octet-stream')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_file,
         media_type=media_type,
         filename=output_name
@@ -3,17 +3,24 @@ Image Filters API Router
 Handles image filter application with preview support
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, Response
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Optional
 import os
 from pathlib import Path
 import uuid
-import json
 import base64
 
 from app.tools.image_filters import ImageFiltersTool
+from app.schemas.image import ApplyFiltersRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/image-filters", tags=["image-filters"])
 
@@ -28,30 +35,9 @@ class CreateJobResponse(BaseModel):
     image_info: dict
 
 
-class ApplyFiltersRequest(BaseModel):
-    # Adjustments (0.0 - 2.0, where 1.0 is original)
-    brightness: float = 1.0
-    contrast: float = 1.0
-    saturation: float = 1.0
-    sharpness: float = 1.0
-    
-    # Effects
-    blur: int = 0  # 0-10
-    sharpen: bool = False
-    edge_enhance: bool = False
-    
-    # Filters
-    grayscale: bool = False
-    sepia: bool = False
-    
-    # Output
-    output_format: Optional[str] = None
-    quality: int = 95
-
-
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     error: Optional[str] = None
     result: Optional[dict] = None
 
@@ -75,11 +61,9 @@ async def create_image_filters_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / f"input{file_ext}"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     # Get image info
     filters_tool = ImageFiltersTool()
@@ -91,16 +75,12 @@ async def create_image_filters_job(file: UploadFile = File(...)):
         shutil.rmtree(job_dir)
         raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'filename': file.filename,
-        'image_info': image_info
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "image_filters", job_id, file.filename, input_path, job_dir,
+        params={'image_info': image_info},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -110,26 +90,34 @@ async def create_image_filters_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/apply")
-async def apply_filters(job_id: str, request: ApplyFiltersRequest, background_tasks: BackgroundTasks):
+def apply_filters(job_id: str, request: ApplyFiltersRequest):
     """Apply filters to the image"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_filters")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    job_dir = JOBS_DIR / job_id
     
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    # Update metadata
-    metadata['status'] = 'processing'
-    metadata['filter_options'] = request.dict()
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Claim the job so a double submit cannot start it twice
+    params = {**job['params'], 'filter_options': request.dict()}
+    if not job_store.claim(job_id, error=None, params=params):
+        raise HTTPException(status_code=409, detail="Job is already processing")
+    
+    # Same image with the same options before: reuse that result
+    input_file = next(job_dir.glob("input.*"), None)
+    digests = [job['input_sha256']] if job['input_sha256'] else None
+    result = None
+    if input_file:
+        result = result_cache.lookup("image_filters", [input_file], request.dict(), job_dir, digests)
+    if result is not None:
+        if 'output_path' in result:
+            result['output_path'] = str(job_dir / Path(result['output_path']).name)
+        job_store.update(job_id, expect=('processing',), status='completed', result=result)
+        return {"message": "Filter processing completed", "job_id": job_id, "cached": True}
     
     # Process in background
-    background_tasks.add_task(
+    track_task(job_id, executor.submit(
+        "image_filters",
         process_image_filters,
         job_id,
         request.brightness,
@@ -142,8 +130,9 @@ async def apply_filters(job_id: str, request: ApplyFiltersRequest, background_ta
         request.grayscale,
         request.sepia,
         request.output_format,
-        request.quality
-    )
+        request.quality,
+        cache_params=request.dict()
+    ))
     
     return {"message": "Filter processing started", "job_id": job_id}
 
@@ -160,7 +149,8 @@ def process_image_filters(
     grayscale: bool,
     sepia: bool,
     output_format: Optional[str],
-    quality: int
+    quality: int,
+    cache_params: Optional[dict] = None
 ):
     """Background task to apply filters"""
     job_dir = JOBS_DIR / job_id
@@ -172,13 +162,7 @@ def process_image_filters(
         break
     
     if not input_file:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        metadata['status'] = 'failed'
-        metadata['error'] = 'Input file not found'
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        job_store.update(job_id, expect=('processing',), status='failed', error='Input file not found')
         return
     
     # Determine output format and extension
@@ -190,6 +174,9 @@ def process_image_filters(
     output_path = job_dir / f"output{output_ext}"
     
     try:
+        # A cached result may be hard-linked here; replace rather than overwrite it
+        remove_partial_outputs(str(output_path))
+        
         filters_tool = ImageFiltersTool()
         result = filters_tool.apply_filters(
             str(input_file),
@@ -207,51 +194,57 @@ def process_image_filters(
             quality=quality
         )
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
+            return
         
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if cache_params is not None:
+            result_cache.store("image_filters", [input_file], cache_params, [output_path], result)
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_image_filters_job(job_id: str):
+    """Cancel a queued or running filter job and discard its output"""
+    
+    job = job_store.get(job_id, "image_filters")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_image_filters_status(job_id: str):
+def get_image_filters_status(job_id: str):
     """Get filter job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_filters")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        error=metadata.get('error'),
-        result=metadata.get('result')
+        job_id=job_id,
+        status=job['status'],
+        error=job['error'],
+        result=job['result']
     )
 
 
 @router.get("/jobs/{job_id}/preview")
-async def get_preview_image(job_id: str):
+def get_preview_image(job_id: str):
     """Get base64-encoded preview of processed image for display"""
     
+    job = job_store.get(job_id, "image_filters")
     job_dir = JOBS_DIR / job_id
     
     # Find output file
@@ -260,7 +253,7 @@ async def get_preview_image(job_id: str):
         output_file = f
         break
     
-    if not output_file or not output_file.exists():
+    if job is None or job['status'] != 'completed' or not output_file or not output_file.exists():
         raise HTTPException(status_code=404, detail="Processed image not ready")
     
     # Read and encode as base64
@@ -291,9 +284,10 @@ async def get_preview_image(job_id: str):
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_filtered_image(job_id: str):
+def download_filtered_image(job_id: str, request: Request):
     """Download the filtered image"""
     
+    job = job_store.get(job_id, "image_filters")
     job_dir = JOBS_DIR / job_id
     
     # Find output file
@@ -302,14 +296,10 @@ async def download_filtered_image(job_id: str):
         output_file = f
         break
     
-    if not output_file or not output_file.exists():
+    if job is None or job['status'] != 'completed' or not output_file or not output_file.exists():
         raise HTTPException(status_code=404, detail="Filtered image not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = Path(metadata.get('filename', 'image')).stem
+    original_name = Path(job['filename'] or 'image').stem
     output_name = f"{original_name}_filtered{output_file.suffix}"
     
     # Determine media type
@@ -326,7 +316,8 @@ async def download_filtered_image(job_id: str):
     
     media_type = media_types.get(output_file.suffix.lower(), 'application/octet-stream')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_file,
         media_type=media_type,
         filename=output_name
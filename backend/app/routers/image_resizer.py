@@ -3,16 +3,22 @@ Image Resizer API Router
 Handles image resizing with multiple methods
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
 from pathlib import Path
 import uuid
-import json
 
 from app.tools.image_resizer import ImageResizerTool
+from app.schemas.image import ResizeRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/image-resizer", tags=["image-resizer"])
 
@@ -27,23 +33,9 @@ class CreateJobResponse(BaseModel):
     image_info: dict
 
 
-class ResizeRequest(BaseModel):
-    # Resize methods (priority: preset > scale_percent > width/height)
-    width: Optional[int] = None
-    height: Optional[int] = None
-    scale_percent: Optional[float] = None
-    preset: Optional[str] = None
-    
-    # Options
-    maintain_aspect: bool = True
-    resampling: str = 'lanczos'
-    output_format: Optional[str] = None
-    quality: int = 85
-
-
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     error: Optional[str] = None
     result: Optional[dict] = None
 
@@ -67,11 +59,9 @@ async def create_image_resizer_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / f"input{file_ext}"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     # Get image info
     resizer = ImageResizerTool()
@@ -83,16 +73,12 @@ async def create_image_resizer_job(file: UploadFile = File(...)):
         shutil.rmtree(job_dir)
         raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'filename': file.filename,
-        'image_info': image_info
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "image_resizer", job_id, file.filename, input_path, job_dir,
+        params={'image_info': image_info},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -102,26 +88,34 @@ async def create_image_resizer_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/resize")
-async def resize_image(job_id: str, request: ResizeRequest, background_tasks: BackgroundTasks):
+def resize_image(job_id: str, request: ResizeRequest):
     """Resize the image with specified options"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_resizer")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    job_dir = JOBS_DIR / job_id
     
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    # Update metadata
-    metadata['status'] = 'processing'
-    metadata['resize_options'] = request.dict()
+    # Claim the job so a double submit cannot start it twice
+    params = {**job['params'], 'resize_options': request.dict()}
+    if not job_store.claim(job_id, error=None, params=params):
+        raise HTTPException(status_code=409, detail="Job is already processing")
     
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Same image with the same options before: reuse that result
+    input_file = next(job_dir.glob("input.*"), None)
+    digests = [job['input_sha256']] if job['input_sha256'] else None
+    result = None
+    if input_file:
+        result = result_cache.lookup("image_resizer", [input_file], request.dict(), job_dir, digests)
+    if result is not None:
+        if 'output_path' in result:
+            result['output_path'] = str(job_dir / Path(result['output_path']).name)
+        job_store.update(job_id, expect=('processing',), status='completed', result=result)
+        return {"message": "Resize completed", "job_id": job_id, "cached": True}
     
     # Process in background
-    background_tasks.add_task(
+    track_task(job_id, executor.submit(
+        "image_resizer",
         process_image_resize, 
         job_id,
         request.width,
@@ -131,8 +125,9 @@ async def resize_image(job_id: str, request: ResizeRequest, background_tasks: Ba
         request.maintain_aspect,
         request.resampling,
         request.output_format,
-        request.quality
-    )
+        request.quality,
+        cache_params=request.dict()
+    ))
     
     return {"message": "Resize started", "job_id": job_id}
 
@@ -146,7 +141,8 @@ def process_image_resize(
     maintain_aspect: bool = True,
     resampling: str = 'lanczos',
     output_format: Optional[str] = None,
-    quality: int = 85
+    quality: int = 85,
+    cache_params: Optional[dict] = None
 ):
     """Background task to resize image"""
     job_dir = JOBS_DIR / job_id
@@ -158,13 +154,7 @@ def process_image_resize(
         break
     
     if not input_file:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        metadata['status'] = 'failed'
-        metadata['error'] = 'Input file not found'
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        job_store.update(job_id, expect=('processing',), status='failed', error='Input file not found')
         return
     
     # Determine output format and extension
@@ -176,6 +166,9 @@ def process_image_resize(
     output_path = job_dir / f"output{output_ext}"
     
     try:
+        # A cached result may be hard-linked here; replace rather than overwrite it
+        remove_partial_outputs(str(output_path))
+        
         resizer = ImageResizerTool()
         result = resizer.resize_image(
             str(input_file),
@@ -190,51 +183,57 @@ def process_image_resize(
             quality=quality
         )
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
+            return
         
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if cache_params is not None:
+            result_cache.store("image_resizer", [input_file], cache_params, [output_path], result)
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_image_resizer_job(job_id: str):
+    """Cancel a queued or running resize job and discard its output"""
+    
+    job = job_store.get(job_id, "image_resizer")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_image_resizer_status(job_id: str):
+def get_image_resizer_status(job_id: str):
     """Get resize job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "image_resizer")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        error=metadata.get('error'),
-        result=metadata.get('result')
+        job_id=job_id,
+        status=job['status'],
+        error=job['error'],
+        result=job['result']
     )
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_resized_image(job_id: str):
+def download_resized_image(job_id: str, request: Request):
     """Download the resized image"""
     
+    job = job_store.get(job_id, "image_resizer")
     job_dir = JOBS_DIR / job_id
     
     # Find output file
@@ -243,14 +242,10 @@ async def download_resized_image(job_id: str):
         output_file = f
         break
     
-    if not output_file or not output_file.exists():
+    if job is None or job['status'] != 'completed' or not output_file or not output_file.exists():
         raise HTTPException(status_code=404, detail="Resized image not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = Path(metadata.get('filename', 'image')).stem
+    original_name = Path(job['filename'] or 'image').stem
     output_name = f"{original_name}_resized{output_file.suffix}"
     
     # Determine media type
@@ -267,7 +262,8 @@ async def download_resized_image(job_id: str):
     
     media_type = media_types.get(output_file.suffix.lower(), 'application/octet-stream')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_file,
         media_type=media_type,
         filename=output_name
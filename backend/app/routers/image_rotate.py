@@ -1,32 +1,24 @@
-from fastapi import APIRouter, UploadFile, HTTPException, File
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, UploadFile, HTTPException, File, Request
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
+import asyncio
 import uuid
 import os
-import shutil
 from pathlib import Path
 
 from app.tools.image_rotate import ImageRotateTool
+from app.schemas.image import TransformRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
 
 router = APIRouter(prefix="/image-rotate", tags=["Image Tools"])
 
-# Storage directories
-UPLOAD_DIR = Path("uploads/image-rotate")
-OUTPUT_DIR = Path("outputs/image-rotate")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# In-memory job storage (in production, use a database)
-jobs = {}
-
-
-class TransformRequest(BaseModel):
-    rotation: float = 0
-    flip_h: bool = False
-    flip_v: bool = False
-    output_format: Optional[str] = None
-    quality: int = 95
+# Job storage directory
+JOBS_DIR = Path("data/image_rotate_jobs")
+JOBS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @router.post("/upload")
@@ -42,41 +34,42 @@ async def upload_image(file: UploadFile = File(...)):
     
     # Generate job ID
     job_id = str(uuid.uuid4())
+    job_dir = JOBS_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
     
     # Save uploaded file
     file_extension = os.path.splitext(file.filename)[1]
-    input_path = UPLOAD_DIR / f"{job_id}{file_extension}"
+    input_path = job_dir / f"input{file_extension}"
     
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     try:
         # Get image info
         tool = ImageRotateTool(str(input_path))
         image_info = tool.get_image_info()
-        
-        # Store job info
-        jobs[job_id] = {
-            'status': 'uploaded',
-            'input_path': str(input_path),
-            'output_path': None,
-            'original_filename': file.filename,
-            'image_info': image_info,
-            'current_state': {'rotation': 0, 'flip_h': False, 'flip_v': False}
-        }
-        
-        return {
-            'job_id': job_id,
-            'status': 'uploaded',
-            'image_info': image_info,
-            'original_filename': file.filename
-        }
     
     except Exception as e:
         # Clean up on error
-        if input_path.exists():
-            os.remove(input_path)
+        remove_partial_outputs(str(job_dir))
         raise HTTPException(status_code=400, detail=f"Failed to process image: {str(e)}")
+    
+    # Store job info
+    await run_in_threadpool(
+        job_store.create, "image_rotate", job_id, file.filename, input_path, job_dir,
+        params={
+            'image_info': image_info,
+            'current_state': {'rotation': 0, 'flip_h': False, 'flip_v': False}
+        },
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
+    
+    return {
+        'job_id': job_id,
+        'status': 'uploaded',
+        'image_info': image_info,
+        'original_filename': file.filename
+    }
 
 
 @router.post("/jobs/{job_id}/transform")
@@ -84,117 +77,143 @@ async def apply_transformation(job_id: str, request: TransformRequest):
     """
     Apply transformation operations (rotate/flip) to uploaded image
     """
-    if job_id not in jobs:
+    job = await run_in_threadpool(job_store.get, job_id, "image_rotate")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
     try:
-        # Load the image
-        tool = ImageRotateTool(job['input_path'])
+        await run_in_threadpool(job_store.update, job_id, status='processing', error=None)
         
-        # Apply transformation
-        transformed_image = tool.apply_transforms(
+        # Run the transformation in a worker process
+        future = executor.submit(
+            "image_rotate",
+            process_image_transform,
+            job_id,
+            job['input_path'],
             request.rotation,
             request.flip_h,
-            request.flip_v
-        )
-        
-        # Prepare output path
-        output_format = request.output_format or tool.original_format.lower()
-        output_path = OUTPUT_DIR / f"{job_id}.{output_format}"
-        
-        # Save transformed image
-        save_info = tool.save(
-            str(output_path),
-            transformed_image,
-            output_format,
+            request.flip_v,
+            request.output_format,
             request.quality
         )
+        track_task(job_id, future)
+        save_info = await asyncio.wrap_future(future)
         
         # Update job
-        job['status'] = 'completed'
-        job['output_path'] = str(output_path)
-        job['current_state'] = {
+        current_state = {
             'rotation': request.rotation,
             'flip_h': request.flip_h,
             'flip_v': request.flip_v
         }
-        job['output_info'] = save_info
+        params = {**job['params'], 'current_state': current_state}
+        if not await run_in_threadpool(job_store.update, job_id, status='completed', params=params, result=save_info):
+            # Deleted while the worker was running
+            remove_partial_outputs(save_info['output_path'])
+            raise HTTPException(status_code=409, detail="Job was cancelled")
         
         return {
             'job_id': job_id,
             'status': 'completed',
-            'state': job['current_state'],
+            'state': current_state,
             'output_info': save_info
         }
     
+    except asyncio.CancelledError:
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+    except HTTPException:
+        raise
     except ValueError as e:
+        await run_in_threadpool(job_store.update, job_id, status='failed', error=str(e))
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        job['status'] = 'failed'
-        job['error'] = str(e)
+        await run_in_threadpool(job_store.update, job_id, status='failed', error=str(e))
         raise HTTPException(status_code=500, detail=f"Transformation failed: {str(e)}")
 
 
+def process_image_transform(
+    job_id: str,
+    input_path: str,
+    rotation: float,
+    flip_h: bool,
+    flip_v: bool,
+    output_format: Optional[str],
+    quality: int
+) -> dict:
+    """Worker task to rotate/flip an image and save the result"""
+    # Load the image
+    tool = ImageRotateTool(input_path)
+    
+    # Apply transformation
+    transformed_image = tool.apply_transforms(rotation, flip_h, flip_v)
+    
+    # Prepare output path
+    output_format = output_format or tool.original_format.lower()
+    output_path = JOBS_DIR / job_id / f"output.{output_format}"
+    
+    # Save transformed image
+    return tool.save(
+        str(output_path),
+        transformed_image,
+        output_format,
+        quality
+    )
+
+
 @router.get("/jobs/{job_id}/status")
-async def get_job_status(job_id: str):
+def get_job_status(job_id: str):
     """Get the status of a job"""
-    if job_id not in jobs:
+    job = job_store.get(job_id, "image_rotate")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     return {
         'job_id': job_id,
         'status': job['status'],
-        'current_operation': job.get('current_operation', 'none'),
-        'image_info': job.get('image_info'),
-        'output_info': job.get('output_info'),
-        'error': job.get('error')
+        'current_operation': job['params'].get('current_operation', 'none'),
+        'image_info': job['params'].get('image_info'),
+        'output_info': job['result'],
+        'error': job['error']
     }
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_result(job_id: str):
+def download_result(job_id: str, request: Request):
     """Download the transformed image"""
-    if job_id not in jobs:
+    job = job_store.get(job_id, "image_rotate")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
     if job['status'] != 'completed':
         raise HTTPException(status_code=400, detail="Job not completed")
     
-    if not job['output_path'] or not os.path.exists(job['output_path']):
+    output_path = job['result'].get('output_path')
+    if not output_path or not os.path.exists(output_path):
         raise HTTPException(status_code=404, detail="Output file not found")
     
     # Generate download filename
-    original_name = os.path.splitext(job['original_filename'])[0]
-    output_ext = os.path.splitext(job['output_path'])[1]
+    original_name = os.path.splitext(job['filename'])[0]
+    output_ext = os.path.splitext(output_path)[1]
     download_filename = f"{original_name}_transformed{output_ext}"
     
-    return FileResponse(
-        job['output_path'],
+    return file_download(
+        request,
+        output_path,
         media_type='image/*',
         filename=download_filename
     )
 
 
 @router.delete("/jobs/{job_id}")
-async def delete_job(job_id: str):
-    """Clean up job files"""
-    if job_id not in jobs:
+def delete_job(job_id: str):
+    """Cancel any pending transformation and clean up job files"""
+    if not job_store.delete(job_id, "image_rotate"):
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
+    # A transformation still waiting for a worker is dropped; one already
+    # running is discarded by apply_transformation when it returns
+    cancel_task(job_id)
     
     # Delete files
-    if job['input_path'] and os.path.exists(job['input_path']):
-        os.remove(job['input_path'])
-    if job.get('output_path') and os.path.exists(job['output_path']):
-        os.remove(job['output_path'])
-    
-    # Remove from jobs
-    del jobs[job_id]
+    remove_partial_outputs(str(JOBS_DIR / job_id))
     
     return {'message': 'Job deleted successfully'}
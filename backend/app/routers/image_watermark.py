@@ -1,45 +1,24 @@
-from fastapi import APIRouter, UploadFile, HTTPException, File, Form
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, UploadFile, HTTPException, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
+import asyncio
 import uuid
 import os
-import shutil
 from pathlib import Path
 
 from app.tools.image_watermark import ImageWatermarkTool
+from app.schemas.image import WatermarkRequest
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.uploads import IMAGE_KINDS, save_upload
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
 
 router = APIRouter(prefix="/image-watermark", tags=["Image Tools"])
 
-# Storage directories
-UPLOAD_DIR = Path("uploads/image-watermark")
-OUTPUT_DIR = Path("outputs/image-watermark")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# In-memory job storage
-jobs = {}
-
-class WatermarkRequest(BaseModel):
-    type: str # 'text' or 'logo'
-    
-    # Text params
-    text: Optional[str] = None
-    text_size: Optional[int] = 40
-    text_color: Optional[str] = "#ffffff"
-    
-    # Logo params (assumes logo is already uploaded and linked to job)
-    logo_job_id: Optional[str] = None
-    logo_scale: Optional[int] = 20
-    
-    # Common params
-    opacity: int = 50
-    rotation: int = 0
-    position: str = "bottom-right"
-    
-    output_format: Optional[str] = None
-    quality: int = 95
-
+# Job storage directory
+JOBS_DIR = Path("data/image_watermark_jobs")
+JOBS_DIR.mkdir(parents=True, exist_ok=True)
 
 @router.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
@@ -48,99 +27,98 @@ async def upload_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be an image")
     
     job_id = str(uuid.uuid4())
+    job_dir = JOBS_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
     file_extension = os.path.splitext(file.filename)[1]
-    input_path = UPLOAD_DIR / f"{job_id}{file_extension}"
+    input_path = job_dir / f"input{file_extension}"
     
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    jobs[job_id] = {
-        'status': 'uploaded',
-        'input_path': str(input_path),
-        'original_filename': file.filename,
-        'logos': {} # Store uploaded logos for this job
-    }
+    upload = await save_upload(file, input_path, kinds=IMAGE_KINDS)
     
     # Get basic info
+    image_info = None
     try:
         tool = ImageWatermarkTool(str(input_path))
-        jobs[job_id]['image_info'] = {
+        image_info = {
             'width': tool.original_size[0],
             'height': tool.original_size[1],
             'format': tool.original_format
         }
     except Exception:
         pass
+    
+    await run_in_threadpool(
+        job_store.create, "image_watermark", job_id, file.filename, input_path, job_dir,
+        params={'image_info': image_info},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
 
     return {
         'job_id': job_id, 
         'status': 'uploaded',
-        'image_info': jobs[job_id].get('image_info')
+        'image_info': image_info
     }
 
+def _logo_path(job_id: str, logo_id: str) -> Optional[Path]:
+    # Logos are stored in the job directory as logo_<uuid>; PIL does not need the extension
+    try:
+        logo_id = str(uuid.UUID(logo_id))
+    except ValueError:
+        return None
+    return JOBS_DIR / job_id / f"logo_{logo_id}"
+
 @router.post("/jobs/{job_id}/upload-logo")
 async def upload_logo(job_id: str, file: UploadFile = File(...)):
     """Upload a logo image for a specific job"""
-    if job_id not in jobs:
+    if await run_in_threadpool(job_store.get, job_id, "image_watermark") is None:
         raise HTTPException(status_code=404, detail="Job not found")
         
     logo_id = str(uuid.uuid4())
-    file_extension = os.path.splitext(file.filename)[1]
-    logo_path = UPLOAD_DIR / f"logo_{job_id}_{logo_id}{file_extension}"
     
-    with open(logo_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    jobs[job_id]['logos'][logo_id] = str(logo_path)
+    await save_upload(file, _logo_path(job_id, logo_id), kinds=IMAGE_KINDS)
     
     return {'logo_id': logo_id}
 
 @router.post("/jobs/{job_id}/transform")
 async def apply_watermark(job_id: str, request: WatermarkRequest):
-    if job_id not in jobs:
+    job = await run_in_threadpool(job_store.get, job_id, "image_watermark")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-        
-    job = jobs[job_id]
     
     try:
-        tool = ImageWatermarkTool(job['input_path'])
+        logo_path = None
         
         if request.type == 'text':
             if not request.text:
                 raise HTTPException(status_code=400, detail="Text is required")
-                
-            tool.add_text_watermark(
-                text=request.text,
-                size=request.text_size,
-                color=request.text_color,
-                opacity=request.opacity,
-                rotation=request.rotation,
-                position=request.position
-            )
             
         elif request.type == 'logo':
             if not request.logo_job_id:
                 raise HTTPException(status_code=400, detail="Logo ID is required")
                 
-            logo_path = job['logos'].get(request.logo_job_id)
-            if not logo_path:
+            logo_path = _logo_path(job_id, request.logo_job_id)
+            if not logo_path or not logo_path.exists():
                 raise HTTPException(status_code=404, detail="Logo file not found")
-                
-            tool.add_logo_watermark(
-                logo_path=logo_path,
-                scale=request.logo_scale,
-                opacity=request.opacity,
-                rotation=request.rotation,
-                position=request.position
-            )
-            
-        output_format = request.output_format or tool.original_format.lower()
-        output_path = OUTPUT_DIR / f"{job_id}.{output_format}"
+            logo_path = str(logo_path)
         
-        save_info = tool.save(str(output_path), format=output_format, quality=request.quality)
+        await run_in_threadpool(job_store.update, job_id, status='processing', error=None)
         
-        job['output_path'] = str(output_path)
-        job['status'] = 'completed'
+        # Render the watermark in a worker process
+        future = executor.submit(
+            "image_watermark",
+            process_watermark,
+            job_id,
+            job['input_path'],
+            request.dict(),
+            logo_path
+        )
+        track_task(job_id, future)
+        save_info = await asyncio.wrap_future(future)
+        
+        if not await run_in_threadpool(job_store.update, job_id, status='completed', result=save_info):
+            # Deleted while the worker was running
+            remove_partial_outputs(save_info['output_path'])
+            raise HTTPException(status_code=409, detail="Job was cancelled")
         
         return {
             'job_id': job_id,
@@ -148,16 +126,64 @@ async def apply_watermark(job_id: str, request: WatermarkRequest):
             'output_info': save_info
         }
 
+    except asyncio.CancelledError:
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+    except HTTPException:
+        raise
     except Exception as e:
+        await run_in_threadpool(job_store.update, job_id, status='failed', error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+def process_watermark(job_id: str, input_path: str, options: dict, logo_path: Optional[str]) -> dict:
+    """Worker task to apply a text or logo watermark and save the result"""
+    tool = ImageWatermarkTool(input_path)
+    
+    if options['type'] == 'text':
+        tool.add_text_watermark(
+            text=options['text'],
+            size=options['text_size'],
+            color=options['text_color'],
+            opacity=options['opacity'],
+            rotation=options['rotation'],
+            position=options['position']
+        )
+        
+    elif options['type'] == 'logo':
+        tool.add_logo_watermark(
+            logo_path=logo_path,
+            scale=options['logo_scale'],
+            opacity=options['opacity'],
+            rotation=options['rotation'],
+            position=options['position']
+        )
+        
+    output_format = options['output_format'] or tool.original_format.lower()
+    output_path = JOBS_DIR / job_id / f"output.{output_format}"
+    
+    return tool.save(str(output_path), format=output_format, quality=options['quality'])
+
 @router.get("/jobs/{job_id}/download")
-async def download_result(job_id: str):
-    if job_id not in jobs:
+def download_result(job_id: str, request: Request):
+    job = job_store.get(job_id, "image_watermark")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    if not job.get('output_path') or not os.path.exists(job['output_path']):
+    output_path = (job['result'] or {}).get('output_path')
+    if job['status'] != 'completed' or not output_path or not os.path.exists(output_path):
         raise HTTPException(status_code=404, detail="Output not found")
         
-    return FileResponse(job['output_path'])
+    return file_download(request, output_path)
+
+@router.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """Cancel any pending watermark and clean up job files"""
+    if not job_store.delete(job_id, "image_watermark"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # A watermark still waiting for a worker is dropped; one already
+    # running is discarded by apply_watermark when it returns
+    cancel_task(job_id)
+    
+    remove_partial_outputs(str(JOBS_DIR / job_id))
+    
+    return {'message': 'Job deleted successfully'}
@@ -3,16 +3,21 @@ PDF to Word API Router
 Handles PDF to Word (.docx) conversion
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
 from pathlib import Path
 import uuid
-import json
 
 from app.tools.pdf_to_word import PdfToWordTool
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.uploads import PDF_KINDS, save_upload
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/pdf-to-word", tags=["pdf-to-word"])
 
@@ -28,7 +33,7 @@ class CreateJobResponse(BaseModel):
 
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     error: Optional[str] = None
 
 
@@ -44,21 +49,15 @@ async def create_pdf_to_word_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / "input.pdf"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'filename': file.filename
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "pdf_to_word", job_id, file.filename, input_path, job_dir,
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -67,24 +66,28 @@ async def create_pdf_to_word_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/process")
-async def process_pdf_to_word(job_id: str, background_tasks: BackgroundTasks):
+def process_pdf_to_word(job_id: str):
     """Process the PDF to Word conversion"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "pdf_to_word")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
+    # Claim the job so a double submit cannot start it twice
+    if not job_store.claim(job_id, error=None):
+        raise HTTPException(status_code=409, detail="Job is already processing")
     
-    # Update metadata
-    metadata['status'] = 'processing'
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Same PDF converted before: reuse that document
+    job_dir = JOBS_DIR / job_id
+    digests = [job['input_sha256']] if job['input_sha256'] else None
+    result = result_cache.lookup("pdf_to_word", [job_dir / "input.pdf"], {}, job_dir, digests)
+    if result is not None:
+        result['output_path'] = str(job_dir / "output.docx")
+        job_store.update(job_id, expect=('processing',), status='completed', result=result)
+        return {"message": "Conversion completed", "job_id": job_id, "cached": True}
     
     # Process in background
-    background_tasks.add_task(convert_pdf_to_word, job_id)
+    track_task(job_id, executor.submit("pdf_to_word", convert_pdf_to_word, job_id))
     
     return {"message": "Conversion started", "job_id": job_id}
 
@@ -96,67 +99,71 @@ def convert_pdf_to_word(job_id: str):
     output_path = job_dir / "output.docx"
     
     try:
+        # A cached result may be hard-linked here; replace rather than overwrite it
+        remove_partial_outputs(str(output_path))
+        
         converter = PdfToWordTool()
         result = converter.convert_pdf_to_word(str(input_path), str(output_path))
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
+            return
         
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        result_cache.store("pdf_to_word", [input_path], {}, [output_path], result)
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_pdf_to_word_job(job_id: str):
+    """Cancel a queued or running conversion job and discard its output"""
+    
+    job = job_store.get(job_id, "pdf_to_word")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_pdf_to_word_status(job_id: str):
+def get_pdf_to_word_status(job_id: str):
     """Get conversion job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "pdf_to_word")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        error=metadata.get('error')
+        job_id=job_id,
+        status=job['status'],
+        error=job['error']
     )
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_word_file(job_id: str):
+def download_word_file(job_id: str, request: Request):
     """Download the converted Word file"""
     
-    job_dir = JOBS_DIR / job_id
-    output_path = job_dir / "output.docx"
+    job = job_store.get(job_id, "pdf_to_word")
+    output_path = JOBS_DIR / job_id / "output.docx"
     
-    if not output_path.exists():
+    if job is None or job['status'] != 'completed' or not output_path.exists():
         raise HTTPException(status_code=404, detail="Word file not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = metadata.get('filename', 'document.pdf')
+    original_name = job['filename'] or 'document.pdf'
     output_name = original_name.replace('.pdf', '.docx')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_path,
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         filename=output_name
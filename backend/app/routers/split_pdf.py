@@ -3,16 +3,22 @@ Split PDF API Router
 Handles PDF page extraction and splitting
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 from pathlib import Path
 import uuid
-import json
 
 from app.tools.pdf_splitter import PDFSplitterTool
+from app.services.downloads import file_download
+from app.services.executor import executor
+from app.services.cancellation import track_task, cancel_task, remove_partial_outputs
+from app.services.job_store import job_store
+from app.services.raster_cache import raster_cache
+from app.services.thumbnails import DEFAULT_WIDTH, MAX_WIDTH, MIN_WIDTH, THUMBNAIL_FORMATS, thumbnail_service
+from app.services.uploads import PDF_KINDS, save_upload
 
 router = APIRouter(prefix="/split-pdf", tags=["split-pdf"])
 
@@ -33,7 +39,7 @@ class ProcessRequest(BaseModel):
 
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # 'uploaded', 'processing', 'completed', 'failed'
+    status: str  # 'uploaded', 'processing', 'completed', 'failed', 'cancelled'
     total_pages: int
     selected_pages: Optional[int] = None
     error: Optional[str] = None
@@ -51,26 +57,20 @@ async def create_split_job(file: UploadFile = File(...)):
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save uploaded file
+    # Save uploaded file (streamed to disk, size-limited)
     input_path = job_dir / "input.pdf"
-    with input_path.open("wb") as f:
-        content = await file.read()
-        f.write(content)
+    upload = await save_upload(file, input_path, kinds=PDF_KINDS)
     
     # Get page count
     splitter = PDFSplitterTool()
     total_pages = splitter.get_page_count(str(input_path))
     
-    # Save job metadata
-    metadata = {
-        'job_id': job_id,
-        'status': 'uploaded',
-        'total_pages': total_pages,
-        'filename': file.filename
-    }
-    
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    await run_in_threadpool(
+        job_store.create, "split_pdf", job_id, file.filename, input_path, job_dir,
+        params={'total_pages': total_pages},
+        input_sha256=upload.sha256,
+        file_size_bytes=upload.size
+    )
     
     return CreateJobResponse(
         job_id=job_id,
@@ -80,28 +80,23 @@ async def create_split_job(file: UploadFile = File(...)):
 
 
 @router.post("/jobs/{job_id}/process")
-async def process_split_job(job_id: str, request: ProcessRequest, background_tasks: BackgroundTasks):
+def process_split_job(job_id: str, request: ProcessRequest):
     """Process the split job with selected pages"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "split_pdf")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Load metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     if not request.pages:
         raise HTTPException(status_code=400, detail="No pages selected")
     
-    # Update metadata
-    metadata['status'] = 'processing'
-    metadata['selected_pages'] = len(request.pages)
-    with (job_dir / "metadata.json").open("w") as f:
-        json.dump(metadata, f)
+    # Claim the job so a double submit cannot start it twice
+    params = {**job['params'], 'selected_pages': len(request.pages)}
+    if not job_store.claim(job_id, error=None, params=params):
+        raise HTTPException(status_code=409, detail="Job is already processing")
     
     # Process in background
-    background_tasks.add_task(process_pdf_split, job_id, request.pages)
+    track_task(job_id, executor.submit("split_pdf", process_pdf_split, job_id, request.pages))
     
     return {"message": "Processing started", "job_id": job_id}
 
@@ -116,66 +111,64 @@ def process_pdf_split(job_id: str, pages: List[int]):
         splitter = PDFSplitterTool()
         result = splitter.extract_pages(str(input_path), pages, str(output_path))
         
-        # Update metadata
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'completed'
-        metadata['result'] = result
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        # Only if still processing: a job cancelled meanwhile discards its output
+        if not job_store.update(job_id, expect=('processing',), status='completed', result=result):
+            remove_partial_outputs(str(output_path))
             
     except Exception as e:
-        # Update metadata with error
-        with (job_dir / "metadata.json").open("r") as f:
-            metadata = json.load(f)
-        
-        metadata['status'] = 'failed'
-        metadata['error'] = str(e)
-        
-        with (job_dir / "metadata.json").open("w") as f:
-            json.dump(metadata, f)
+        if not job_store.update(job_id, expect=('processing',), status='failed', error=str(e)):
+            remove_partial_outputs(str(output_path))
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_split_job(job_id: str):
+    """Cancel a queued or running split job and discard its output"""
+    
+    job = job_store.get(job_id, "split_pdf")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.update(job_id, expect=('processing',), status='cancelled', error="Cancelled by user"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not processing")
+    
+    # Not started yet: drop it now. Running: the task discards its result when it finishes.
+    cancel_task(job_id)
+    
+    return {"message": "Job cancelled", "job_id": job_id}
 
 
 @router.get("/jobs/{job_id}/status", response_model=JobStatus)
-async def get_split_job_status(job_id: str):
+def get_split_job_status(job_id: str):
     """Get split job status"""
     
-    job_dir = JOBS_DIR / job_id
-    if not job_dir.exists():
+    job = job_store.get(job_id, "split_pdf")
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
     return JobStatus(
-        job_id=metadata['job_id'],
-        status=metadata['status'],
-        total_pages=metadata['total_pages'],
-        selected_pages=metadata.get('selected_pages'),
-        error=metadata.get('error')
+        job_id=job_id,
+        status=job['status'],
+        total_pages=job['params']['total_pages'],
+        selected_pages=job['params'].get('selected_pages'),
+        error=job['error']
     )
 
 
 @router.get("/jobs/{job_id}/download")
-async def download_split_pdf(job_id: str):
+def download_split_pdf(job_id: str, request: Request):
     """Download the split PDF"""
     
-    job_dir = JOBS_DIR / job_id
-    output_path = job_dir / "output.pdf"
+    job = job_store.get(job_id, "split_pdf")
+    output_path = JOBS_DIR / job_id / "output.pdf"
     
-    if not output_path.exists():
+    if job is None or job['status'] != 'completed' or not output_path.exists():
         raise HTTPException(status_code=404, detail="Split PDF not ready")
     
-    # Get original filename from metadata
-    with (job_dir / "metadata.json").open("r") as f:
-        metadata = json.load(f)
-    
-    original_name = metadata.get('filename', 'document.pdf')
+    original_name = job['filename'] or 'document.pdf'
     output_name = original_name.replace('.pdf', '_split.pdf')
     
-    return FileResponse(
+    return file_download(
+        request,
         output_path,
         media_type="application/pdf",
         filename=output_name
@@ -183,27 +176,31 @@ async def download_split_pdf(job_id: str):
 
 
 @router.get("/jobs/{job_id}/pages/{page_num}/thumbnail")
-async def get_page_thumbnail(job_id: str, page_num: int):
-    """Get thumbnail for a specific page"""
-    
-    job_dir = JOBS_DIR / job_id
-    input_path = job_dir / "input.pdf"
-    
-    if not input_path.exists():
+async def get_page_thumbnail(
+    job_id: str,
+    page_num: int,
+    request: Request,
+    width: int = Query(DEFAULT_WIDTH, ge=MIN_WIDTH, le=MAX_WIDTH),
+    format: str = "png"
+):
+    """Get thumbnail for a specific page (0-indexed), rendered on first request"""
+    
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(THUMBNAIL_FORMATS)}")
+    
+    job = await run_in_threadpool(job_store.get, job_id, "split_pdf")
+    input_path = JOBS_DIR / job_id / "input.pdf"
+    
+    if job is None or not input_path.exists():
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Create thumbnails directory
-    thumbs_dir = job_dir / "thumbnails"
-    thumbs_dir.mkdir(exist_ok=True)
+    doc_key = job['input_sha256'] or await run_in_threadpool(raster_cache.document_key, str(input_path))
     
-    thumb_path = thumbs_dir / f"page_{page_num}.png"
-    
-    # Generate thumbnail if not exists
-    if not thumb_path.exists():
-        try:
-            splitter = PDFSplitterTool()
-            splitter.generate_thumbnail(str(input_path), page_num, str(thumb_path))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to generate thumbnail: {str(e)}")
+    try:
+        path = await thumbnail_service.get(
+            str(input_path), doc_key, page_num, job['params']['total_pages'], width, format
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to generate thumbnail: {str(e)}")
     
-    return FileResponse(thumb_path, media_type="image/png")
+    return thumbnail_service.response(request, path, doc_key, format)
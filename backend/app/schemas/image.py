@@ -0,0 +1,104 @@
+"""
+Image tool options, shared by the image routers, image batches and pipelines
+"""
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class CompressRequest(BaseModel):
+    quality: int = 85  # Quality (1-100)
+    target_size_kb: Optional[int] = None  # Target file size in KB
+    max_width: Optional[int] = None  # Maximum width for resizing
+    max_height: Optional[int] = None  # Maximum height for resizing
+    output_format: Optional[str] = None  # Output format (jpg, png, webp, avif, etc.)
+    preset: Optional[str] = None  # Quality preset (maximum, high, balanced, compress, max_compress)
+
+
+class ConvertRequest(BaseModel):
+    format: str  # Target format
+    quality: int = 85  # Quality (1-100) for lossy formats
+    target_size_kb: Optional[int] = None  # Target file size in KB
+    max_width: Optional[int] = None  # Maximum width for resizing
+    max_height: Optional[int] = None  # Maximum height for resizing
+    preserve_exif: bool = True  # Preserve EXIF metadata
+
+
+class CropRequest(BaseModel):
+    # Crop coordinates
+    x: int = 0
+    y: int = 0
+    width: Optional[int] = None
+    height: Optional[int] = None
+    
+    # Or aspect ratio preset
+    aspect_ratio: Optional[str] = None
+    center_crop: bool = False
+    
+    # Options
+    output_format: Optional[str] = None
+    quality: int = 85
+
+
+class ApplyFiltersRequest(BaseModel):
+    # Adjustments (0.0 - 2.0, where 1.0 is original)
+    brightness: float = 1.0
+    contrast: float = 1.0
+    saturation: float = 1.0
+    sharpness: float = 1.0
+    
+    # Effects
+    blur: int = 0  # 0-10
+    sharpen: bool = False
+    edge_enhance: bool = False
+    
+    # Filters
+    grayscale: bool = False
+    sepia: bool = False
+    
+    # Output
+    output_format: Optional[str] = None
+    quality: int = 95
+
+
+class ResizeRequest(BaseModel):
+    # Resize methods (priority: preset > scale_percent > width/height)
+    width: Optional[int] = None
+    height: Optional[int] = None
+    scale_percent: Optional[float] = None
+    preset: Optional[str] = None
+    
+    # Options
+    maintain_aspect: bool = True
+    resampling: str = 'lanczos'
+    output_format: Optional[str] = None
+    quality: int = 85
+
+
+class TransformRequest(BaseModel):
+    rotation: float = 0
+    flip_h: bool = False
+    flip_v: bool = False
+    output_format: Optional[str] = None
+    quality: int = 95
+
+
+class WatermarkRequest(BaseModel):
+    type: str # 'text' or 'logo'
+    
+    # Text params
+    text: Optional[str] = None
+    text_size: Optional[int] = 40
+    text_color: Optional[str] = "#ffffff"
+    
+    # Logo params (assumes logo is already uploaded and linked to job)
+    logo_job_id: Optional[str] = None
+    logo_scale: Optional[int] = 20
+    
+    # Common params
+    opacity: int = 50
+    rotation: int = 0
+    position: str = "bottom-right"
+    
+    output_format: Optional[str] = None
+    quality: int = 95
@@ -0,0 +1,139 @@
+"""
+Job Cancellation - Cooperative abort of queued and running tool jobs
+
+DELETE on a job marks it "cancelled". Work that has not started is dropped
+right away; a running job notices the flag when its ProgressWriter next
+flushes (see app/services/progress.py), raises JobCancelled, removes its
+partial output (abandon_job) and returns, which frees its executor slot. A cancel that
+lands after the last flush is caught by finish_job, which only records the
+job's result while the job is still running under its handler's lease.
+"""
+import logging
+import os
+import shutil
+from concurrent.futures import CancelledError, Future
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.db.models import Job
+from app.services.executor import executor
+from app.services.job_store import job_store
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a worker to abandon a job the user cancelled.
+
+    Derives from BaseException (like asyncio.CancelledError) so the tools'
+    broad `except Exception` wrappers and per-attempt retries let it through
+    instead of turning it into a failure.
+    """
+
+
+def cancel_job(db: Session, job: Job) -> bool:
+    """
+    Mark a DB-backed job cancelled. Returns False if it had already finished.
+
+    The status checks are compare-and-set so a job finishing or being claimed
+    at the same moment is never flipped back.
+    """
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status.in_(("pending", "queued", "processing")))
+        .values(status="cancelled", error_message="Cancelled by user")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    db.refresh(job)
+    return result.rowcount == 1
+
+
+def finish_job(db: Session, job: Job, owner: Optional[str], status: str, *outputs) -> bool:
+    """
+    Commit a queue handler's final status ("completed" or "failed") with the
+    other changes it made to `job`, but only while the job is still
+    "processing" under `owner`, the lease_owner it was claimed with.
+
+    Returns False, rolling the changes back, if the job was cancelled or
+    taken over meanwhile. Outputs are then removed as for a cancel, except
+    when another worker holds the job again: it writes the same paths.
+    """
+    db.flush()
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "processing", Job.lease_owner == owner)
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        db.commit()
+        return True
+
+    db.rollback()
+    logger.info(f"Job {job.id} is no longer processing under {owner}, not recording it {status}")
+    abandon_job(db, job, owner, *outputs)
+    return False
+
+
+def abandon_job(db: Session, job: Job, owner: Optional[str], *outputs):
+    """
+    Clean up after a handler that lost `job` (JobCancelled from its
+    ProgressWriter, or a refused finish_job): its outputs are removed as
+    for a cancel, unless another worker holds the job again and writes the
+    same paths.
+    """
+    db.refresh(job)
+    if not (job.status == "processing" and job.lease_owner != owner):
+        remove_partial_outputs(*outputs)
+
+
+def remove_partial_outputs(*paths):
+    """Delete output files or directories left behind by a cancelled job."""
+    for path in paths:
+        if not path:
+            continue
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove partial output {path}: {e}")
+
+
+# Executor futures of jobs that go straight to the executor rather than the
+# job queue (the app/services/job_store.py tools), by job id
+_pending: Dict[str, Future] = {}
+
+
+def track_task(job_id: str, future: Future):
+    """
+    Remember a job's executor future so cancel_task can drop it before it
+    starts, and keep its job_store lease renewed until it is done.
+
+    A task that ends without recording its own result (worker crash, broken
+    pool, executor shutdown) fails the job, so it can be started again.
+    """
+    _pending[job_id] = future
+
+    def _forget(done: Future):
+        if _pending.get(job_id) is done:
+            del _pending[job_id]
+        job_store.release(job_id)
+
+        exc = CancelledError() if done.cancelled() else done.exception()
+        if exc is not None:
+            job_store.update(job_id, expect=("processing",), status="failed", error=f"Worker failed: {exc!r}")
+
+    future.add_done_callback(_forget)
+
+
+def cancel_task(job_id: str) -> bool:
+    """Drop a tracked job that is still waiting for a worker. Returns True if it never ran."""
+    future = _pending.pop(job_id, None)
+    return future is not None and executor.cancel(future)
+
@@ -30,16 +30,21 @@ def cleanup_expired_jobs():
         for job in expired_jobs:
             try:
                 # Delete job directory and all files
-                job_dir = f"storage/jobs/{job.id}"
+                job_dirs = [f"storage/jobs/{job.id}"]
                 
-                if os.path.exists(job_dir):
-                    # Calculate size before deletion
-                    dir_size = get_directory_size(job_dir)
-                    freed_bytes += dir_size
-                    
-                    # Delete directory
-                    shutil.rmtree(job_dir)
-                    logger.info(f"Deleted job directory: {job_dir} ({dir_size / 1024 / 1024:.2f} MB)")
+                # Most tools keep a job's files in a directory named after it (output_dir)
+                if job.output_dir and os.path.basename(job.output_dir) == job.id:
+                    job_dirs.append(job.output_dir)
+                
+                for job_dir in job_dirs:
+                    if os.path.exists(job_dir):
+                        # Calculate size before deletion
+                        dir_size = get_directory_size(job_dir)
+                        freed_bytes += dir_size
+                        
+                        # Delete directory
+                        shutil.rmtree(job_dir)
+                        logger.info(f"Deleted job directory: {job_dir} ({dir_size / 1024 / 1024:.2f} MB)")
                 
                 # Delete job record from database
                 db.delete(job)
@@ -0,0 +1,82 @@
+"""
+Downloads - Serve finished output files with HTTP validators
+
+Every download endpoint returns file_download() instead of a bare
+FileResponse:
+
+- ETag is the SHA-256 of the file's content (strong), computed once per
+  file version in this process. Outputs hard-linked from the result cache
+  share an inode and so share the digest.
+- If-None-Match answers 304 without a body.
+- Range and If-Range are handled by Starlette's FileResponse, which
+  compares If-Range against this ETag, so an interrupted download resumes
+  only if the file is still the same.
+- Outputs never change once written, so they are cacheable for a year
+  (private: they belong to whoever ran the job).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.services.result_cache import file_digest
+
+
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Digests remembered per (device, inode, mtime, size)
+MAX_REMEMBERED_DIGESTS = 4096
+
+_digests: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def file_etag(path) -> str:
+    """Strong ETag for a file: its quoted SHA-256."""
+    stat = os.stat(path)
+    marker = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        digest = _digests.get(marker)
+        if digest:
+            _digests.move_to_end(marker)
+            return f'"{digest}"'
+
+    digest = file_digest(path)
+    with _lock:
+        _digests[marker] = digest
+        while len(_digests) > MAX_REMEMBERED_DIGESTS:
+            _digests.popitem(last=False)
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def file_download(
+    request: Request,
+    path,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None
+) -> Response:
+    """
+    The file with ETag and Cache-Control, 304 if the client's copy matches,
+    or the requested byte range. Blocks while hashing a file seen for the
+    first time, so call it from sync endpoints (FastAPI's threadpool).
+    """
+    etag = file_etag(path)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
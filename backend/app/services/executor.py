@@ -0,0 +1,315 @@
+"""
+Job Executor - Run CPU-heavy tool jobs in a bounded pool of worker processes
+
+Every job-producing endpoint hands its work to the shared `executor` instead of
+FastAPI's BackgroundTasks, so page rendering, OCR and image encoding never run
+inside the uvicorn process that is serving requests.
+
+Each tool has its own FIFO queue and a max-in-flight limit; the dispatcher
+round-robins between tools so one busy tool cannot starve the others.
+
+Tools given reserved workers (interactive previews such as compress
+estimates) run only on extra workers added to the pool for them, ahead of
+everything else, so they never wait behind queued jobs.
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Modules imported once per worker process so the first job on a fresh
+# worker does not pay for loading PyMuPDF, Pillow, OpenCV, etc.
+WARM_IMPORTS = (
+    "fitz",
+    "numpy",
+    "PIL.Image",
+    "app.worker",
+    "app.tools.pdf_compressor",
+    "app.tools.pdf_merger",
+    "app.tools.pdf_organizer",
+    "app.tools.pdf_deskewer",
+    "app.tools.pdf_ocr",
+    "app.tools.pdf_splitter",
+    "app.tools.pdf_to_word",
+    "app.tools.image_compressor",
+    "app.tools.image_converter",
+    "app.tools.image_cropper",
+    "app.tools.image_filters",
+    "app.tools.image_resizer",
+    "app.tools.image_rotate",
+    "app.tools.image_watermark",
+    "app.services.thumbnails",
+    "app.controllers.api.compress",
+    "app.controllers.api.merge",
+    "app.controllers.api.organize",
+    "app.controllers.api.deskew",
+    "app.controllers.api.ocr",
+)
+
+
+def _warm_worker():
+    """Process pool initializer: pre-import heavy modules in the new worker."""
+    for module_name in WARM_IMPORTS:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            # Optional dependencies may be missing on some deployments;
+            # the job that needs them will report the real error.
+            logger.warning(f"Worker warm-up could not import {module_name}: {e}")
+
+
+def _ping():
+    """No-op task used to force worker processes to start."""
+    return os.getpid()
+
+
+def _cancel_queued(future: Future) -> bool:
+    """Cancel the future of a task taken off its queue, waking wait()/as_completed() callers."""
+    cancelled = future.cancel()
+    if cancelled:
+        # Only the dispatcher would have notified the waiters otherwise
+        future.set_running_or_notify_cancel()
+    return cancelled
+
+
+class _Task:
+    __slots__ = ("tool", "fn", "args", "kwargs", "future")
+
+    def __init__(self, tool: str, fn: Callable, args: tuple, kwargs: dict):
+        self.tool = tool
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+class JobExecutor:
+    def __init__(
+        self,
+        max_workers: int = 0,
+        tool_limits: Optional[Dict[str, int]] = None,
+        default_tool_limit: int = 0,
+        reserved_workers: Optional[Dict[str, int]] = None
+    ):
+        # Leave one core for the API process itself
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.tool_limits = tool_limits or {}
+        self.default_tool_limit = default_tool_limit or self.max_workers
+        self.reserved_workers = reserved_workers or {}
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queues: Dict[str, deque] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._total_in_flight = 0
+        self._next_tool = 0
+
+        self._cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the worker pool and the dispatcher thread."""
+        if self.running:
+            logger.warning("Executor already running")
+            return
+
+        self._pool = self._create_pool()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Job executor started ({self.max_workers} workers)")
+
+    def stop(self):
+        """
+        Stop dispatching and shut the worker pool down. Queued tasks are
+        cancelled; running ones fail with CancelledError unless they finish
+        first.
+        """
+        with self._cond:
+            self.running = False
+            pool, self._pool = self._pool, None
+            queued = [task for queue in self._queues.values() for task in queue]
+            for queue in self._queues.values():
+                queue.clear()
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+        for task in queued:
+            _cancel_queued(task.future)
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Job executor stopped")
+
+    def submit(self, tool: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue fn(*args, **kwargs) to run in a worker process.
+
+        fn must be a module-level function so it can be pickled.
+        Returns a Future that resolves with fn's return value. Raises
+        RuntimeError unless the executor has been started.
+        """
+        task = _Task(tool, fn, args, kwargs)
+        with self._cond:
+            if not self.running:
+                raise RuntimeError("Job executor is not running")
+            self._queues.setdefault(tool, deque()).append(task)
+            self._cond.notify()
+        return task.future
+
+    def cancel(self, future: Future) -> bool:
+        """
+        Cancel a task that has not been handed to a worker yet and free its
+        queue slot. Tasks already running are not interrupted.
+        """
+        with self._cond:
+            for queue in self._queues.values():
+                for task in queue:
+                    if task.future is future:
+                        queue.remove(task)
+                        self._cond.notify()
+                        return _cancel_queued(future)
+        return False
+
+    def limit_for(self, tool: str) -> int:
+        if tool in self.reserved_workers:
+            return self.reserved_workers[tool]
+        return self.tool_limits.get(tool, self.default_tool_limit)
+
+    def available_slots(self, tool: str) -> int:
+        """How many more tasks for tool could start right now without queueing."""
+        with self._cond:
+            tool_busy = self._in_flight.get(tool, 0) + len(self._queues.get(tool, ()))
+            if tool in self.reserved_workers:
+                return max(0, self.reserved_workers[tool] - tool_busy)
+            queued_total = sum(
+                len(queue) for name, queue in self._queues.items() if name not in self.reserved_workers
+            )
+            return max(0, min(
+                self.limit_for(tool) - tool_busy,
+                self.max_workers - self._total_in_flight - queued_total
+            ))
+
+    def stats(self) -> dict:
+        """Queue depth and in-flight count per tool."""
+        with self._cond:
+            tools = set(self._queues) | set(self._in_flight)
+            return {
+                "max_workers": self.max_workers,
+                "reserved_workers": dict(self.reserved_workers),
+                "in_flight": self._total_in_flight,
+                "tools": {
+                    tool: {
+                        "queued": len(self._queues.get(tool, ())),
+                        "in_flight": self._in_flight.get(tool, 0),
+                        "limit": self.limit_for(tool)
+                    }
+                    for tool in sorted(tools)
+                }
+            }
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn gives every worker a clean interpreter: no inherited DB
+        # connections, locks or threads from the API process.
+        workers = self.max_workers + sum(self.reserved_workers.values())
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker
+        )
+        for _ in range(workers):
+            pool.submit(_ping)
+        return pool
+
+    def _next_ready_task(self) -> Optional[_Task]:
+        """Pick the next task round-robin across tools with free capacity."""
+        # Tools with reserved workers first; they do not count against max_workers
+        for tool, reserved in self.reserved_workers.items():
+            if self._queues.get(tool) and self._in_flight.get(tool, 0) < reserved:
+                return self._queues[tool].popleft()
+
+        if self._total_in_flight >= self.max_workers:
+            return None
+
+        tools = [
+            tool for tool, queue in self._queues.items()
+            if queue and tool not in self.reserved_workers
+        ]
+        if not tools:
+            return None
+
+        for offset in range(len(tools)):
+            tool = tools[(self._next_tool + offset) % len(tools)]
+            if self._in_flight.get(tool, 0) < self.limit_for(tool):
+                self._next_tool = (self._next_tool + offset + 1) % len(tools)
+                return self._queues[tool].popleft()
+        return None
+
+    def _run(self):
+        """Dispatcher loop: move tasks from tool queues into the pool."""
+        while True:
+            with self._cond:
+                task = self._next_ready_task()
+                while self.running and task is None:
+                    self._cond.wait()
+                    task = self._next_ready_task()
+                if not self.running:
+                    break
+                self._in_flight[task.tool] = self._in_flight.get(task.tool, 0) + 1
+                if task.tool not in self.reserved_workers:
+                    self._total_in_flight += 1
+
+                if not task.future.set_running_or_notify_cancel():
+                    self._release(task.tool)
+                    continue
+
+                # Under the lock, so stop() cannot take the pool away meanwhile
+                try:
+                    pool_future = self._pool.submit(task.fn, *task.args, **task.kwargs)
+                except BrokenProcessPool:
+                    logger.error("Worker pool broken, restarting")
+                    self._pool = self._create_pool()
+                    pool_future = self._pool.submit(task.fn, *task.args, **task.kwargs)
+
+            pool_future.add_done_callback(lambda f, task=task: self._on_done(task, f))
+
+    def _on_done(self, task: _Task, pool_future: Future):
+        if pool_future.cancelled():
+            # stop() shut the pool down before the task started; task.future
+            # is already running, so it can only fail
+            task.future.set_exception(CancelledError(f"{task.tool} task cancelled: executor stopped"))
+            self._release(task.tool)
+            return
+
+        exc = pool_future.exception()
+        if exc is not None:
+            logger.error(f"{task.tool} task {getattr(task.fn, '__name__', task.fn)} failed: {exc}")
+            task.future.set_exception(exc)
+        else:
+            task.future.set_result(pool_future.result())
+        self._release(task.tool)
+
+    def _release(self, tool: str):
+        with self._cond:
+            self._in_flight[tool] -= 1
+            if tool not in self.reserved_workers:
+                self._total_in_flight -= 1
+            self._cond.notify()
+
+
+# Global executor instance
+executor = JobExecutor(
+    max_workers=settings.EXECUTOR_MAX_WORKERS,
+    tool_limits=settings.EXECUTOR_TOOL_LIMITS,
+    default_tool_limit=settings.EXECUTOR_DEFAULT_TOOL_LIMIT,
+    reserved_workers=settings.EXECUTOR_RESERVED_WORKERS
+)
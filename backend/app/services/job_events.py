@@ -0,0 +1,179 @@
+"""
+Job Events - Push job status and page progress to SSE and long-poll clients
+
+One JobEventHub per API process watches every job that has at least one
+connected client. Workers keep the job's row in the jobs table current as
+they run (ProgressWriter for queued jobs, app/services/job_store.py for the
+rest); each tick the hub reads all watched jobs with a single query, then
+wakes only the clients whose job changed. Load grows with watched jobs per
+tick instead of clients times polls.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models import Job
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "not_found"}
+
+class JobWatch:
+    """Latest known state of one job, shared by all of its clients."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.state: dict = {}
+        self.version = ""
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def update(self, state: dict) -> bool:
+        # Content hash rather than a counter, so a long-poll client can
+        # hand its version to any API process and get a meaningful answer
+        version = hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        if version == self.version:
+            return False
+
+        self.state = state
+        self.version = version
+        self.changed.set()
+        self.changed = asyncio.Event()
+        return True
+
+    @property
+    def finished(self) -> bool:
+        return self.state.get("status") in TERMINAL_STATUSES
+
+    def payload(self) -> dict:
+        return {"job_id": self.job_id, "version": self.version, **self.state}
+
+
+class JobEventHub:
+    def __init__(self, interval_ms: int = 250):
+        self.interval = interval_ms / 1000
+        self._watches: Dict[str, JobWatch] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the refresh loop on the running event loop."""
+        if self._task and not self._task.done():
+            logger.warning("Job event hub already running")
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "watched_jobs": len(self._watches),
+            "clients": sum(watch.subscribers for watch in self._watches.values())
+        }
+
+    async def locate(self, job_id: str) -> Optional[JobWatch]:
+        """Find a job in the jobs table. None if unknown."""
+        if job_id in self._watches:
+            return self._watches[job_id]
+
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+
+        if not await run_in_threadpool(_exists, job_id):
+            return None
+
+        watch = JobWatch(job_id)
+        states = await run_in_threadpool(_read_states, [watch])
+        watch.update(states[job_id])
+        return watch
+
+    @asynccontextmanager
+    async def subscribe(self, watch: JobWatch):
+        """Keep a located job refreshed while the caller holds the context."""
+        watch = self._watches.setdefault(watch.job_id, watch)
+        watch.subscribers += 1
+        try:
+            yield watch
+        finally:
+            watch.subscribers -= 1
+            if watch.subscribers <= 0 and self._watches.get(watch.job_id) is watch:
+                del self._watches[watch.job_id]
+
+    async def wait_for_change(self, watch: JobWatch, version: str, timeout: float) -> bool:
+        """Wait until the job's version differs from `version`. False on timeout."""
+        if watch.version != version:
+            return True
+        try:
+            await asyncio.wait_for(watch.changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            watches = list(self._watches.values())
+            if not watches:
+                continue
+            try:
+                # DB reads run in the threadpool, never on the loop
+                states = await run_in_threadpool(_read_states, watches)
+            except Exception as e:
+                logger.error(f"Job event refresh failed: {e}")
+                continue
+            for watch in watches:
+                watch.update(states[watch.job_id])
+
+
+def _exists(job_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Job.id).filter(Job.id == job_id).first() is not None
+    finally:
+        db.close()
+
+
+def _read_states(watches: List[JobWatch]) -> Dict[str, dict]:
+    """Current state of every watched job, in one query."""
+    states = {watch.job_id: {"status": "not_found"} for watch in watches}
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Job.id, Job.status, Job.processed_pages, Job.total_pages, Job.error_message)
+            .filter(Job.id.in_(list(states)))
+            .all()
+        )
+    finally:
+        db.close()
+
+    for job_id, status, processed, total, error in rows:
+        percent = int((processed or 0) * 100 / total) if total else 0
+        states[job_id] = {
+            "status": status,
+            "progress": {
+                "percent": 100 if status == "completed" else percent,
+                "processed_pages": processed,
+                "total_pages": total
+            },
+            "error": error
+        }
+
+    return states
+
+
+# Global hub instance
+job_events = JobEventHub(interval_ms=settings.JOB_EVENTS_INTERVAL_MS)
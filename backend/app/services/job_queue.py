@@ -0,0 +1,329 @@
+"""
+Job Queue - Durable job dispatch through the jobs table
+
+/process endpoints only mark a Job row "queued". Every process running a
+JobQueue (the API itself when JOB_QUEUE_EMBEDDED is on, plus any number of
+`python -m app.worker` processes on hosts that share the database and
+storage) claims queued rows with a compare-and-set UPDATE, so each job is
+taken by exactly one process, and runs it on that process's job executor.
+
+A claimed job holds a lease that its owner renews while the job runs. If the
+owner dies, the lease runs out and another process claims the job again, up
+to JOB_MAX_ATTEMPTS times.
+
+Handlers of THREADED_TOOLS run on a thread of the queue process instead and
+submit their CPU work to the executor themselves, in pieces, so one large
+job is spread over the shared worker pool without a pool of its own.
+"""
+import importlib
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Set
+
+from sqlalchemy import and_, func, or_, update
+
+from app.core.config import settings
+from app.db.models import Job
+from app.db.session import SessionLocal
+from app.services.executor import executor
+
+logger = logging.getLogger(__name__)
+
+
+# Tool name -> "module:function" called with the job id in a worker process
+JOB_HANDLERS = {
+    "pdf_to_images": "app.worker:process_job",
+    "compress_pdf": "app.controllers.api.compress:run_compress_job",
+    "merge_pdf": "app.controllers.api.merge:run_merge_job",
+    "organize_pdf": "app.controllers.api.organize:run_organize_job",
+    "deskew_pdf": "app.controllers.api.deskew:run_deskew_job",
+    "ocr_pdf": "app.controllers.api.ocr:run_ocr_job",
+    "pipeline": "app.controllers.api.pipeline:run_pipeline_job",
+}
+# Tools whose handler runs on a queue thread and renders through the executor
+THREADED_TOOLS = {"pdf_to_images"}
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handlers: Dict[str, str],
+        threaded: Set[str] = frozenset(),
+        lease_seconds: int = 60,
+        poll_interval: float = 1.0,
+        max_attempts: int = 3
+    ):
+        self.handlers = handlers
+        self.threaded = threaded
+        self.lease = timedelta(seconds=lease_seconds)
+        self.heartbeat_interval = lease_seconds / 3
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._resolved: Dict[str, Callable] = {}
+        self._held: Set[str] = set()  # Job ids this process holds a lease on
+        self._threads: Dict[str, int] = {}  # Threaded tool -> its jobs running here
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start claiming jobs from the database."""
+        if self.running:
+            logger.warning("Job queue already running")
+            return
+
+        # The pid may differ from import time (e.g. uvicorn --workers forks)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Job queue started as {self.worker_id}")
+
+    def stop(self):
+        """
+        Stop claiming new jobs.
+
+        Jobs still running keep their lease until it expires, after which
+        another process picks them up.
+        """
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        logger.info("Job queue stopped")
+
+    def notify(self):
+        """Wake the dispatcher now instead of at the next poll (a job was just queued)."""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            held = len(self._held)
+        return {
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "held_jobs": held
+        }
+
+    def _run(self):
+        """Dispatcher loop: renew leases, then claim as many jobs as the executor can start."""
+        next_heartbeat = 0.0
+        while self.running:
+            self._wake.clear()
+            claimed = 0
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    self._heartbeat()
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+                self._fail_exhausted()
+                claimed = self._claim_batch()
+            except Exception as e:
+                logger.error(f"Job queue error: {e}")
+
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+
+    def _claimable(self, now: datetime):
+        """Queued jobs, and running jobs whose owner stopped renewing the lease."""
+        expired = and_(
+            Job.status == "processing",
+            or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now),
+            func.coalesce(Job.attempts, 0) < self.max_attempts
+        )
+        return or_(Job.status == "queued", expired)
+
+    def _claim_batch(self) -> int:
+        slots = {tool: self._free_slots(tool) for tool in self.handlers}
+        tools = [tool for tool, free in slots.items() if free > 0]
+        if not tools:
+            return 0
+
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            candidates = (
+                db.query(Job.id, Job.tool)
+                .filter(Job.tool.in_(tools), self._claimable(now))
+                .order_by(Job.created_at)
+                .limit(sum(slots[tool] for tool in tools))
+                .all()
+            )
+
+            claimed = 0
+            for job_id, tool in candidates:
+                if slots[tool] <= 0:
+                    continue
+                if not self._claim(db, job_id, now):
+                    continue  # Another process got it first
+                slots[tool] -= 1
+                claimed += 1
+                self._dispatch(tool, job_id)
+            return claimed
+        finally:
+            db.close()
+
+    def _free_slots(self, tool: str) -> int:
+        if tool not in self.threaded:
+            return executor.available_slots(tool)
+        # The executor only sees the pieces of running jobs; bound the jobs
+        # themselves by the tool's limit instead
+        with self._lock:
+            return max(0, executor.limit_for(tool) - self._threads.get(tool, 0))
+
+    def _claim(self, db, job_id: str, now: datetime) -> bool:
+        result = db.execute(
+            update(Job)
+            .where(Job.id == job_id, self._claimable(now))
+            .values(
+                status="processing",
+                lease_owner=self.worker_id,
+                lease_expires_at=now + self.lease,
+                attempts=func.coalesce(Job.attempts, 0) + 1,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def _dispatch(self, tool: str, job_id: str):
+        with self._lock:
+            self._held.add(job_id)
+        try:
+            if tool in self.threaded:
+                future = self._run_threaded(tool, self._handler(tool), job_id)
+            else:
+                future = executor.submit(tool, self._handler(tool), job_id)
+        except Exception as e:
+            self._on_done(job_id, _failed_future(e))
+            return
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+
+    def _run_threaded(self, tool: str, fn: Callable, job_id: str) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            self._threads[tool] = self._threads.get(tool, 0) + 1
+
+        def run():
+            result, exc = None, None
+            try:
+                result = fn(job_id)
+            except BaseException as e:
+                exc = e
+            # Free the slot before _on_done wakes the dispatcher
+            with self._lock:
+                self._threads[tool] -= 1
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+        threading.Thread(target=run, name=f"job-{job_id}", daemon=True).start()
+        return future
+
+    def _handler(self, tool: str) -> Callable:
+        if tool not in self._resolved:
+            module_name, fn_name = self.handlers[tool].split(":")
+            self._resolved[tool] = getattr(importlib.import_module(module_name), fn_name)
+        return self._resolved[tool]
+
+    def _on_done(self, job_id: str, future: Future):
+        with self._lock:
+            self._held.discard(job_id)
+
+        # Handlers record their own failures on the job; an exception here
+        # means the worker process itself died (crash, OOM kill, pool shutdown).
+        exc = CancelledError() if future.cancelled() else future.exception()
+        if exc is not None:
+            logger.error(f"Job {job_id} worker failed: {exc}")
+            self._release(job_id, str(exc))
+        self._wake.set()
+
+    def _release(self, job_id: str, error: str):
+        """Put a job whose worker died back in the queue, or fail it if it is out of attempts."""
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id, Job.lease_owner == self.worker_id).first()
+            if not job or job.status != "processing":
+                return
+            if (job.attempts or 0) < self.max_attempts:
+                job.status = "queued"
+            else:
+                job.status = "failed"
+                job.error_message = f"Worker failed: {error}"
+            job.lease_owner = None
+            job.lease_expires_at = None
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return
+
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(Job)
+                .where(Job.id.in_(held), Job.lease_owner == self.worker_id)
+                .values(lease_expires_at=datetime.utcnow() + self.lease)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if result.rowcount < len(held):
+                logger.warning(f"Lost lease on {len(held) - result.rowcount} job(s)")
+        finally:
+            db.close()
+
+    def _fail_exhausted(self):
+        """Fail jobs that were interrupted on every attempt instead of retrying forever."""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Job)
+                .where(
+                    Job.tool.in_(list(self.handlers)),
+                    Job.status == "processing",
+                    Job.lease_expires_at < now,
+                    func.coalesce(Job.attempts, 0) >= self.max_attempts
+                )
+                .values(
+                    status="failed",
+                    error_message="Job was interrupted too many times",
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+def _failed_future(exc: Exception) -> Future:
+    future = Future()
+    future.set_exception(exc)
+    return future
+
+
+# Global job queue instance
+job_queue = JobQueue(
+    handlers=JOB_HANDLERS,
+    threaded=THREADED_TOOLS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS
+)
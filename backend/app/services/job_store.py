@@ -0,0 +1,260 @@
+"""
+Job Store - Jobs table access for the tools that run straight on the executor
+
+Split, PDF to Word, the image tools and rotate/watermark used to keep each job
+in a metadata.json next to its files, or in a dict inside one API process.
+Every status read parsed a file, two requests touching the same job could
+interleave their read-modify-write, and rotate/watermark jobs only existed in
+the process that created them.
+
+They now live in the jobs table alongside the queue-backed tools. Each change
+is a single UPDATE, finishing or cancelling is a compare-and-set on the
+current status, and any API process (or worker) can serve any job.
+Tool-specific fields (page count, image info, chosen options) go in the
+`params` JSON column and the worker's return value in `result`.
+
+A job in "processing" holds a lease, like a queue-backed job, that the API
+process which submitted it renews while its executor task is pending. If
+that process dies the lease runs out: the heartbeat of any API process then
+fails the job, and claim() may start it again, instead of it staying
+"processing" (and refusing every retry) forever.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import and_, delete, or_, update
+
+from app.core.config import settings
+from app.db.models import Job
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+# update() keyword -> jobs column
+COLUMNS = {
+    "status": "status",
+    "error": "error_message",
+    "params": "params",
+    "result": "result",
+}
+JSON_COLUMNS = {"params", "result"}
+
+# Statuses a job can be (re)started from; "processing" is claimed with a compare-and-set
+IDLE_STATUSES = ("uploaded", "completed", "failed", "cancelled")
+
+# Tools whose jobs live in this store (the others go through the job queue)
+TOOLS = (
+    "split_pdf", "pdf_to_word", "image_compressor", "image_converter", "image_cropper",
+    "image_filters", "image_resizer", "image_rotate", "image_watermark",
+)
+
+
+def _snapshot(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "tool": job.tool,
+        "status": job.status,
+        "filename": job.original_filename,
+        "input_path": job.input_path,
+        "output_dir": job.output_dir,
+        "input_sha256": job.input_sha256,
+        "params": json.loads(job.params) if job.params else {},
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error_message,
+        "created_at": job.created_at,
+        "expires_at": job.expires_at,
+    }
+
+
+class JobStore:
+    def __init__(self, ttl_minutes: int, lease_seconds: int = 60):
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.heartbeat_interval = lease_seconds / 3
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._held: Set[str] = set()  # "processing" jobs whose task this process tracks
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start renewing the leases of this process's jobs and failing abandoned ones."""
+        if self.thread and self.thread.is_alive():
+            logger.warning("Job store heartbeat already running")
+            return
+        # The pid may differ from import time (e.g. uvicorn --workers forks)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def create(
+        self,
+        tool: str,
+        job_id: str,
+        filename: str,
+        input_path,
+        output_dir,
+        params: Optional[dict] = None,
+        input_sha256: Optional[str] = None,
+        file_size_bytes: Optional[int] = None,
+    ) -> dict:
+        """Insert a new job in status "uploaded" and return its snapshot."""
+        now = datetime.utcnow()
+        job = Job(
+            id=job_id,
+            tool=tool,
+            status="uploaded",
+            original_filename=filename,
+            file_size_bytes=file_size_bytes,
+            input_sha256=input_sha256,
+            input_path=str(input_path),
+            output_dir=str(output_dir),
+            params=json.dumps(params or {}, default=str),
+            created_at=now,
+            expires_at=now + self.ttl,
+        )
+        db = SessionLocal()
+        try:
+            db.add(job)
+            db.commit()
+            return _snapshot(job)
+        finally:
+            db.close()
+
+    def get(self, job_id: str, tool: str) -> Optional[dict]:
+        """Snapshot of a job of `tool`, with params and result decoded. None if unknown."""
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id, Job.tool == tool).first()
+            return _snapshot(job) if job else None
+        finally:
+            db.close()
+
+    def update(self, job_id: str, expect: Optional[Iterable[str]] = None, **fields) -> bool:
+        """
+        Set status, error, params and/or result in one statement.
+
+        With `expect`, only applies while the job's status is one of those
+        (compare-and-set). Returns False if the job is gone or in another status.
+        Setting "processing" takes a lease for this process; any other
+        status drops it.
+        """
+        condition = Job.status.in_(tuple(expect)) if expect is not None else None
+        return self._update(job_id, condition, fields)
+
+    def claim(self, job_id: str, **fields) -> bool:
+        """
+        Set the job "processing" (plus `fields`) if it is idle, or if it is
+        still "processing" under a lease that ran out. False if it is running.
+        """
+        stale = and_(
+            Job.status == "processing",
+            or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < datetime.utcnow())
+        )
+        return self._update(job_id, or_(Job.status.in_(IDLE_STATUSES), stale), {**fields, "status": "processing"})
+
+    def release(self, job_id: str):
+        """Stop renewing a job's lease: its task is done."""
+        with self._lock:
+            self._held.discard(job_id)
+
+    def _update(self, job_id: str, condition, fields: dict) -> bool:
+        values = {}
+        for name, value in fields.items():
+            if name in JSON_COLUMNS and value is not None:
+                value = json.dumps(value, default=str)
+            values[COLUMNS[name]] = value
+
+        if fields.get("status") == "processing":
+            values.update(lease_owner=self.owner, lease_expires_at=datetime.utcnow() + self.lease)
+        elif "status" in fields:
+            values.update(lease_owner=None, lease_expires_at=None)
+
+        stmt = update(Job).where(Job.id == job_id)
+        if condition is not None:
+            stmt = stmt.where(condition)
+
+        db = SessionLocal()
+        try:
+            result = db.execute(stmt.values(**values).execution_options(synchronize_session=False))
+            db.commit()
+        finally:
+            db.close()
+
+        if result.rowcount == 1 and "status" in fields:
+            with self._lock:
+                if fields["status"] == "processing":
+                    self._held.add(job_id)
+                else:
+                    self._held.discard(job_id)
+        return result.rowcount == 1
+
+    def delete(self, job_id: str, tool: str) -> bool:
+        """Remove a job's row. Its files are the caller's to delete."""
+        db = SessionLocal()
+        try:
+            result = db.execute(delete(Job).where(Job.id == job_id, Job.tool == tool))
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self._heartbeat()
+            except Exception as e:
+                logger.error(f"Job store heartbeat failed: {e}")
+
+    def _heartbeat(self):
+        now = datetime.utcnow()
+        with self._lock:
+            held = list(self._held)
+
+        db = SessionLocal()
+        try:
+            if held:
+                db.execute(
+                    update(Job)
+                    .where(Job.id.in_(held), Job.status == "processing", Job.lease_owner == self.owner)
+                    .values(lease_expires_at=now + self.lease)
+                    .execution_options(synchronize_session=False)
+                )
+            # Jobs whose process stopped renewing them (crash, restart)
+            result = db.execute(
+                update(Job)
+                .where(
+                    Job.tool.in_(TOOLS),
+                    Job.status == "processing",
+                    or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+                )
+                .values(
+                    status="failed",
+                    error_message="Worker stopped before the job finished",
+                    lease_owner=None,
+                    lease_expires_at=None
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if result.rowcount:
+                logger.warning(f"Failed {result.rowcount} abandoned job(s)")
+        finally:
+            db.close()
+
+
+# Global store instance
+job_store = JobStore(ttl_minutes=settings.TOOL_JOB_TTL_MINUTES, lease_seconds=settings.JOB_LEASE_SECONDS)
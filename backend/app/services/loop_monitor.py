@@ -0,0 +1,68 @@
+"""
+Event Loop Monitor - Measure how long the API event loop is blocked
+
+A ticker sleeps for a fixed interval and records how late it wakes up.
+Any blocking call on the loop (a CPU-bound tool run inside an async
+handler, a large synchronous file write) shows up directly as lag.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopMonitor:
+    def __init__(self, interval_ms: int = 100, warn_ms: int = 5, window: int = 600):
+        self.interval = interval_ms / 1000
+        self.warn_ms = warn_ms
+        self.samples = deque(maxlen=window)  # Last `window` lag samples in ms
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running event loop."""
+        if self._task and not self._task.done():
+            logger.warning("Event loop monitor already running")
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - started - self.interval) * 1000)
+
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms > self.warn_ms:
+                logger.warning(f"Event loop blocked for {lag_ms:.1f} ms")
+
+    def stats(self) -> dict:
+        """Lag statistics over the recent window, in milliseconds."""
+        if not self.samples:
+            return {"samples": 0}
+
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "last_ms": round(self.samples[-1], 2),
+            "p50_ms": round(ordered[len(ordered) // 2], 2),
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+            "window_max_ms": round(ordered[-1], 2),
+            "max_ms": round(self.max_lag_ms, 2),
+            "warn_ms": self.warn_ms
+        }
+
+
+# Global monitor instance
+loop_monitor = EventLoopMonitor(warn_ms=settings.EVENT_LOOP_LAG_WARN_MS)
@@ -1,34 +1,231 @@
 import fitz  # PyMuPDF
+import io
+import math
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.executor import executor
+from app.services.pixmaps import pixmap_to_image
+
+# Output formats; PNG is written by PyMuPDF, JPEG and WebP by Pillow with `quality`
+IMAGE_FORMATS = ("png", "jpg", "webp")
+DEFAULT_QUALITY = 85
+
+
+def _page_path(output_dir: str, index: int, fmt: str) -> str:
+    return str(Path(output_dir) / f"page_{index+1:04d}.{fmt}")
+
+
+def _page_name(index: int, fmt: str) -> str:
+    return f"page_{index+1:04d}.{fmt}"
+
+
+def encode_page(pix, fmt: str, quality: int = DEFAULT_QUALITY) -> bytes:
+    """The rendered page as a `fmt` file in memory."""
+    if fmt == "png":
+        return pix.tobytes("png")
+
+    buffer = io.BytesIO()
+    img = pixmap_to_image(pix)
+    if fmt == "jpg":
+        img.save(buffer, format="JPEG", quality=quality)
+    elif fmt == "webp":
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return buffer.getvalue()
+
+
+def _save_page(data: bytes, filepath: str):
+    """
+    Write to a temporary name and rename, so a page_XXXX file that exists is
+    complete: results are listed (and served) while the job is still running.
+    """
+    path = Path(filepath)
+    tmp_path = path.with_name(f".{path.name}")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _render_range(
+    input_path: str, output_dir: str, start: int, stop: int, dpi: int, fmt: str, quality: int
+) -> List[str]:
+    """
+    Render pages [start, stop) to files with a document opened in this process.
+    Module-level so executor worker processes can run it.
+    """
+    generated_files = []
+    for i, data in _encode_pages(input_path, start, stop, dpi, fmt, quality):
+        filepath = _page_path(output_dir, i, fmt)
+        _save_page(data, filepath)
+        generated_files.append(filepath)
+    return generated_files
+
+
+def _encode_range(
+    input_path: str, start: int, stop: int, dpi: int, fmt: str, quality: int
+) -> List[Tuple[int, bytes]]:
+    """Render pages [start, stop) in memory; (page index, encoded page) for each."""
+    return list(_encode_pages(input_path, start, stop, dpi, fmt, quality))
+
+
+def _encode_pages(input_path: str, start: int, stop: int, dpi: int, fmt: str, quality: int):
+    doc = fitz.open(input_path)
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    try:
+        for i in range(start, stop):
+            pix = doc.load_page(i).get_pixmap(matrix=mat)
+            yield i, encode_page(pix, fmt, quality)
+    finally:
+        doc.close()
+
+
+def _render_capacity() -> int:
+    # How many pdf_to_images tasks the executor runs at once
+    return max(1, min(executor.limit_for("pdf_to_images"), executor.max_workers))
+
 
 class PDFEngine:
-    def process_pdf(self, input_path: str, output_dir: str, dpi: int = 200, fmt: str = "png") -> Tuple[int, List[str]]:
+    def __init__(self, workers: int = 0, parallel_min_pages: int = 16):
+        """workers: shards of one document rendered at once; 0 sizes it from free executor capacity."""
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+
+    def process_pdf(
+        self,
+        input_path: str,
+        output_dir: str,
+        dpi: int = 200,
+        fmt: str = "png",
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        workers: Optional[int] = None,
+        quality: int = DEFAULT_QUALITY
+    ) -> Tuple[int, List[str]]:
         """
         Renders PDF pages to images.
         Returns (total_pages, list_of_output_paths)
+        progress_callback(current_page, total_pages) is called after each
+        shard of pages.
+
+        Pages are rendered on the shared job executor: documents with at
+        least parallel_min_pages pages in page ranges, up to `workers` of them
+        at a time (see _run_shards), smaller ones in one task. Each task opens its own fitz
+        document. File names and the returned order are the same either way.
         """
-        doc = fitz.open(input_path)
-        total_pages = len(doc)
-        generated_files = []
-        
-        # Calculate zoom factor based on DPI (72 is base DPI)
-        zoom = dpi / 72
-        mat = fitz.Matrix(zoom, zoom)
-        
-        output_path_obj = Path(output_dir)
-        
-        for i in range(total_pages):
-            page = doc.load_page(i)
-            pix = page.get_pixmap(matrix=mat)
-            
-            filename = f"page_{i+1:04d}.{fmt}"
-            filepath = output_path_obj / filename
-            
-            pix.save(str(filepath))
-            generated_files.append(str(filepath))
-            
-        doc.close()
-        return total_pages, generated_files
+        workers = workers or self.workers
+        total_pages = self._page_count(input_path)
+
+        rendered = {}
+        for start, paths in self._run_shards(
+            _render_range, (input_path, output_dir), (dpi, fmt, quality),
+            total_pages, progress_callback, workers
+        ):
+            rendered[start] = paths
+        return total_pages, [path for start in sorted(rendered) for path in rendered[start]]
+
+    def render_to_zip(
+        self,
+        input_path: str,
+        zip_path: str,
+        dpi: int = 200,
+        fmt: str = "png",
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        workers: Optional[int] = None,
+        quality: int = DEFAULT_QUALITY
+    ) -> int:
+        """
+        Render every page straight into a ZIP (entries page_XXXX.<fmt>) without
+        writing page files. Entries are stored, not deflated: PNG, JPEG and
+        WebP are already compressed. Returns the page count.
+
+        Entries are added as shards finish, so they are not necessarily in
+        page order inside the archive.
+        """
+        workers = workers or self.workers
+        total_pages = self._page_count(input_path)
+
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+            for _, pages in self._run_shards(
+                _encode_range, (input_path,), (dpi, fmt, quality),
+                total_pages, progress_callback, workers
+            ):
+                for i, data in pages:
+                    zf.writestr(_page_name(i, fmt), data)
+
+        return total_pages
+
+    def _page_count(self, input_path: str) -> int:
+        with fitz.open(input_path) as doc:
+            return len(doc)
+
+    def _run_shards(
+        self,
+        fn: Callable,
+        leading_args: tuple,
+        trailing_args: tuple,
+        total_pages: int,
+        progress_callback: Optional[Callable[[int, int], None]],
+        workers: int
+    ):
+        """
+        Run fn(*leading_args, start, stop, *trailing_args) for each page shard
+        as a pdf_to_images task on the shared job executor, at most `workers`
+        at a time; yields (start, result) as shards finish.
+
+        Shards are submitted as earlier ones finish rather than all at once,
+        so a long document does not fill the executor's queue ahead of other
+        tools' jobs. With workers 0 a shard is submitted whenever the executor
+        has a free pdf_to_images slot (and always while none is running), so
+        one job uses every idle worker and shares them as other jobs arrive.
+        """
+        if total_pages >= self.parallel_min_pages:
+            # Several shards per worker so progress moves steadily and a slow
+            # (image-heavy) range does not leave the other workers idle at the end
+            shard_size = max(1, math.ceil(total_pages / ((workers or _render_capacity()) * 4)))
+        else:
+            shard_size = max(1, total_pages)
+        shards = deque(
+            (start, min(start + shard_size, total_pages)) for start in range(0, total_pages, shard_size)
+        )
+
+        running = {}
+        done_pages = 0
+
+        def submit_more():
+            while shards and (
+                len(running) < workers if workers
+                else not running or executor.available_slots("pdf_to_images") > 0
+            ):
+                start, stop = shards.popleft()
+                future = executor.submit("pdf_to_images", fn, *leading_args, start, stop, *trailing_args)
+                running[future] = (start, stop)
+
+        try:
+            submit_more()
+
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    start, stop = running.pop(future)
+                    yield start, future.result()
+                    done_pages += stop - start
+
+                    if progress_callback:
+                        # May raise JobCancelled; shards not submitted yet are dropped
+                        progress_callback(done_pages, total_pages)
+                    submit_more()
+        finally:
+            # Nothing may still write to the output once this returns
+            for future in running:
+                executor.cancel(future)
+            wait(running)
 
-pdf_engine = PDFEngine()
+pdf_engine = PDFEngine(
+    workers=settings.PDF_RENDER_WORKERS,
+    parallel_min_pages=settings.PDF_RENDER_PARALLEL_MIN_PAGES
+)
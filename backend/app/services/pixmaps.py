@@ -0,0 +1,53 @@
+"""
+Pixmaps - Hand PyMuPDF renders to Pillow and NumPy without encoding them
+
+Going through pix.tobytes("png") and Image.open costs a full PNG compress
+and decompress per page just to move pixels between libraries. These
+helpers wrap the pixmap's sample buffer in place instead.
+
+The buffer belongs to the pixmap, so it is exposed through a ctypes array
+that holds a reference to it: images and arrays built on it keep the
+pixmap alive for as long as they exist.
+
+Pillow can only map single-band buffers; an RGB pixmap is unpacked into
+Pillow's own 4-bytes-per-pixel layout, one memory copy and no codec.
+NumPy views of any pixmap share its memory.
+"""
+import ctypes
+
+import numpy as np
+from PIL import Image
+
+
+def _samples_buffer(pix):
+    """The pixmap's samples as a ctypes array that keeps the pixmap alive."""
+    buffer = (ctypes.c_ubyte * (pix.stride * pix.height)).from_address(pix.samples_ptr)
+    buffer._pixmap = pix
+    return buffer
+
+
+def _mode(pix) -> str:
+    modes = {1: "L", 3: "RGB", 4: "RGBA"}
+    if pix.n not in modes:
+        raise ValueError(f"Unsupported pixmap with {pix.n} components")
+    return modes[pix.n]
+
+
+def pixmap_to_image(pix) -> Image.Image:
+    """
+    A PIL image of the pixmap. Grayscale and RGBA share the pixmap's memory
+    (read-only; Pillow copies on the first in-place edit), RGB is unpacked once.
+    """
+    mode = _mode(pix)
+    return Image.frombuffer(mode, (pix.width, pix.height), _samples_buffer(pix), "raw", mode, pix.stride, 1)
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """A (height, width, components) uint8 view of the pixmap's samples."""
+    _mode(pix)
+    return np.ndarray(
+        (pix.height, pix.width, pix.n),
+        dtype=np.uint8,
+        buffer=_samples_buffer(pix),
+        strides=(pix.stride, pix.n, 1)
+    )
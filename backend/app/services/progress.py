@@ -0,0 +1,80 @@
+"""
+Progress Writer - Coalesced, rate-limited page progress for DB-backed jobs
+
+Tools report progress after every page. Committing each of those on SQLite
+makes every worker queue on the database write lock, so ProgressWriter keeps
+the latest value in memory and writes it at most every
+PROGRESS_FLUSH_INTERVAL_MS or every PROGRESS_FLUSH_PAGES pages, whichever
+comes first, plus once when the last page is reported.
+
+The flush only matches rows still in "processing" under the lease_owner the
+job was claimed with, so the same write also tells the worker that the job
+was cancelled (or its lease expired and another worker took it over) and it
+should stop.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Job
+from app.services.cancellation import JobCancelled
+
+
+class ProgressWriter:
+    """Use an instance directly as a tool's progress_callback(current, total)."""
+
+    def __init__(
+        self,
+        db: Session,
+        job_id: str,
+        owner: Optional[str],
+        interval_ms: int = settings.PROGRESS_FLUSH_INTERVAL_MS,
+        every_pages: int = settings.PROGRESS_FLUSH_PAGES,
+        update_total: bool = False
+    ):
+        self.db = db
+        self.job_id = job_id
+        self.owner = owner  # The job's lease_owner when the handler claimed it
+        self.update_total = update_total  # For jobs whose page count is only known once the tool runs
+        self.interval = interval_ms / 1000
+        self.every_pages = every_pages
+
+        self.current = 0
+        self.total: Optional[int] = None
+        self._flushed_current = 0
+        self._flushed_at = time.monotonic()
+
+    def __call__(self, current: int, total: int):
+        self.current = current
+        self.total = total
+
+        due = (
+            current >= total
+            or time.monotonic() - self._flushed_at >= self.interval
+            or abs(current - self._flushed_current) >= self.every_pages
+        )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered progress; raises JobCancelled if the job is no longer ours to run."""
+        values = {"processed_pages": self.current}
+        if self.update_total and self.total:
+            values["total_pages"] = self.total
+
+        result = self.db.execute(
+            update(Job)
+            .where(Job.id == self.job_id, Job.status == "processing", Job.lease_owner == self.owner)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+        self._flushed_current = self.current
+        self._flushed_at = time.monotonic()
+
+        if result.rowcount == 0:
+            raise JobCancelled(self.job_id)
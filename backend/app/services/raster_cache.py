@@ -0,0 +1,224 @@
+"""
+Raster Cache - Shared on-disk cache of rendered PDF pages
+
+OCR, enhanced OCR, deskew, compression and pipelines each used to render
+the same input with page.get_pixmap. They now ask the cache for a page
+image first. Entries are keyed by the document's SHA-256, page index,
+DPI and colourspace, so a document moved from one tool to the next is
+rasterised once per resolution.
+
+Layout: <RASTER_CACHE_DIR>/<doc[:2]>/<doc>/p<page>_<dpi>_<colourspace>.ppm.
+Organize/split thumbnails (app/services/thumbnails.py) live next to the
+pages through file_path/store_file and share the size budget.
+
+Pages are stored as raw samples (binary PPM for RGB, PGM for gray): a miss
+only adds a plain write of the pixmap's bytes and a hit a plain read, with
+no compression on either side. Entries are as large as the render, so the
+size budget holds fewer pages than a compressed format would. A file's
+mtime is its last use; past RASTER_CACHE_MAX_MB the least recently used
+pages are deleted.
+
+Worker processes read and write entries concurrently. Writes go through a
+temporary file and a rename, and a read that loses to an eviction just
+renders the page again.
+"""
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.core.config import settings
+from app.services.pixmaps import pixmap_to_image
+from app.services.result_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+COLORSPACES = {
+    "rgb": fitz.csRGB,
+    "gray": fitz.csGRAY,
+}
+
+
+class RasterCache:
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._written = 0  # Bytes stored since the last eviction scan
+        self.hits = 0
+        self.misses = 0
+
+    def document_key(self, pdf_path, digest: Optional[str] = None) -> str:
+        """
+        Key for a PDF file: its SHA-256. Pass `digest` when it is already
+        known (recorded at upload); otherwise it is computed once per file
+        version in this process.
+        """
+        if digest:
+            return digest
+
+        stat = os.stat(pdf_path)
+        marker = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._digests.get(marker)
+        if cached:
+            return cached
+
+        digest = file_digest(pdf_path)
+        with self._lock:
+            self._digests[marker] = digest
+        return digest
+
+    def page_image(self, page, dpi: float, doc_key: Optional[str], colorspace: str = "rgb") -> Image.Image:
+        """
+        The page rendered at `dpi` as a PIL image (mode RGB or L), from the
+        cache when possible. With doc_key None the page is just rendered.
+        """
+        if not self.enabled or not doc_key:
+            return self._render(page, dpi, colorspace)
+
+        path = self._entry_path(doc_key, page.number, dpi, colorspace)
+        try:
+            img = Image.open(path)
+            img.load()
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+            return img
+
+        img = self._render(page, dpi, colorspace)
+        self._store(path, img)
+        return img
+
+    def evict(self):
+        """Delete least recently used pages until the cache fits in max_bytes."""
+        with self._lock:
+            self._written = 0
+
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Already evicted by another process
+            total -= size
+            evicted += 1
+
+        # Drop directories of documents that have no pages left
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                for doc_dir in os.scandir(shard.path):
+                    try:
+                        os.rmdir(doc_dir.path)
+                    except OSError:
+                        pass  # Not empty
+
+        logger.info(f"Raster cache evicted {evicted} pages ({total / 1024 / 1024:.1f} MB left)")
+
+    def stats(self) -> dict:
+        """Hits and misses seen by this process, plus the cache's size on disk."""
+        entries = self._scan() if self.enabled else []
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "pages": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes
+            }
+
+    def _render(self, page, dpi: float, colorspace: str) -> Image.Image:
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=COLORSPACES[colorspace])
+        return pixmap_to_image(pix)
+
+    def file_path(self, doc_key: str, name: str) -> Path:
+        """Where a derived file of a document (e.g. a thumbnail) is kept in the cache."""
+        return self.root / doc_key[:2] / doc_key / name
+
+    def store_file(self, path: Path, save: Callable[[Path], None]) -> bool:
+        """
+        Add a file through save(tmp_path) and a rename, counted against the
+        cache's size budget. False if it could not be written.
+        """
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            save(tmp_path)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+        except OSError as e:
+            # A cache that cannot be written just misses
+            logger.warning(f"Could not store {path.name} in raster cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        with self._lock:
+            self._written += size
+            due = self._written >= self.max_bytes // 10
+        if due:
+            self.evict()
+        return True
+
+    def _store(self, path: Path, img: Image.Image):
+        self.store_file(path, lambda tmp_path: img.save(tmp_path, format="PPM"))
+
+    def _entry_path(self, doc_key: str, page_number: int, dpi: float, colorspace: str) -> Path:
+        # DPIs may be fractional (zoom = target width / page width)
+        dpi_label = f"{dpi:.2f}".rstrip("0").rstrip(".")
+        return self.file_path(doc_key, f"p{page_number}_{dpi_label}_{colorspace}.ppm")
+
+    def _scan(self):
+        """(last_used, path, size) for every cached file."""
+        entries = []
+        if not self.root.exists():
+            return entries
+
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for doc_dir in os.scandir(shard.path):
+                if not doc_dir.is_dir():
+                    continue
+                for entry in os.scandir(doc_dir.path):
+                    if entry.name.startswith("."):
+                        continue  # Being written
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # Evicted meanwhile
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+
+# Global cache instance
+raster_cache = RasterCache(
+    root=settings.RASTER_CACHE_DIR,
+    max_bytes=settings.RASTER_CACHE_MAX_MB * 1024 * 1024,
+    enabled=settings.RASTER_CACHE_ENABLED
+)
@@ -0,0 +1,223 @@
+"""
+Result Cache - Content-addressed cache of finished tool outputs
+
+Entries are keyed by SHA-256 of the tool name, its normalised parameters and
+the SHA-256 of every input file, so the same brochure compressed at the same
+setting is only ever processed once. A repeat job is completed at submit time
+by hard-linking the cached files into its job directory.
+
+Layout: <RESULT_CACHE_DIR>/<key[:2]>/<key>/{meta.json, <output files>}.
+meta.json's mtime is the entry's last use; when the cache grows past
+RESULT_CACHE_MAX_MB the least recently used entries are deleted.
+
+Entries are written by worker processes and read by the API process, so
+everything here goes through the filesystem and is safe to race: a lookup that
+loses to an eviction is simply a miss.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Bump to invalidate every entry when a tool's output changes for the same input
+CACHE_VERSION = 1
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _link_or_copy(src: Path, dest: Path):
+    try:
+        os.link(src, dest)
+    except OSError:
+        # Different filesystem, or links not supported
+        shutil.copy2(src, dest)
+
+
+class ResultCache:
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, tool: str, inputs: List, params: dict, digests: Optional[List[str]] = None) -> str:
+        """
+        Cache key for running `tool` with `params` on the given input files (in
+        order). Pass `digests` when the inputs' SHA-256 is already known (it is
+        recorded at upload) to skip rereading them.
+        """
+        payload = {
+            "version": CACHE_VERSION,
+            "tool": tool,
+            "params": params,
+            "inputs": digests or [file_digest(path) for path in inputs]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(
+        self,
+        tool: str,
+        inputs: List,
+        params: dict,
+        dest_dir,
+        digests: Optional[List[str]] = None
+    ) -> Optional[dict]:
+        """
+        If this job has been done before, link its output files into dest_dir
+        and return the info stored with them. None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            entry_dir = self._entry_dir(self.key(tool, inputs, params, digests))
+            meta_path = entry_dir / "meta.json"
+            with meta_path.open("r") as f:
+                meta = json.load(f)
+
+            dest_dir = Path(dest_dir)
+            for name in meta["files"]:
+                dest = dest_dir / name
+                if dest.exists():
+                    dest.unlink()
+                _link_or_copy(entry_dir / name, dest)
+
+            os.utime(meta_path)  # Mark as recently used
+        except (OSError, ValueError, KeyError):
+            # Not cached, or evicted while we were reading it
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Result cache hit for {tool} ({entry_dir.name[:12]})")
+        return meta["info"]
+
+    def store(
+        self,
+        tool: str,
+        inputs: List,
+        params: dict,
+        files: List,
+        info: dict,
+        digests: Optional[List[str]] = None
+    ):
+        """
+        Save a finished job's output files (copied, so the job can be rerun or
+        deleted freely) together with `info`, the JSON-able result to return on
+        a hit. Never raises: a cache that cannot be written just misses.
+        """
+        if not self.enabled:
+            return
+
+        tmp_dir = self.root / "tmp" / uuid.uuid4().hex
+        try:
+            entry_dir = self._entry_dir(self.key(tool, inputs, params, digests))
+            if entry_dir.exists():
+                return
+
+            tmp_dir.mkdir(parents=True)
+            for path in files:
+                shutil.copyfile(path, tmp_dir / Path(path).name)
+            with (tmp_dir / "meta.json").open("w") as f:
+                json.dump({
+                    "tool": tool,
+                    "params": params,
+                    "files": [Path(path).name for path in files],
+                    "info": info,
+                    "created_at": time.time()
+                }, f, default=str)
+
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(tmp_dir, entry_dir)
+        except OSError as e:
+            # Includes losing the rename race to another worker storing the same result
+            logger.warning(f"Could not store {tool} result in cache: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, entry_dir, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+        logger.info(f"Result cache evicted {evicted} entries ({total / 1024 / 1024:.1f} MB left)")
+
+    def stats(self) -> dict:
+        """Hits and misses seen by this process, plus the cache's size on disk."""
+        entries = self._scan() if self.enabled else []
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes
+            }
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _scan(self):
+        """(last_used, entry_dir, size) for every complete entry."""
+        entries = []
+        if not self.root.exists():
+            return entries
+
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == "tmp":
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    last_used = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                except OSError:
+                    continue  # Being written or evicted
+                entries.append((last_used, Path(entry.path), size))
+        return entries
+
+
+# Global cache instance
+result_cache = ResultCache(
+    root=settings.RESULT_CACHE_DIR,
+    max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+    enabled=settings.RESULT_CACHE_ENABLED
+)
@@ -1,7 +1,9 @@
 import os
 import shutil
 from pathlib import Path
+from fastapi import UploadFile
 from app.core.config import settings
+from app.services.uploads import PDF_KINDS, SavedUpload, save_upload
 
 class StorageService:
     def __init__(self):
@@ -17,14 +19,9 @@ class StorageService:
         (job_dir / "output").mkdir(exist_ok=True)
         return job_dir
 
-    async def save_upload(self, job_id: str, file_content: bytes, filename: str) -> str:
+    async def save_upload(self, job_id: str, file: UploadFile) -> SavedUpload:
         job_dir = self.create_job_dirs(job_id)
-        input_path = job_dir / "input.pdf"
-        
-        with open(input_path, "wb") as f:
-            f.write(file_content)
-            
-        return str(input_path)
+        return await save_upload(file, job_dir / "input.pdf", kinds=PDF_KINDS)
 
     def delete_job_files(self, job_id: str):
         job_dir = self.get_job_dir(job_id)
@@ -0,0 +1,171 @@
+"""
+Thumbnails - Page previews for organize and split, rendered on demand
+
+A thumbnail is rendered the first time it is asked for, directly at the zoom
+that gives the requested width, or taken from the page's embedded /Thumb
+image when that is at least as wide. Files are kept in the raster cache
+directory (keyed by the document's SHA-256, so they count against
+RASTER_CACHE_MAX_MB and survive the job) and served with an ETag and long
+cache headers: a given URL always returns the same image.
+
+Rendering runs on the executor under the "thumbnails" tool. Requests for a
+thumbnail that is already being rendered wait for that render instead of
+starting another, and each request queues the next
+THUMBNAIL_PREFETCH_PAGES pages so scrolling a preview finds them ready.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import fitz  # PyMuPDF
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from PIL import Image
+
+from app.core.config import settings
+from app.services.downloads import etag_matches
+from app.services.executor import executor
+from app.services.pixmaps import pixmap_to_image
+from app.services.raster_cache import raster_cache
+
+# Format -> (Pillow format, media type, save options)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 80}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+}
+
+DEFAULT_WIDTH = 200
+MIN_WIDTH = 32
+MAX_WIDTH = 1024
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _embedded_thumbnail(doc, page, width: int) -> Optional[Image.Image]:
+    """The page's /Thumb image scaled to `width`, if it has one that wide."""
+    kind, value = doc.xref_get_key(page.xref, "Thumb")
+    if kind != "xref":
+        return None
+
+    try:
+        pix = fitz.Pixmap(doc, int(value.split()[0]))
+    except Exception:
+        return None  # Unsupported or broken thumbnail image: render instead
+    if pix.width < width:
+        return None
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+
+    img = pixmap_to_image(pix)
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+    return img
+
+
+def render_thumbnail(pdf_path: str, page_index: int, width: int, fmt: str, output_path: str) -> str:
+    """Worker task: write page `page_index` of the PDF as a `width` px wide thumbnail."""
+    doc = fitz.open(pdf_path)
+    try:
+        if page_index < 0 or page_index >= doc.page_count:
+            raise ValueError(f"Invalid page number: {page_index}")
+
+        page = doc[page_index]
+        img = _embedded_thumbnail(doc, page, width)
+        if img is None:
+            zoom = width / page.rect.width
+            img = pixmap_to_image(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False))
+    finally:
+        doc.close()
+
+    pil_format, _, options = THUMBNAIL_FORMATS[fmt]
+    if not raster_cache.store_file(Path(output_path), lambda tmp_path: img.save(tmp_path, format=pil_format, **options)):
+        raise OSError(f"Could not write thumbnail {output_path}")
+    return output_path
+
+
+class ThumbnailService:
+    def __init__(self, prefetch_pages: int = 8):
+        self.prefetch_pages = prefetch_pages
+
+        self._lock = threading.Lock()
+        self._rendering: Dict[Path, Future] = {}
+
+    def path(self, doc_key: str, page_index: int, width: int, fmt: str) -> Path:
+        return raster_cache.file_path(doc_key, f"t{page_index}_w{width}.{fmt}")
+
+    async def get(
+        self,
+        pdf_path: str,
+        doc_key: str,
+        page_index: int,
+        total_pages: int,
+        width: int,
+        fmt: str
+    ) -> Path:
+        """
+        Path of the thumbnail, rendered first if needed. Also queues the
+        pages after it. Raises ValueError for an invalid page.
+        """
+        if page_index < 0 or page_index >= total_pages:
+            raise ValueError(f"Invalid page number: {page_index}")
+
+        path = self.path(doc_key, page_index, width, fmt)
+        future = None if self._touch(path) else self._submit(pdf_path, doc_key, page_index, width, fmt)
+
+        self.prefetch(pdf_path, doc_key, range(page_index + 1, min(page_index + 1 + self.prefetch_pages, total_pages)), width, fmt)
+
+        if future is not None:
+            await asyncio.wrap_future(future)
+        return path
+
+    def prefetch(self, pdf_path: str, doc_key: str, pages: Iterable[int], width: int, fmt: str):
+        """Queue renders for the thumbnails of `pages` that are not on disk yet."""
+        for page_index in pages:
+            if not self.path(doc_key, page_index, width, fmt).exists():
+                self._submit(pdf_path, doc_key, page_index, width, fmt)
+
+    def response(self, request: Request, path: Path, doc_key: str, fmt: str) -> Response:
+        """The thumbnail, or 304 when the client already has this version."""
+        etag = f'"{doc_key[:16]}-{path.stem}-{fmt}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        return FileResponse(path, media_type=THUMBNAIL_FORMATS[fmt][1], headers=headers)
+
+    def _submit(self, pdf_path: str, doc_key: str, page_index: int, width: int, fmt: str) -> Future:
+        """Start a render, or return the one already running for this thumbnail."""
+        path = self.path(doc_key, page_index, width, fmt)
+        with self._lock:
+            future = self._rendering.get(path)
+            if future is not None:
+                return future
+            future = executor.submit("thumbnails", render_thumbnail, pdf_path, page_index, width, fmt, str(path))
+            self._rendering[path] = future
+
+        # Outside the lock: runs right away if the render already finished
+        future.add_done_callback(lambda _, path=path: self._done(path))
+        return future
+
+    def _done(self, path: Path):
+        with self._lock:
+            self._rendering.pop(path, None)
+
+    def _touch(self, path: Path) -> bool:
+        """Mark a stored thumbnail as recently used. False if it is not on disk."""
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+
+# Global thumbnail service instance
+thumbnail_service = ThumbnailService(prefetch_pages=settings.THUMBNAIL_PREFETCH_PAGES)
@@ -0,0 +1,206 @@
+"""
+Uploads - Stream uploaded files to disk with size limits, hashing and type sniffing
+
+Starlette already spools each multipart file to a temporary file (in memory
+only up to 1 MB). Endpoints used to `await file.read()` the whole upload into
+memory before writing it out again; save_upload instead copies the spooled
+file in 1 MB chunks in a worker thread while hashing it, checking its magic
+bytes and enforcing MAX_UPLOAD_SIZE_MB.
+
+BodySizeLimitMiddleware (app/core/middleware.py) caps the raw request body,
+and each file in it at MAX_UPLOAD_SIZE_MB, before it is even parsed.
+"""
+import hashlib
+import os
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+PDF_KINDS = {"pdf"}
+IMAGE_KINDS = {"jpeg", "png", "gif", "webp", "bmp", "tiff", "avif", "heic", "ico"}
+ARCHIVE_KINDS = {"zip"}
+
+# Leading bytes of the formats the tools accept
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"\x00\x00\x01\x00", "ico"),
+)
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+class SavedUpload(NamedTuple):
+    path: Optional[Path]  # None when the upload was only checked, not copied
+    size: int
+    sha256: str
+    kind: Optional[str]
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Detect the file type from its first bytes. None if not recognised."""
+    # A ZIP's first member may itself be a PDF, so this comes before the PDF check
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    # PDF readers accept the header anywhere in the first 1 KB
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    for magic, kind in SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "avif"
+        if brand in HEIF_BRANDS:
+            return "heic"
+    return None
+
+
+def _copy(src: BinaryIO, dest: Optional[Path], filename: str, kinds, max_bytes: int) -> SavedUpload:
+    sha = hashlib.sha256()
+    size = 0
+    out = None
+
+    src.seek(0)
+    try:
+        chunk = src.read(CHUNK_SIZE)
+        kind = sniff(chunk)
+        if kinds is not None and kind not in kinds:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{filename} is not a supported file ({', '.join(sorted(kinds))})"
+            )
+
+        if dest is not None:
+            out = open(dest, "wb")
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{filename} is larger than {max_bytes // (1024 * 1024)} MB"
+                )
+            sha.update(chunk)
+            if out:
+                out.write(chunk)
+            chunk = src.read(CHUNK_SIZE)
+    except BaseException:
+        if out:
+            out.close()
+            os.remove(dest)
+        raise
+    finally:
+        src.seek(0)
+
+    if out:
+        out.close()
+    return SavedUpload(dest, size, sha.hexdigest(), kind)
+
+
+def _check_declared_size(file: UploadFile, max_bytes: int):
+    # Starlette records the spooled size; refuse before copying anything
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{file.filename} is larger than {max_bytes // (1024 * 1024)} MB"
+        )
+
+
+async def save_upload(
+    file: UploadFile,
+    dest,
+    kinds: Optional[Iterable[str]] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> SavedUpload:
+    """
+    Copy an upload to `dest` without loading it into memory.
+
+    Raises 400 if `kinds` is given and the content's magic bytes do not match,
+    413 if it is larger than max_bytes. Nothing is left at `dest` on error.
+    """
+    _check_declared_size(file, max_bytes)
+    return await run_in_threadpool(
+        _copy, file.file, Path(dest), file.filename,
+        set(kinds) if kinds is not None else None, max_bytes
+    )
+
+
+async def check_upload(
+    file: UploadFile,
+    kinds: Optional[Iterable[str]] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> SavedUpload:
+    """Same checks as save_upload for endpoints that read `file.file` directly."""
+    _check_declared_size(file, max_bytes)
+    return await run_in_threadpool(
+        _copy, file.file, None, file.filename,
+        set(kinds) if kinds is not None else None, max_bytes
+    )
+
+
+def extract_archive(
+    archive_path,
+    dest_dir,
+    kinds: Iterable[str],
+    max_files: int,
+    max_total_bytes: int,
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> Tuple[List[Tuple[str, SavedUpload]], List[dict]]:
+    """
+    Copy the members of an uploaded ZIP whose content is one of `kinds` into
+    dest_dir (as 0<ext>, 1<ext>, ...), with the same per-file size limit and
+    hashing as save_upload. Blocking; run it in a thread.
+
+    Returns ([(member filename, saved)], [{"filename", "error"}] for members
+    that were skipped). Raises 400 if the archive is unreadable or has more
+    than max_files matching members, 413 if they unpack to more than
+    max_total_bytes.
+    """
+    total = 0
+    kinds = set(kinds)
+    saved, skipped = [], []
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name or member.filename.startswith("__MACOSX/"):
+                    continue
+                if len(saved) >= max_files:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Archive has more than {max_files} files"
+                    )
+
+                dest = Path(dest_dir) / f"{len(saved)}{Path(name).suffix.lower()}"
+                try:
+                    with archive.open(member) as src:
+                        upload = _copy(src, dest, name, kinds, min(max_bytes, max_total_bytes - total))
+                except HTTPException as e:
+                    if total + member.file_size > max_total_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Archive unpacks to more than {max_total_bytes // (1024 * 1024)} MB"
+                        )
+                    skipped.append({"filename": name, "error": e.detail})
+                    continue
+                total += upload.size
+                saved.append((name, upload))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+        # Corrupt, encrypted or using an unsupported compression method
+        raise HTTPException(status_code=400, detail=f"Could not read archive: {e}")
+    return saved, skipped
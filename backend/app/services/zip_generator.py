@@ -1,15 +1,309 @@
-import zipfile
+"""
+ZIP Generator - Build ZIP archives as a stream of bytes
+
+stream_zip writes the archive record by record and yields it in chunks, so a
+StreamingResponse can start sending before the last entry exists and nothing
+is assembled on disk first. Entries use data descriptors (sizes and CRC
+follow the data) and ZIP64 records where sizes or offsets need them.
+
+Each entry is STORED or DEFLATED: formats that are compressed already
+(PNG, JPEG, WebP, ZIP, Office files...) are stored, anything else is
+deflated only if a sample of it shrinks. With workers > 1, deflated
+entries are compressed ahead in threads (zlib releases the GIL) while
+earlier ones are being sent; the archive keeps the entries' order.
+
+stream_zip_async takes its entries from an async generator instead, for
+entries that have to be waited for: the waiting then happens on the event
+loop rather than in a threadpool thread.
+"""
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Tuple, Union
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+from starlette.concurrency import iterate_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024
+
+# Extensions of formats that deflate cannot shrink
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip", ".gz", ".bz2", ".xz", ".7z",
+    ".docx", ".xlsx", ".pptx", ".mp3", ".mp4",
+}
+
+# Other entries are deflated if their first SAMPLE_BYTES shrink by at least MIN_SAVING
+SAMPLE_BYTES = 64 * 1024
+MIN_SAVING = 0.1
+
+# Entries larger than this are deflated while streaming, not held in memory ahead
+MAX_AHEAD_BYTES = 32 * 1024 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+# Deflate can grow incompressible data a little: past this, use ZIP64 sizes up front
+ZIP64_ENTRY_THRESHOLD = 0xF0000000
+
+Source = Union[str, bytes]
+
+
+def _source_size(source: Source) -> int:
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+
+def _read_chunks(source: Source) -> Iterator[bytes]:
+    if isinstance(source, bytes):
+        for start in range(0, len(source), CHUNK_SIZE):
+            yield source[start:start + CHUNK_SIZE]
+        return
+    with open(source, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def choose_compression(arcname: str, source: Source) -> int:
+    """ZIP_STORED for already-compressed formats and data that does not deflate, else ZIP_DEFLATED."""
+    if Path(arcname).suffix.lower() in STORED_EXTENSIONS:
+        return ZIP_STORED
+
+    if isinstance(source, bytes):
+        sample = source[:SAMPLE_BYTES]
+    else:
+        with open(source, "rb") as f:
+            sample = f.read(SAMPLE_BYTES)
+    if not sample:
+        return ZIP_STORED
+
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -15)
+    saved = 1 - len(compressor.compress(sample) + compressor.flush()) / len(sample)
+    return ZIP_DEFLATED if saved >= MIN_SAVING else ZIP_STORED
+
+
+def _deflate(source: Source) -> Tuple[int, int, bytes]:
+    """Thread task: (crc, size, raw deflate data) of a whole entry."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    crc, size, parts = 0, 0, []
+    for chunk in _read_chunks(source):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return crc, size, b"".join(parts)
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    t = time.localtime(max(timestamp, 315532800))  # ZIP dates start in 1980
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    )
+
+
+class _Entry:
+    def __init__(self, arcname: str, method: int, timestamp: float, zip64: bool):
+        self.name = arcname.encode("utf-8")
+        self.method = method
+        self.dos_time, self.dos_date = _dos_datetime(timestamp)
+        self.zip64 = zip64
+        self.flags = 0x08 | 0x800  # Sizes and CRC in a data descriptor; UTF-8 name
+        self.offset = 0
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+
+
+class _ZipWriter:
+    """Produces the records of one archive in order and tracks their offsets."""
+
+    def __init__(self):
+        self.offset = 0
+        self.entries: List[_Entry] = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def local_header(self, entry: _Entry) -> bytes:
+        entry.offset = self.offset
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if entry.zip64 else b""
+        sizes = ZIP64_LIMIT if entry.zip64 else 0
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if entry.zip64 else 20, entry.flags, entry.method,
+            entry.dos_time, entry.dos_date, 0, sizes, sizes, len(entry.name), len(extra)
+        )
+        return self._emit(header + entry.name + extra)
+
+    def data(self, entry: _Entry, chunk: bytes) -> bytes:
+        entry.compress_size += len(chunk)
+        return self._emit(chunk)
+
+    def descriptor(self, entry: _Entry) -> bytes:
+        if entry.zip64:
+            record = struct.pack("<IIQQ", 0x08074B50, entry.crc, entry.compress_size, entry.file_size)
+        elif entry.compress_size >= ZIP64_LIMIT or entry.file_size >= ZIP64_LIMIT:
+            raise ValueError(f"ZIP entry {entry.name.decode()} outgrew its 32-bit sizes")
+        else:
+            record = struct.pack("<IIII", 0x08074B50, entry.crc, entry.compress_size, entry.file_size)
+        self.entries.append(entry)
+        return self._emit(record)
+
+    def central_directory(self) -> bytes:
+        start = self.offset
+        records = []
+        for entry in self.entries:
+            zip64_fields = []
+            file_size, compress_size, offset = entry.file_size, entry.compress_size, entry.offset
+            if entry.zip64:
+                zip64_fields += [file_size, compress_size]
+                file_size = compress_size = ZIP64_LIMIT
+            if offset >= ZIP64_LIMIT:
+                zip64_fields.append(offset)
+                offset = ZIP64_LIMIT
+
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = 45 if zip64_fields else 20
+            records.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, entry.flags, entry.method,
+                entry.dos_time, entry.dos_date, entry.crc, compress_size, file_size,
+                len(entry.name), len(extra), 0, 0, 0, 0o100644 << 16, offset
+            ) + entry.name + extra)
+
+        directory = b"".join(records)
+        size, count = len(directory), len(self.entries)
+
+        end = b""
+        if count >= 0xFFFF or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            zip64_end_offset = start + size
+            end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45, 0, 0, count, count, size, start)
+            end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        end += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0
+        )
+        return self._emit(directory + end)
+
 
 class ZipGenerator:
-    def create_zip(self, file_paths: List[str], zip_path: str):
+    def create_zip(
+        self,
+        file_paths: List[str],
+        zip_path: str,
+        compression: Optional[int] = None,
+        workers: int = 1
+    ):
         """
         Creates a ZIP file containing the specified files.
+        compression None picks STORED or DEFLATED per file (see stream_zip).
+        """
+        with open(zip_path, "wb") as f:
+            # Add each file with just its filename (no directories)
+            entries = ((Path(file_path).name, file_path) for file_path in file_paths)
+            for chunk in self.stream_zip(entries, compression=compression, workers=workers):
+                f.write(chunk)
+
+    def stream_zip(
+        self,
+        entries: Iterable[Tuple[str, Source]],
+        compression: Optional[int] = None,
+        workers: int = 1
+    ) -> Iterator[bytes]:
+        """
+        Build a ZIP on the fly and yield it in chunks of up to CHUNK_SIZE.
+
+        entries yields (arcname, file path or bytes) and may be a generator
+        that produces them as they become ready; an entry is sent as soon as
+        it is added. compression forces ZIP_STORED or ZIP_DEFLATED for every
+        entry; None chooses per entry with choose_compression.
+
+        With workers > 1, up to 2 * workers deflated entries are compressed
+        ahead in threads. Stored entries never wait for that, but one
+        waiting to be deflated holds back the entries behind it, so keep
+        workers at 1 when entries trickle in and must go out immediately.
         """
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for file_path in file_paths:
-                # Add file to zip with just the filename (no directories)
-                zf.write(file_path, arcname=Path(file_path).name)
-                
+        writer = _ZipWriter()
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        pending = deque()
+        try:
+            for arcname, source in entries:
+                method = compression if compression is not None else choose_compression(arcname, source)
+                ahead = None
+                if pool and method == ZIP_DEFLATED and _source_size(source) <= MAX_AHEAD_BYTES:
+                    ahead = pool.submit(_deflate, source)
+                pending.append((arcname, source, method, ahead))
+
+                # Send entries at the head that are ready, or that the window forces out
+                while pending and (pending[0][3] is None or pending[0][3].done() or len(pending) > 2 * workers):
+                    yield from self._write_entry(writer, *pending.popleft())
+
+            while pending:
+                yield from self._write_entry(writer, *pending.popleft())
+
+            yield writer.central_directory()
+        finally:
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    async def stream_zip_async(
+        self,
+        entries: AsyncIterable[Tuple[str, Source]],
+        compression: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        stream_zip for an async generator of entries. Each entry is read
+        (and deflated) in the threadpool a chunk at a time as it is sent;
+        no thread is held while the next entry is awaited.
+        """
+        writer = _ZipWriter()
+        async for arcname, source in entries:
+            async for chunk in iterate_in_threadpool(self._add_entry(writer, arcname, source, compression)):
+                yield chunk
+        yield writer.central_directory()
+
+    def _add_entry(
+        self,
+        writer: _ZipWriter,
+        arcname: str,
+        source: Source,
+        compression: Optional[int]
+    ) -> Iterator[bytes]:
+        method = compression if compression is not None else choose_compression(arcname, source)
+        yield from self._write_entry(writer, arcname, source, method, None)
+
+    def _write_entry(
+        self,
+        writer: _ZipWriter,
+        arcname: str,
+        source: Source,
+        method: int,
+        ahead: Optional[Future]
+    ) -> Iterator[bytes]:
+        size = _source_size(source)
+        timestamp = time.time() if isinstance(source, bytes) else os.path.getmtime(source)
+        entry = _Entry(arcname, method, timestamp, zip64=size >= ZIP64_ENTRY_THRESHOLD)
+
+        yield writer.local_header(entry)
+
+        if ahead is not None:
+            entry.crc, entry.file_size, data = ahead.result()
+            for start in range(0, len(data), CHUNK_SIZE):
+                yield writer.data(entry, data[start:start + CHUNK_SIZE])
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if method == ZIP_DEFLATED else None
+            for chunk in _read_chunks(source):
+                entry.crc = zlib.crc32(chunk, entry.crc)
+                entry.file_size += len(chunk)
+                out = compressor.compress(chunk) if compressor else chunk
+                if out:
+                    yield writer.data(entry, out)
+            if compressor:
+                yield writer.data(entry, compressor.flush())
+
+        yield writer.descriptor(entry)
+
+
 zip_generator = ZipGenerator()
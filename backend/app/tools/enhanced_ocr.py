@@ -2,14 +2,14 @@
 Enhanced OCR Tool - Extract text with layout preservation using PaddleOCR & LayoutParser
 """
 import fitz  # PyMuPDF
-from PIL import Image
-import io
 import os
 import layoutparser as lp
 import numpy as np
 import cv2
 from typing import Callable, Optional, Dict, List
 
+from app.services.raster_cache import raster_cache
+
 # Initialize global models to avoid reloading (lazy loading recommended in production)
 _layout_model = None
 _ocr_agent = None
@@ -68,6 +68,7 @@ def extract_text_enhanced(
     
     try:
         doc = fitz.open(input_pdf_path)
+        doc_key = raster_cache.document_key(input_pdf_path)
         total_pages = len(doc)
         
         results = {
@@ -81,10 +82,7 @@ def extract_text_enhanced(
             page = doc[page_num]
             
             # Get high-res image
-            mat = fitz.Matrix(300 / 72, 300 / 72) # 300 DPI
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            image = Image.open(io.BytesIO(img_data)).convert("RGB")
+            image = raster_cache.page_image(page, 300, doc_key)  # 300 DPI, RGB
             
             # Detect Layout
             # model.detect() works on PIL image or np array
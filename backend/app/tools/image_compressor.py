@@ -6,7 +6,7 @@ Reduces image file sizes with advanced compression options
 from PIL import Image
 from pathlib import Path
 import os
-from typing import Optional
+from typing import Optional, Tuple
 import tempfile
 
 
@@ -69,22 +69,12 @@ class ImageCompressorTool:
         else:
             target_format = original_format
         
-        # Resize if specified
         original_dimensions = (img.width, img.height)
-        if max_width or max_height:
-            img = self._resize_image(img, max_width, max_height)
-            was_resized = True
-        else:
-            was_resized = False
-        
-        # If target size is specified, find optimal quality
-        if target_size_kb:
-            quality = self._find_quality_for_target_size(
-                img, output_path, target_format, target_size_kb, quality
-            )
-        
-        # Compress and save
-        self._save_image(img, output_path, target_format, quality)
+        img, quality = self.compress(
+            img, output_path, target_format, quality,
+            target_size_kb=target_size_kb, max_width=max_width, max_height=max_height
+        )
+        was_resized = bool(max_width or max_height)
         
         # Calculate results
         original_size = os.path.getsize(input_path)
@@ -111,6 +101,37 @@ class ImageCompressorTool:
             'success': True
         }
 
+    def compress(
+        self,
+        img: Image.Image,
+        output_path: str,
+        target_format: str,
+        quality: int = 85,
+        target_size_kb: Optional[int] = None,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None
+    ) -> Tuple[Image.Image, int]:
+        """
+        Downscale, pick the quality and save an already opened image
+        (see compress_image for the arguments)
+        
+        Returns:
+            The image as saved and the quality used
+        """
+        # Resize if specified
+        if max_width or max_height:
+            img = self._resize_image(img, max_width, max_height)
+        
+        # If target size is specified, find optimal quality
+        if target_size_kb:
+            quality = self._find_quality_for_target_size(
+                img, output_path, target_format, target_size_kb, quality
+            )
+        
+        # Compress and save
+        self._save_image(img, output_path, target_format, quality)
+        return img, quality
+
     def _resize_image(
         self, 
         img: Image.Image, 
@@ -58,7 +58,6 @@ class ImageCropperTool:
         
         # Open image
         img = Image.open(input_path)
-        img_width, img_height = img.size
         original_format = img.format or 'PNG'
         
         # Determine target format
@@ -67,6 +66,76 @@ class ImageCropperTool:
         else:
             target_format = original_format
         
+        cropped_img, crop_info = self.crop(
+            img, x=x, y=y, width=width, height=height,
+            aspect_ratio=aspect_ratio, center_crop=center_crop
+        )
+        
+        # Handle transparency for formats that don't support it
+        if target_format in ['JPEG', 'JPG'] and cropped_img.mode in ['RGBA', 'LA', 'P']:
+            background = Image.new('RGB', cropped_img.size, (255, 255, 255))
+            if cropped_img.mode == 'RGBA':
+                background.paste(cropped_img, mask=cropped_img.split()[3])
+            elif cropped_img.mode == 'LA':
+                background.paste(cropped_img, mask=cropped_img.split()[1])
+            else:
+                cropped_img = cropped_img.convert('RGBA')
+                background.paste(cropped_img, mask=cropped_img.split()[3])
+            cropped_img = background
+        
+        # Save with format-specific options
+        save_kwargs = {}
+        
+        if target_format in ['JPEG', 'JPG']:
+            save_kwargs['quality'] = quality
+            save_kwargs['optimize'] = True
+            save_kwargs['progressive'] = True
+        elif target_format == 'PNG':
+            save_kwargs['optimize'] = True
+        elif target_format == 'WEBP':
+            save_kwargs['quality'] = quality
+            save_kwargs['method'] = 6
+        elif target_format == 'AVIF':
+            save_kwargs['quality'] = quality
+            save_kwargs['speed'] = 6
+        else:
+            save_kwargs['optimize'] = True
+        
+        cropped_img.save(output_path, format=target_format, **save_kwargs)
+        
+        # Calculate results
+        original_size = os.path.getsize(input_path)
+        cropped_size = os.path.getsize(output_path)
+        
+        return {
+            **crop_info,
+            'original_size': original_size,
+            'cropped_size': cropped_size,
+            'original_format': original_format,
+            'output_format': target_format,
+            'quality': quality,
+            'output_path': output_path,
+            'success': True
+        }
+
+    def crop(
+        self,
+        img: Image.Image,
+        x: int = 0,
+        y: int = 0,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        aspect_ratio: Optional[str] = None,
+        center_crop: bool = False
+    ) -> Tuple[Image.Image, dict]:
+        """
+        Crop an already opened image (see crop_image for the arguments)
+        
+        Returns:
+            Cropped image and a dict describing the crop
+        """
+        img_width, img_height = img.size
+        
         # Calculate crop box
         if aspect_ratio and aspect_ratio != 'custom':
             # Use aspect ratio preset
@@ -132,63 +201,19 @@ class ImageCropperTool:
         
         # Crop image (PIL format: left, upper, right, lower)
         crop_box = (crop_x, crop_y, crop_x + crop_width, crop_y + crop_height)
-        cropped_img = img.crop(crop_box)
-        
-        # Handle transparency for formats that don't support it
-        if target_format in ['JPEG', 'JPG'] and cropped_img.mode in ['RGBA', 'LA', 'P']:
-            background = Image.new('RGB', cropped_img.size, (255, 255, 255))
-            if cropped_img.mode == 'RGBA':
-                background.paste(cropped_img, mask=cropped_img.split()[3])
-            elif cropped_img.mode == 'LA':
-                background.paste(cropped_img, mask=cropped_img.split()[1])
-            else:
-                cropped_img = cropped_img.convert('RGBA')
-                background.paste(cropped_img, mask=cropped_img.split()[3])
-            cropped_img = background
-        
-        # Save with format-specific options
-        save_kwargs = {}
-        
-        if target_format in ['JPEG', 'JPG']:
-            save_kwargs['quality'] = quality
-            save_kwargs['optimize'] = True
-            save_kwargs['progressive'] = True
-        elif target_format == 'PNG':
-            save_kwargs['optimize'] = True
-        elif target_format == 'WEBP':
-            save_kwargs['quality'] = quality
-            save_kwargs['method'] = 6
-        elif target_format == 'AVIF':
-            save_kwargs['quality'] = quality
-            save_kwargs['speed'] = 6
-        else:
-            save_kwargs['optimize'] = True
-        
-        cropped_img.save(output_path, format=target_format, **save_kwargs)
-        
-        # Calculate results
-        original_size = os.path.getsize(input_path)
-        cropped_size = os.path.getsize(output_path)
         
         # Calculate aspect ratio of cropped image
         final_aspect_ratio = f"{crop_width}:{crop_height}"
         if aspect_ratio and aspect_ratio != 'custom':
             final_aspect_ratio = aspect_ratio
         
-        return {
+        return img.crop(crop_box), {
             'original_dimensions': (img_width, img_height),
             'cropped_dimensions': (crop_width, crop_height),
-            'crop_box': (crop_x, crop_y, crop_x + crop_width, crop_y + crop_height),
-            'original_size': original_size,
-            'cropped_size': cropped_size,
+            'crop_box': crop_box,
             'crop_method': resize_method,
             'aspect_ratio': final_aspect_ratio,
-            'center_crop': center_crop,
-            'original_format': original_format,
-            'output_format': target_format,
-            'quality': quality,
-            'output_path': output_path,
-            'success': True
+            'center_crop': center_crop
         }
 
     def get_image_info(self, image_path: str) -> dict:
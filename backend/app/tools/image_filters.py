@@ -6,7 +6,7 @@ Apply filters and effects using PIL/Pillow - no AI, fully independent
 from PIL import Image, ImageEnhance, ImageFilter
 from pathlib import Path
 import os
-from typing import Optional
+from typing import List, Optional, Tuple
 
 
 class ImageFiltersTool:
@@ -59,6 +59,78 @@ class ImageFiltersTool:
         original_mode = img.mode
         original_format = img.format or 'PNG'
         
+        img, applied_filters = self.filter_image(
+            img, brightness=brightness, contrast=contrast, saturation=saturation,
+            sharpness=sharpness, blur=blur, sharpen=sharpen, edge_enhance=edge_enhance,
+            grayscale=grayscale, sepia=sepia
+        )
+        
+        # Determine target format
+        if output_format:
+            target_format = output_format.upper()
+        else:
+            target_format = original_format
+        
+        # Handle transparency for JPEG
+        if target_format in ['JPEG', 'JPG'] and img.mode in ['RGBA', 'LA', 'P']:
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'RGBA':
+                background.paste(img, mask=img.split()[3])
+            else:
+                background.paste(img)
+            img = background
+        
+        # Save with format-specific options
+        save_kwargs = {}
+        
+        if target_format in ['JPEG', 'JPG']:
+            save_kwargs['quality'] = quality
+            save_kwargs['optimize'] = True
+        elif target_format == 'PNG':
+            save_kwargs['optimize'] = True
+        elif target_format == 'WEBP':
+            save_kwargs['quality'] = quality
+            save_kwargs['method'] = 6
+        elif target_format == 'AVIF':
+            save_kwargs['quality'] = quality
+        
+        img.save(output_path, format=target_format, **save_kwargs)
+        
+        # Calculate results
+        original_size = os.path.getsize(input_path)
+        output_size = os.path.getsize(output_path)
+        
+        return {
+            'original_size': original_size,
+            'output_size': output_size,
+            'dimensions': img.size,
+            'applied_filters': applied_filters,
+            'original_format': original_format,
+            'output_format': target_format,
+            'quality': quality,
+            'success': True
+        }
+    
+    def filter_image(
+        self,
+        img: Image.Image,
+        brightness: float = 1.0,
+        contrast: float = 1.0,
+        saturation: float = 1.0,
+        sharpness: float = 1.0,
+        blur: int = 0,
+        sharpen: bool = False,
+        edge_enhance: bool = False,
+        grayscale: bool = False,
+        sepia: bool = False
+    ) -> Tuple[Image.Image, List[str]]:
+        """
+        Apply adjustments and effects to an already opened image
+        (see apply_filters for the arguments)
+        
+        Returns:
+            Filtered image and the list of applied filters
+        """
         # Convert to RGB if needed (for processing)
         if img.mode not in ['RGB', 'RGBA']:
             img = img.convert('RGB')
@@ -96,41 +168,6 @@ class ImageFiltersTool:
         if edge_enhance:
             img = img.filter(ImageFilter.EDGE_ENHANCE)
         
-        # Determine target format
-        if output_format:
-            target_format = output_format.upper()
-        else:
-            target_format = original_format
-        
-        # Handle transparency for JPEG
-        if target_format in ['JPEG', 'JPG'] and img.mode in ['RGBA', 'LA', 'P']:
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'RGBA':
-                background.paste(img, mask=img.split()[3])
-            else:
-                background.paste(img)
-            img = background
-        
-        # Save with format-specific options
-        save_kwargs = {}
-        
-        if target_format in ['JPEG', 'JPG']:
-            save_kwargs['quality'] = quality
-            save_kwargs['optimize'] = True
-        elif target_format == 'PNG':
-            save_kwargs['optimize'] = True
-        elif target_format == 'WEBP':
-            save_kwargs['quality'] = quality
-            save_kwargs['method'] = 6
-        elif target_format == 'AVIF':
-            save_kwargs['quality'] = quality
-        
-        img.save(output_path, format=target_format, **save_kwargs)
-        
-        # Calculate results
-        original_size = os.path.getsize(input_path)
-        output_size = os.path.getsize(output_path)
-        
         # Track applied filters
         applied_filters = []
         if brightness != 1.0:
@@ -152,16 +189,7 @@ class ImageFiltersTool:
         if sepia:
             applied_filters.append('sepia')
         
-        return {
-            'original_size': original_size,
-            'output_size': output_size,
-            'dimensions': img.size,
-            'applied_filters': applied_filters,
-            'original_format': original_format,
-            'output_format': target_format,
-            'quality': quality,
-            'success': True
-        }
+        return img, applied_filters
     
     def _apply_sepia(self, img: Image.Image) -> Image.Image:
         """Apply sepia tone effect"""
@@ -64,7 +64,6 @@ class ImageResizerTool:
         
         # Open image
         img = Image.open(input_path)
-        original_width, original_height = img.size
         original_format = img.format or 'PNG'
         
         # Determine target format
@@ -73,6 +72,76 @@ class ImageResizerTool:
         else:
             target_format = original_format
         
+        resized_img, resize_info = self.resize(
+            img, width=width, height=height, scale_percent=scale_percent, preset=preset,
+            maintain_aspect=maintain_aspect, resampling=resampling
+        )
+        
+        # Handle transparency for formats that don't support it
+        if target_format in ['JPEG', 'JPG'] and resized_img.mode in ['RGBA', 'LA', 'P']:
+            background = Image.new('RGB', resized_img.size, (255, 255, 255))
+            if resized_img.mode == 'RGBA':
+                background.paste(resized_img, mask=resized_img.split()[3])
+            elif resized_img.mode == 'LA':
+                background.paste(resized_img, mask=resized_img.split()[1])
+            else:
+                resized_img = resized_img.convert('RGBA')
+                background.paste(resized_img, mask=resized_img.split()[3])
+            resized_img = background
+        
+        # Save with format-specific options
+        save_kwargs = {}
+        
+        if target_format in ['JPEG', 'JPG']:
+            save_kwargs['quality'] = quality
+            save_kwargs['optimize'] = True
+            save_kwargs['progressive'] = True
+        elif target_format == 'PNG':
+            save_kwargs['optimize'] = True
+        elif target_format == 'WEBP':
+            save_kwargs['quality'] = quality
+            save_kwargs['method'] = 6
+        elif target_format == 'AVIF':
+            save_kwargs['quality'] = quality
+            save_kwargs['speed'] = 6
+        else:
+            save_kwargs['optimize'] = True
+        
+        resized_img.save(output_path, format=target_format, **save_kwargs)
+        
+        # Calculate results
+        original_size = os.path.getsize(input_path)
+        resized_size = os.path.getsize(output_path)
+        
+        return {
+            **resize_info,
+            'original_size': original_size,
+            'resized_size': resized_size,
+            'original_format': original_format,
+            'output_format': target_format,
+            'quality': quality,
+            'output_path': output_path,
+            'success': True
+        }
+
+    def resize(
+        self,
+        img: Image.Image,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        scale_percent: Optional[float] = None,
+        preset: Optional[str] = None,
+        maintain_aspect: bool = True,
+        resampling: str = 'lanczos'
+    ) -> Tuple[Image.Image, dict]:
+        """
+        Resize an already opened image (see resize_image for the arguments)
+        
+        Returns:
+            Resized image and a dict describing the resize
+        """
+        original_width, original_height = img.size
+        
         # Calculate target dimensions (priority: preset > scale_percent > width/height)
         if preset and preset in self.PRESETS:
             # Use preset dimensions
@@ -118,65 +187,19 @@ class ImageResizerTool:
         # Get resampling filter
         resample_filter = self.RESAMPLING_METHODS.get(resampling, Image.Resampling.LANCZOS)
         
-        # Resize image
-        resized_img = img.resize((target_width, target_height), resample_filter)
-        
-        # Handle transparency for formats that don't support it
-        if target_format in ['JPEG', 'JPG'] and resized_img.mode in ['RGBA', 'LA', 'P']:
-            background = Image.new('RGB', resized_img.size, (255, 255, 255))
-            if resized_img.mode == 'RGBA':
-                background.paste(resized_img, mask=resized_img.split()[3])
-            elif resized_img.mode == 'LA':
-                background.paste(resized_img, mask=resized_img.split()[1])
-            else:
-                resized_img = resized_img.convert('RGBA')
-                background.paste(resized_img, mask=resized_img.split()[3])
-            resized_img = background
-        
-        # Save with format-specific options
-        save_kwargs = {}
-        
-        if target_format in ['JPEG', 'JPG']:
-            save_kwargs['quality'] = quality
-            save_kwargs['optimize'] = True
-            save_kwargs['progressive'] = True
-        elif target_format == 'PNG':
-            save_kwargs['optimize'] = True
-        elif target_format == 'WEBP':
-            save_kwargs['quality'] = quality
-            save_kwargs['method'] = 6
-        elif target_format == 'AVIF':
-            save_kwargs['quality'] = quality
-            save_kwargs['speed'] = 6
-        else:
-            save_kwargs['optimize'] = True
-        
-        resized_img.save(output_path, format=target_format, **save_kwargs)
-        
-        # Calculate results
-        original_size = os.path.getsize(input_path)
-        resized_size = os.path.getsize(output_path)
-        
         # Calculate scale factor
         scale_factor_x = target_width / original_width
         scale_factor_y = target_height / original_height
         
-        return {
+        return img.resize((target_width, target_height), resample_filter), {
             'original_dimensions': (original_width, original_height),
             'resized_dimensions': (target_width, target_height),
-            'original_size': original_size,
-            'resized_size': resized_size,
             'scale_factor_x': round(scale_factor_x, 2),
             'scale_factor_y': round(scale_factor_y, 2),
             'resize_method': resize_method,
             'resampling': resampling,
             'is_upscaling': is_upscaling,
-            'maintained_aspect': maintain_aspect,
-            'original_format': original_format,
-            'output_format': target_format,
-            'quality': quality,
-            'output_path': output_path,
-            'success': True
+            'maintained_aspect': maintain_aspect
         }
 
     def get_image_info(self, image_path: str) -> dict:
@@ -46,8 +46,11 @@ class ImageRotateTool:
         Returns:
             Transformed PIL Image
         """
-        img = self.image.copy()
-        
+        return self.transform(self.image.copy(), rotation, flip_h, flip_v)
+    
+    @staticmethod
+    def transform(img: Image.Image, rotation: float, flip_h: bool, flip_v: bool) -> Image.Image:
+        """Rotate and flip an already opened image (see apply_transforms)"""
         # 1. Apply Rotation (negative because PIL rotates counter-clockwise by default)
         # expand=True resizing the canvas to fit the rotated image
         if rotation != 0:
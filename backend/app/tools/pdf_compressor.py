@@ -2,8 +2,21 @@
 PDF Compressor Tool - Reduce PDF file size with quality options
 """
 import fitz  # PyMuPDF
-from typing import Callable, Optional
+import numpy as np
+from PIL import Image, TiffImagePlugin, features
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+import hashlib
+import io
+import logging
+import math
 import os
+import statistics
+import time
+
+from app.services.pixmaps import pixmap_to_image
+from app.services.raster_cache import COLORSPACES, raster_cache
+
+logger = logging.getLogger(__name__)
 
 
 # Quality presets
@@ -25,6 +38,87 @@ QUALITY_SETTINGS = {
     }
 }
 
+# 'rasterize' replaces every page with one JPEG; 'images' keeps text and
+# vector graphics and only recompresses the embedded images; 'lossless'
+# only rewrites the file's structure
+COMPRESSION_METHODS = ('rasterize', 'images', 'lossless')
+
+# Save options of the lossless optimisation, also used for 'images' output
+LOSSLESS_SAVE_OPTIONS = {
+    'garbage': 4,  # Drop unused objects, merge duplicates (streams included)
+    'deflate': True,
+    'deflate_images': True,
+    'deflate_fonts': True,
+    'use_objstms': 1,  # Pack objects into compressed object streams
+}
+
+# 'images': an image is downsampled to the preset's DPI only when it is
+# shown at more than this many times that resolution
+DOWNSAMPLE_THRESHOLD = 1.5
+
+# 'rasterize' encodes each page by its content class (see classify_page):
+#   blank      no image at all
+#   bitonal    1-bit CCITT G4, rendered at BITONAL_MIN_DPI or more
+#   grayscale  grayscale JPEG
+#   colour     RGB JPEG
+#   vector     no images and not bitonal (fills, coloured text, drawings):
+#              copied from the input as it is, keeping its text and vector
+#              graphics, which are smaller than any render of them
+PAGE_CLASSES = ('blank', 'bitonal', 'grayscale', 'colour', 'vector')
+
+# Pages are classified on their render reduced to about this DPI
+CLASSIFY_DPI = 72
+
+# A page is in colour if more than COLOUR_PIXELS of its pixels have
+# channels more than COLOUR_SPREAD apart
+COLOUR_SPREAD = 24
+COLOUR_PIXELS = 0.001
+
+# Gray levels strictly between these are midtones. A blank page has no
+# pixel darker than the upper one
+MIDTONES = (48, 208)
+
+# Midtones next to a contrast of EDGE_CONTRAST are the soft edges of text
+# and lines; a page with at most BITONAL_MAX_FLAT of its pixels being
+# other midtones (photos, shading) is bitonal
+EDGE_CONTRAST = 96
+BITONAL_MAX_FLAT = 0.01
+
+# 1-bit pages need more resolution than JPEG to stay legible, and G4
+# keeps them small even so
+BITONAL_MIN_DPI = 200
+BITONAL_THRESHOLD = 128
+
+# G4 encoding needs Pillow built with libtiff; without it bitonal pages
+# are classified grayscale
+CCITT_AVAILABLE = features.check('libtiff')
+
+# Target-size search: (dpi, lowest quality, highest quality) from best to
+# smallest. Below a resolution's lowest quality the next one down looks better
+TARGET_RESOLUTIONS = [
+    (300, 80, 90),
+    (200, 70, 90),
+    (150, 60, 80),
+    (100, 45, 75),
+    (72, 25, 60),
+]
+TARGET_QUALITY_STEP = 5
+
+# Rendered pages held in memory while one resolution is searched
+TARGET_RASTER_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Output bytes besides the page images (measured with PyMuPDF, rounded up)
+DOCUMENT_OVERHEAD_BYTES = 4096
+PAGE_OVERHEAD_BYTES = 512
+
+# Size estimates encode a band of this fraction of the height of this
+# many evenly spread pages
+ESTIMATE_SAMPLE_PAGES = 6
+ESTIMATE_BAND = 0.25
+
+# Two-sided 95% Student t quantiles by degrees of freedom (sampled pages - 1)
+T_95 = {1: 12.71, 2: 4.30, 3: 3.18, 4: 2.78, 5: 2.57, 6: 2.45, 7: 2.36, 8: 2.31, 9: 2.26}
+
 
 def compress_pdf(
     input_pdf_path: str,
@@ -32,7 +126,10 @@ def compress_pdf(
     quality: str = 'medium',
     compress_by_percent: Optional[int] = None,
     max_file_size_mb: Optional[float] = None,
-    progress_callback: Optional[Callable[[int, int], None]] = None
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    method: str = 'rasterize',
+    optimize: bool = False,
+    strip_metadata: bool = False
 ) -> dict:
     """
     Compress PDF by reducing image quality and optimizing structure.
@@ -44,17 +141,26 @@ def compress_pdf(
         compress_by_percent: Target compression percentage (e.g., 50 = reduce by 50%)
         max_file_size_mb: Target maximum file size in MB (e.g., 5.0 = max 5MB)
         progress_callback: Optional callback(current_page, total_pages)
+        method: 'rasterize' (every page becomes an image), 'images'
+            (only embedded images are recompressed; text stays selectable)
+            or 'lossless' (structure only, see optimize_lossless)
+        optimize: With 'images', run the lossless optimisation first
+        strip_metadata: Lossless optimisation also removes the document
+            info and XMP metadata
     
     Returns:
         dict with compression results
         
     Raises:
-        ValueError: If quality level is invalid
+        ValueError: If quality level or method is invalid
         FileNotFoundError: If input PDF doesn't exist
     """
     if not os.path.exists(input_pdf_path):
         raise FileNotFoundError(f"Input PDF not found: {input_pdf_path}")
     
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"Invalid method: {method}. Must be 'rasterize', 'images' or 'lossless'")
+    
     original_size = os.path.getsize(input_pdf_path)
     
     # Determine target size
@@ -64,10 +170,45 @@ def compress_pdf(
     elif max_file_size_mb:
         target_size = max_file_size_mb * 1024 * 1024
     
+    if method == 'lossless':
+        if target_size:
+            raise ValueError("The lossless method does not take a target size")
+        result = optimize_lossless(input_pdf_path, output_pdf_path, strip_metadata, progress_callback)
+        compressed_size = os.path.getsize(output_pdf_path)
+        return {
+            'success': True,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'reduction_percent': round((original_size - compressed_size) / original_size * 100, 1) if original_size else 0,
+            'quality': 'lossless',
+            'total_pages': result['total_pages'],
+            'structure': result['structure']
+        }
+    
+    # Chained: images are recompressed from the losslessly optimised file
+    source_path = input_pdf_path
+    structure = None
+    if optimize and method == 'images':
+        source_path = output_pdf_path + ".lossless"
+        structure = optimize_lossless(input_pdf_path, source_path, strip_metadata)['structure']
+    
+    try:
+        result = _compress(source_path, output_pdf_path, method, quality, target_size, original_size, progress_callback)
+    finally:
+        if source_path != input_pdf_path and os.path.exists(source_path):
+            os.remove(source_path)
+    
+    if structure is not None:
+        result['structure'] = structure
+    return result
+
+
+def _compress(source_path, output_pdf_path, method, quality, target_size, original_size, progress_callback):
     # If target-based, use iterative compression
     if target_size:
-        return _compress_to_target(
-            input_pdf_path, 
+        compress_to_target = _recompress_images_to_target if method == 'images' else _compress_to_target
+        return compress_to_target(
+            source_path, 
             output_pdf_path, 
             target_size,
             original_size,
@@ -80,15 +221,16 @@ def compress_pdf(
     
     settings = QUALITY_SETTINGS[quality]
     
+    compress = _recompress_images if method == 'images' else _compress_with_settings
+    
     try:
-        result = _compress_with_settings(
-            input_pdf_path,
+        result = compress(
+            source_path,
             output_pdf_path,
             settings,
             progress_callback
         )
         
-        original_size = os.path.getsize(input_pdf_path)
         compressed_size = os.path.getsize(output_pdf_path)
         
         if original_size > 0:
@@ -102,178 +244,749 @@ def compress_pdf(
             'compressed_size': compressed_size,
             'reduction_percent': round(reduction_percent, 1),
             'quality': quality,
-            'total_pages': result['total_pages']
+            'total_pages': result['total_pages'],
+            **{key: result[key] for key in ('images', 'page_classes') if key in result}
         }
         
     except Exception as e:
         raise Exception(f"Compression failed: {str(e)}")
 
 
-def _compress_with_settings(input_path, output_path, settings, progress_callback=None):
-    """Compress PDF with given quality settings."""
-    from PIL import Image
-    import io
+def encode_page_image(img, image_quality: int) -> bytes:
+    """JPEG-encode a rendered page (PIL image) for insertion into the output PDF."""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
     
+    return _encode_jpeg(img, image_quality)
+
+
+def _encode_jpeg(img, image_quality: int) -> bytes:
+    """JPEG data of an RGB or L image."""
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=image_quality, optimize=True)
+    return output.getvalue()
+
+
+def _flat_midtones(gray: np.ndarray) -> float:
+    """Fraction of pixels that are midtones away from any edge."""
+    height, width = gray.shape
+    padded = np.pad(gray, 1, mode='edge')
+    low, high = gray.copy(), gray.copy()
+    for dy in range(3):
+        for dx in range(3):
+            neighbour = padded[dy:dy + height, dx:dx + width]
+            np.minimum(low, neighbour, out=low)
+            np.maximum(high, neighbour, out=high)
+    midtones = (gray > MIDTONES[0]) & (gray < MIDTONES[1])
+    return float(np.mean(midtones & (high - low < EDGE_CONTRAST)))
+
+
+def classify_page(page, img: Optional[Image.Image] = None, dpi: int = CLASSIFY_DPI) -> str:
+    """
+    The content class of a page (see PAGE_CLASSES), from whether it shows
+    any images and its RGB render `img` at `dpi` (rendered at CLASSIFY_DPI
+    if not given).
+    """
+    if img is None:
+        img = raster_cache.page_image(page, CLASSIFY_DPI, None)
+    elif dpi >= 2 * CLASSIFY_DPI:
+        img = img.reduce(round(dpi / CLASSIFY_DPI))
+    rgb = np.asarray(img)
+    has_images = bool(page.get_image_info())
+
+    # Per-channel arrays: reducing over the interleaved axis is much slower
+    r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    spread = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+    if np.mean(spread > COLOUR_SPREAD) > COLOUR_PIXELS:
+        return 'colour' if has_images else 'vector'
+
+    gray = ((r.astype(np.uint16) * 77 + g.astype(np.uint16) * 150 + b.astype(np.uint16) * 29) >> 8).astype(np.uint8)
+    if gray.min() >= MIDTONES[1]:
+        return 'blank'
+    if CCITT_AVAILABLE and _flat_midtones(gray) <= BITONAL_MAX_FLAT:
+        return 'bitonal'
+    return 'grayscale' if has_images else 'vector'
+
+
+class _PageImage(NamedTuple):
+    """An encoded page: image stream data and what its XObject needs to decode it."""
+    data: bytes
+    width: int
+    height: int
+    colorspace: str  # 'DeviceGray' or 'DeviceRGB'
+    filter: str  # 'DCTDecode' or 'CCITTFaxDecode'
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class _CopiedPage(NamedTuple):
+    """A vector page copied from the input; size is its bytes saved as a document of its own."""
+    size: int
+
+
+# What encode_page gives for a page: None for a blank one
+_EncodedPage = Union[_PageImage, _CopiedPage, None]
+
+
+def _class_render(page_class: str, dpi: int) -> Tuple[int, str]:
+    """(dpi, raster_cache colorspace) a page of this class is rendered at."""
+    if page_class == 'bitonal':
+        return max(dpi, BITONAL_MIN_DPI), 'gray'
+    return dpi, 'gray' if page_class == 'grayscale' else 'rgb'
+
+
+def _encode_ccitt(img) -> bytes:
+    """CCITT G4 data of a grayscale image thresholded to 1 bit."""
+    bitonal = img.point(lambda v: 255 if v >= BITONAL_THRESHOLD else 0, '1')
+    output = io.BytesIO()
+    # One strip, so the TIFF's only strip is the whole G4 stream
+    bitonal.save(output, format='TIFF', compression='group4', tiffinfo={TiffImagePlugin.ROWSPERSTRIP: bitonal.height})
+    tiff = Image.open(output)
+    (offset,), (length,) = tiff.tag_v2[TiffImagePlugin.STRIPOFFSETS], tiff.tag_v2[TiffImagePlugin.STRIPBYTECOUNTS]
+    return output.getvalue()[offset:offset + length]
+
+
+def _encode_class(img, page_class: str, image_quality: int) -> _PageImage:
+    """Encode a page rendered as _class_render says with its class's codec (not for vector pages)."""
+    if page_class == 'bitonal':
+        data, filter_name = _encode_ccitt(img), 'CCITTFaxDecode'
+    else:
+        data, filter_name = _encode_jpeg(img, image_quality), 'DCTDecode'
+    colorspace = 'DeviceGray' if img.mode == 'L' else 'DeviceRGB'
+    return _PageImage(data, img.width, img.height, colorspace, filter_name)
+
+
+def _copy_page(page) -> _CopiedPage:
+    """A vector page to copy into the output as it is."""
+    single = fitz.open()
+    try:
+        single.insert_pdf(page.parent, from_page=page.number, to_page=page.number)
+        size = len(single.tobytes(**LOSSLESS_SAVE_OPTIONS))
+    finally:
+        single.close()
+    return _CopiedPage(max(0, size - DOCUMENT_OVERHEAD_BYTES))
+
+
+def encode_page(
+    page,
+    page_class: str,
+    dpi: int,
+    image_quality: int,
+    doc_key: Optional[str],
+    img: Optional[Image.Image] = None
+) -> _EncodedPage:
+    """
+    A page encoded for its class at dpi/image_quality; None for a blank
+    page and a _CopiedPage for a vector one. img, the page's RGB render at
+    dpi, is used instead of rendering again where the class allows.
+    """
+    if page_class == 'blank':
+        return None
+    if page_class == 'vector':
+        return _copy_page(page)
+
+    render_dpi, colorspace = _class_render(page_class, dpi)
+    if img is None or render_dpi != dpi:
+        img = raster_cache.page_image(page, render_dpi, doc_key, colorspace)
+    elif colorspace == 'gray':
+        img = img.convert('L')
+    return _encode_class(img, page_class, image_quality)
+
+
+def _images_size(page_images: Iterable[_EncodedPage]) -> int:
+    return sum(image.size for image in page_images if image)
+
+
+def _sample_pages(total_pages: int, count: int = ESTIMATE_SAMPLE_PAGES) -> List[int]:
+    """Indices of up to `count` pages spread evenly from the first to the last."""
+    if total_pages <= count:
+        return list(range(total_pages))
+    return sorted({round(i * (total_pages - 1) / (count - 1)) for i in range(count)})
+
+
+def _extrapolate(sizes: List[float], total_pages: int) -> Tuple[float, float, float]:
+    """
+    (estimate, low, high) of the sum over all pages from per-page sizes of
+    the sampled ones: the sample mean times the page count, with a 95%
+    interval from the sample's spread.
+    """
+    estimate = statistics.mean(sizes) * total_pages
+    if len(sizes) < 2:
+        return estimate, estimate, estimate
+
+    t = T_95.get(len(sizes) - 1, 1.96)
+    margin = t * statistics.stdev(sizes) / math.sqrt(len(sizes)) * total_pages
+    return estimate, max(0.0, estimate - margin), estimate + margin
+
+
+def _band_size(page, page_class: str, dpi: int, quality: int, position: float) -> float:
+    """
+    Bytes of the whole page encoded for its class at dpi/quality, estimated
+    from a band ESTIMATE_BAND of its height starting `position` (0 top,
+    1 bottom) of the way down the rest of the page.
+    """
+    if page_class == 'blank':
+        return 0.0
+    if page_class == 'vector':
+        return float(_copy_page(page).size)
+
+    render_dpi, colorspace = _class_render(page_class, dpi)
+    rect = page.rect
+    top = rect.y0 + position * (1 - ESTIMATE_BAND) * rect.height
+    clip = fitz.Rect(rect.x0, top, rect.x1, top + ESTIMATE_BAND * rect.height)
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(render_dpi / 72, render_dpi / 72), clip=clip, colorspace=COLORSPACES[colorspace]
+    )
+    return _encode_class(pixmap_to_image(pix), page_class, quality).size / ESTIMATE_BAND
+
+
+def _estimate_page_images(
+    doc,
+    sample: List[int],
+    page_classes: Dict[int, str],
+    dpi: int,
+    quality: int
+) -> Tuple[float, float, float]:
+    """
+    Estimated total image bytes of every page at dpi/quality, with 95%
+    bounds. Each sampled page (classified in page_classes) contributes one
+    band; successive samples take their band further down the page, so
+    together they cover headers, bodies and footers. A one-page document
+    is encoded whole.
+    """
+    if len(doc) == 1:
+        size = _images_size([encode_page(doc[0], page_classes[0], dpi, quality, None)])
+        return size, size, size
+
+    sizes = [
+        _band_size(doc[page_num], page_classes[page_num], dpi, quality, index / (len(sample) - 1))
+        for index, page_num in enumerate(sample)
+    ]
+    return _extrapolate(sizes, len(doc))
+
+
+def estimate_compression(input_path: str, sample_pages: int = ESTIMATE_SAMPLE_PAGES) -> dict:
+    """
+    Estimate the output size of each quality preset without compressing.
+
+    Classifies a few evenly spread pages, renders and encodes a band of
+    each per preset (as _compress_with_settings would encode the page;
+    vector pages are measured as copied) and extrapolates to the whole document with 95% bounds. Identical pages,
+    which the output stores once, are counted every time, so repetitive
+    documents come out smaller than estimated.
+    """
+    started = time.perf_counter()
+    original_size = os.path.getsize(input_path)
     doc = fitz.open(input_path)
-    total_pages = len(doc)
+    try:
+        total_pages = len(doc)
+        sample = _sample_pages(total_pages, sample_pages)
+        page_classes = {page_num: classify_page(doc[page_num]) for page_num in sample}
+        overhead = DOCUMENT_OVERHEAD_BYTES + total_pages * PAGE_OVERHEAD_BYTES
+
+        presets = {}
+        for name, settings in QUALITY_SETTINGS.items():
+            estimate, low, high = _estimate_page_images(
+                doc, sample, page_classes, settings['dpi'], settings['image_quality']
+            )
+            presets[name] = {
+                'estimated_size': round(estimate + overhead),
+                'low': round(low + overhead),
+                'high': round(high + overhead),
+                'reduction_percent': round((original_size - estimate - overhead) / original_size * 100, 1) if original_size else 0
+            }
+    finally:
+        doc.close()
+
+    return {
+        'original_size': original_size,
+        'total_pages': total_pages,
+        'sampled_pages': len(sample),
+        'presets': presets,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000)
+    }
+
+
+def _add_page_image(doc, image: _PageImage) -> int:
+    """Add an image XObject holding the encoded data as it is; returns its xref."""
+    xref = doc.get_new_xref()
+    bits = 1 if image.filter == 'CCITTFaxDecode' else 8
+    doc.update_object(
+        xref,
+        f"<</Type/XObject/Subtype/Image/Width {image.width}/Height {image.height}"
+        f"/ColorSpace/{image.colorspace}/BitsPerComponent {bits}>>"
+    )
+    # Stored raw: the filter keys are set after update_stream, which would drop them
+    doc.update_stream(xref, image.data, compress=False)
+    doc.xref_set_key(xref, 'Filter', f'/{image.filter}')
+    if image.filter == 'CCITTFaxDecode':
+        # Pillow writes 1-bit TIFFs min-is-black, which PDF reads as BlackIs1
+        doc.xref_set_key(xref, 'DecodeParms', f'<</K -1/Columns {image.width}/Rows {image.height}/BlackIs1 true>>')
+    return xref
+
+
+def _save_pages(doc, page_images: Iterable[_EncodedPage], output_path: str):
+    """
+    Write a PDF with one image per page of `doc`, each filling its page
+    (None leaves the page empty, a _CopiedPage copies the page from `doc`).
+    Identical images are stored once.
+    """
     out_doc = fitz.open()
-    
-    for page_num in range(total_pages):
-        page = doc[page_num]
-        
-        # Get page dimensions
-        rect = page.rect
-        
-        # Render page as image with quality-based DPI
-        dpi = settings['dpi']
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image for JPEG compression
-        img_data = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_data))
-        
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Compress as JPEG
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=settings['image_quality'], optimize=True)
-        output.seek(0)
-        jpeg_data = output.read()
-        
+    xrefs = {}
+
+    # Drive page_images to the end (not zip() against doc): a generator's
+    # code after its last yield, such as the final progress callback that
+    # checks for cancellation, only runs once it is asked for another item
+    for page_num, image in enumerate(page_images):
+        if isinstance(image, _CopiedPage):
+            out_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+            continue
+
         # Create new PDF page with proper dimensions and insert compressed image
+        rect = doc[page_num].rect
         new_page = out_doc.new_page(width=rect.width, height=rect.height)
-        new_page.insert_image(rect, stream=jpeg_data)
-        
-        if progress_callback:
-            progress_callback(page_num + 1, total_pages)
-    
+        if image is None:
+            continue
+
+        digest = hashlib.sha256(image.data).digest()
+        if digest not in xrefs:
+            xrefs[digest] = _add_page_image(out_doc, image)
+        new_page.insert_image(rect, xref=xrefs[digest])
+
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
+
     out_doc.save(output_path, garbage=3, deflate=True, clean=True)
     out_doc.close()
-    doc.close()
-    
-    return {'total_pages': total_pages}
+
+
+def _compress_with_settings(input_path, output_path, settings, progress_callback=None):
+    """Compress PDF with given quality settings, each page encoded for its content class."""
+    doc = fitz.open(input_path)
+    doc_key = raster_cache.document_key(input_path)
+    total_pages = len(doc)
+    page_classes = dict.fromkeys(PAGE_CLASSES, 0)
+
+    def page_images():
+        for page_num in range(total_pages):
+            # Render page as image with quality-based DPI, classify it and
+            # encode it for its class (bitonal pages may be rendered again)
+            page = doc[page_num]
+            img = raster_cache.page_image(page, settings['dpi'], doc_key)
+            page_class = classify_page(page, img, settings['dpi'])
+            page_classes[page_class] += 1
+            yield encode_page(page, page_class, settings['dpi'], settings['image_quality'], doc_key, img)
+
+            if progress_callback:
+                progress_callback(page_num + 1, total_pages)
+
+    try:
+        _save_pages(doc, page_images(), output_path)
+    finally:
+        doc.close()
+
+    return {'total_pages': total_pages, 'page_classes': page_classes}
+
+
+class _PageRasters:
+    """
+    The pages of a document rendered at one DPI, for encoding several times.
+    Pages stay in memory while they fit in memory_bytes; the others are
+    read back from the raster cache (or rendered again if it is disabled).
+    Only JPEG pages (grayscale and colour) depend on the quality: the
+    other classes are encoded once and kept encoded instead.
+    """
+
+    def __init__(self, doc, doc_key: str, dpi: int, memory_bytes: int, page_classes: List[str]):
+        self.doc = doc
+        self.doc_key = doc_key
+        self.dpi = dpi
+        self.memory_bytes = memory_bytes
+        self.page_classes = page_classes
+        self._held: Dict[int, Image.Image] = {}
+        self._held_bytes = 0
+        self._encoded: Dict[int, _EncodedPage] = {}
+
+    def get(self, page_num: int) -> Image.Image:
+        img = self._held.get(page_num)
+        if img is not None:
+            return img
+
+        render_dpi, colorspace = _class_render(self.page_classes[page_num], self.dpi)
+        img = raster_cache.page_image(self.doc[page_num], render_dpi, self.doc_key, colorspace)
+        size = img.width * img.height * len(img.getbands())
+        if self._held_bytes + size <= self.memory_bytes:
+            self._held[page_num] = img
+            self._held_bytes += size
+        return img
+
+    def encode(self, page_num: int, quality: int) -> _EncodedPage:
+        page_class = self.page_classes[page_num]
+        if page_class in ('grayscale', 'colour'):
+            return _encode_class(self.get(page_num), page_class, quality)
+
+        if page_num not in self._encoded:
+            self._encoded[page_num] = encode_page(self.doc[page_num], page_class, self.dpi, quality, self.doc_key)
+        return self._encoded[page_num]
+
+
+def _encode_pass(
+    rasters: _PageRasters,
+    quality: int,
+    budget: Optional[int] = None,
+    progress_callback=None
+) -> Optional[List[_EncodedPage]]:
+    """
+    Every page encoded at `quality`, or None as soon as the pages
+    encoded so far add up to more than `budget` bytes.
+    """
+    total_pages = len(rasters.doc)
+    page_images = []
+    size = 0
+    for page_num in range(total_pages):
+        image = rasters.encode(page_num, quality)
+        page_images.append(image)
+        size += _images_size([image])
+        if budget is not None and size > budget:
+            return None
+        if progress_callback:
+            progress_callback(page_num + 1, total_pages)
+    return page_images
 
 
 def _compress_to_target(input_path, output_path, target_size, original_size, progress_callback=None):
-    """Iteratively compress PDF to reach target file size using smart search."""
-    import tempfile
-    from PIL import Image
-    import io
-    
-    # Get total pages from source document
-    source_doc = fitz.open(input_path)
-    total_pages = len(source_doc)
-    source_doc.close()
-    
-    # Use a smarter approach - try combinations from low to high quality
-    # Goal: Find the HIGHEST quality that still meets the target
-    # More granular levels for better accuracy
-    attempts = [
-        {'dpi': 72, 'quality': 30},   # Lowest
-        {'dpi': 72, 'quality': 40},   
-        {'dpi': 72, 'quality': 50},   
-        {'dpi': 72, 'quality': 60},   
-        {'dpi': 100, 'quality': 45},  
-        {'dpi': 100, 'quality': 55},  
-        {'dpi': 100, 'quality': 65},  
-        {'dpi': 100, 'quality': 75},  
-        {'dpi': 150, 'quality': 60},  
-        {'dpi': 150, 'quality': 70},  
-        {'dpi': 150, 'quality': 80},  
-        {'dpi': 200, 'quality': 70},  
-        {'dpi': 200, 'quality': 80},  
-        {'dpi': 200, 'quality': 90},  
-        {'dpi': 300, 'quality': 85},  # Highest
-    ]
-    
-    best_under_target = None  # Best quality that's under target
-    closest_over_target = None  # Closest to target but over
-    temp_path = output_path + ".tmp"
-    
-    for attempt in attempts:
-        settings = {'dpi': attempt['dpi'], 'image_quality': attempt['quality']}
-        
-        try:
-            print(f"Trying DPI:{attempt['dpi']}, Q:{attempt['quality']}")
-            _compress_with_settings(input_path, temp_path, settings, progress_callback)
-            compressed_size = os.path.getsize(temp_path)
-            
-            print(f"  Result: {compressed_size / 1024 / 1024:.1f}MB (target: {target_size / 1024 / 1024:.1f}MB)")
-            
-            # Calculate how close we are to target
-            distance_from_target = abs(compressed_size - target_size)
-            
-            # If we're under target, keep it as best option so far
-            if compressed_size <= target_size:
-                if not best_under_target or compressed_size > best_under_target['size']:
-                    # We want the HIGHEST file size that's still under target
-                    # (this means best quality while meeting requirement)
-                    best_under_target = {
-                        'size': compressed_size,
-                        'dpi': attempt['dpi'],
-                        'quality': attempt['quality'],
-                        'distance': distance_from_target
-                    }
-                    print(f"  ✓ New best (under target, {distance_from_target / 1024:.0f}KB from target)")
-            else:
-                # Track closest over target in case we can't get under
-                if not closest_over_target or compressed_size < closest_over_target['size']:
-                    closest_over_target = {
-                        'size': compressed_size,
-                        'dpi': attempt['dpi'],
-                        'quality': attempt['quality'],
-                        'distance': distance_from_target
-                    }
-                    
-        except Exception as e:
-            print(f"Failed with DPI:{attempt['dpi']}, Q:{attempt['quality']}: {e}")
-            continue
-    
-    # Prefer best under target, but if none, use closest over target
-    final_result = best_under_target if best_under_target else closest_over_target
-    
-    if final_result:
-        settings = {'dpi': final_result['dpi'], 'image_quality': final_result['quality']}
-        _compress_with_settings(input_path, output_path, settings, progress_callback)
-        
-        compressed_size = os.path.getsize(output_path)
-        reduction_percent = ((original_size - compressed_size) / original_size) * 100
-        
-        # Calculate target reduction for comparison
-        target_reduction = ((original_size - target_size) / original_size) * 100
-        
-        result = {
-            'success': True,
-            'original_size': original_size,
-            'compressed_size': compressed_size,
-            'reduction_percent': round(reduction_percent, 1),
-            'quality': f'DPI:{final_result["dpi"]}, Q:{final_result["quality"]}',
-            'total_pages': total_pages
-        }
-        
-        # Add warning if we couldn't hit target
-        if compressed_size > target_size:
-            result['warning'] = f'Could not reach target. Best effort: {compressed_size / 1024 / 1024:.1f}MB (target was {target_size / 1024 / 1024:.1f}MB)'
-        
-        return result
-    
-    # Last resort - use lowest settings
-    settings = {'dpi': 72, 'quality': 25}
-    _compress_with_settings(input_path, output_path, settings, progress_callback)
-    
+    """
+    Compress to the best setting whose output fits target_size.
+
+    Pages are classified once (see classify_page). Resolutions are tried
+    from best to smallest (TARGET_RESOLUTIONS), skipping those where even
+    the lower bound of the sampled estimate (see estimate_compression) is
+    over the budget. At each one the pages are rendered once; only
+    encoding is repeated while the JPEG quality is bisected on the summed
+    sizes of the encoded pages, and a probe stops at the first page that
+    takes it over the budget. The first resolution where some quality fits
+    wins, and the output is assembled from the pages already encoded at
+    that quality. If nothing fits, the smallest setting is used and the
+    result carries a warning. result['passes'] counts the encode passes,
+    including abandoned ones.
+    """
+    doc = fitz.open(input_path)
+    try:
+        total_pages = len(doc)
+        doc_key = raster_cache.document_key(input_path)
+        page_budget = target_size - DOCUMENT_OVERHEAD_BYTES - total_pages * PAGE_OVERHEAD_BYTES
+        page_classes = [classify_page(page) for page in doc]
+        sample = _sample_pages(total_pages)
+        sample_classes = {page_num: page_classes[page_num] for page_num in sample}
+        passes = 0
+
+        for dpi, min_quality, max_quality in TARGET_RESOLUTIONS:
+            qualities = list(range(min_quality, max_quality, TARGET_QUALITY_STEP)) + [max_quality]
+            smallest = dpi == TARGET_RESOLUTIONS[-1][0]
+
+            # Skip resolutions the sampled pages say cannot fit even at the lowest quality
+            if not smallest and len(sample) < total_pages:
+                _, low, _ = _estimate_page_images(doc, sample, sample_classes, dpi, min_quality)
+                if low > page_budget:
+                    logger.info(f"DPI:{dpi}, Q:{min_quality} estimated at least {low / 1024 / 1024:.1f}MB of page images: skipped")
+                    continue
+
+            rasters = _PageRasters(doc, doc_key, dpi, TARGET_RASTER_MEMORY_BYTES, page_classes)
+
+            # Lowest quality first: if even that is too big, move to the next
+            # resolution. The smallest setting is encoded in full as the fallback
+            quality = qualities[0]
+            page_images = _encode_pass(rasters, quality, None if smallest else page_budget, progress_callback)
+            passes += 1
+            if page_images is None or _images_size(page_images) > page_budget:
+                logger.info(f"DPI:{dpi}, Q:{quality} does not fit {page_budget / 1024 / 1024:.1f}MB of page images")
+                continue
+
+            # Bisect for the highest quality that still fits; qualities[low] always does
+            low, high = 0, len(qualities) - 1
+            while low < high:
+                mid = (low + high + 1) // 2
+                candidate = _encode_pass(rasters, qualities[mid], page_budget, progress_callback)
+                passes += 1
+                if candidate is not None:
+                    low, quality, page_images = mid, qualities[mid], candidate
+                else:
+                    high = mid - 1
+            logger.info(f"DPI:{dpi}, Q:{quality} fits {page_budget / 1024 / 1024:.1f}MB of page images")
+            break
+
+        # Nothing fitted: page_images holds the smallest setting tried
+        _save_pages(doc, page_images, output_path)
+    finally:
+        doc.close()
+
     compressed_size = os.path.getsize(output_path)
     reduction_percent = ((original_size - compressed_size) / original_size) * 100
-    
-    return {
+
+    result = {
         'success': True,
         'original_size': original_size,
         'compressed_size': compressed_size,
         'reduction_percent': round(reduction_percent, 1),
-        'quality': 'DPI:72, Q:25',
+        'quality': f'DPI:{dpi}, Q:{quality}',
         'total_pages': total_pages,
-        'warning': f'Used minimum quality. Result: {compressed_size / 1024 / 1024:.1f}MB'
+        'page_classes': {name: page_classes.count(name) for name in PAGE_CLASSES},
+        'passes': passes
     }
+
+    # Add warning if we couldn't hit target
+    if compressed_size > target_size:
+        result['warning'] = f'Could not reach target. Best effort: {compressed_size / 1024 / 1024:.1f}MB (target was {target_size / 1024 / 1024:.1f}MB)'
+
+    return result
+
+
+def _effective_dpi(info: dict) -> float:
+    """Resolution an image placement is shown at (lower of its two axes)."""
+    a, b, c, d = info['transform'][:4]
+    width_in = math.hypot(a, b) / 72
+    height_in = math.hypot(c, d) / 72
+    if not width_in or not height_in:
+        return 0
+    return min(info['width'] / width_in, info['height'] / height_in)
+
+
+def _recompress_image(doc, xref: int, effective_dpi: float, settings: dict) -> Optional[Tuple[bytes, dict]]:
+    """
+    (JPEG data, image dictionary keys) for an image shown above the preset's
+    resolution, downsampled to it; None to leave the image as it is.
+    """
+    if effective_dpi <= settings['dpi'] * DOWNSAMPLE_THRESHOLD:
+        return None
+
+    # Stencil masks, colour-key masks and 1-bit images do not survive JPEG
+    if doc.xref_get_key(xref, "ImageMask")[1] == "true" or doc.xref_get_key(xref, "Mask")[0] != "null":
+        return None
+    if doc.xref_get_key(xref, "BitsPerComponent")[1] == "1":
+        return None
+
+    try:
+        pix = fitz.Pixmap(doc, xref)
+    except Exception:
+        return None  # Image type MuPDF cannot decode: keep it
+
+    # An ICC colourspace still describes the decoded samples; anything else
+    # (Indexed, CMYK, Separation...) is written as DeviceRGB/DeviceGray
+    kind, colorspace = doc.xref_get_key(xref, "ColorSpace")
+    if kind == "xref":
+        colorspace = doc.xref_object(int(colorspace.split()[0]), compressed=True)
+    keep_colorspace = colorspace.lstrip("[ ").startswith("/ICCBased")
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+        keep_colorspace = False
+
+    img = pixmap_to_image(pix)
+    scale = settings['dpi'] / effective_dpi
+    img = img.resize(
+        (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+        Image.Resampling.LANCZOS
+    )
+    jpeg_data = _encode_jpeg(img, settings['image_quality'])
+
+    keys = {
+        'Filter': '/DCTDecode',
+        'Width': str(img.width),
+        'Height': str(img.height),
+        'BitsPerComponent': '8',
+    }
+    for key in ('DecodeParms', 'Decode'):
+        if doc.xref_get_key(xref, key)[0] != "null":
+            keys[key] = 'null'  # Removes the key
+    if not keep_colorspace:
+        keys['ColorSpace'] = '/DeviceGray' if img.mode == 'L' else '/DeviceRGB'
+    return jpeg_data, keys
+
+
+def _recompress_images(input_path, output_path, settings, progress_callback=None):
+    """
+    Compress PDF by recompressing its embedded images only.
+
+    Text, vector graphics and fonts are kept as they are. Each image
+    XObject is checked against the largest size it is shown at on any
+    page; one shown above the preset's DPI (times DOWNSAMPLE_THRESHOLD) is
+    downsampled to it and JPEG-encoded, and replaced if that is smaller.
+    Images with identical pixels are encoded once, and the save merges the
+    identical objects this leaves (garbage=4), e.g. a logo repeated by a merge.
+    The output is saved with LOSSLESS_SAVE_OPTIONS.
+    """
+    doc = fitz.open(input_path)
+    try:
+        total_pages = len(doc)
+
+        # Lowest effective resolution of each image over all its placements,
+        # and the digest of its decoded pixels (MuPDF's) with its colourspace:
+        # copies from merged files are separate objects with the same digest
+        resolutions: Dict[int, float] = {}
+        digests: Dict[int, Tuple[bytes, str]] = {}
+        page_images: List[List[int]] = []
+        for page in doc:
+            xrefs = []
+            for info in page.get_image_info(xrefs=True):
+                xref = info['xref']
+                if not xref:
+                    continue  # Inline image
+                dpi = _effective_dpi(info)
+                resolutions[xref] = min(resolutions.get(xref, dpi), dpi)
+                digests[xref] = (info['digest'], info['cs-name'])
+                xrefs.append(xref)
+            page_images.append(xrefs)
+
+        groups: Dict[Tuple[bytes, str], List[int]] = {}
+        for xref, digest in digests.items():
+            groups.setdefault(digest, []).append(xref)
+
+        stats = {
+            'images': len(resolutions),
+            'duplicates': len(resolutions) - len(groups),
+            'recompressed': 0,
+            'bytes_before': 0,
+            'bytes_after': 0,
+        }
+
+        done = set()
+        for page_num, xrefs in enumerate(page_images):
+            for xref in xrefs:
+                digest = digests[xref]
+                if digest in done:
+                    continue
+                done.add(digest)
+                group = groups[digest]
+
+                original_size = len(doc.xref_stream_raw(group[0]))
+                recompressed = _recompress_image(doc, group[0], min(resolutions[x] for x in group), settings)
+                if recompressed is not None and len(recompressed[0]) >= original_size:
+                    recompressed = None  # Already smaller than the JPEG would be
+
+                stats['bytes_before'] += original_size * len(group)
+                if recompressed is None:
+                    stats['bytes_after'] += original_size * len(group)
+                    continue
+
+                jpeg_data, keys = recompressed
+                for xref in group:
+                    doc.update_stream(xref, jpeg_data, compress=False)
+                    for key, value in keys.items():
+                        doc.xref_set_key(xref, key, value)
+                stats['recompressed'] += len(group)
+                stats['bytes_after'] += len(jpeg_data) * len(group)
+
+            if progress_callback:
+                progress_callback(page_num + 1, total_pages)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        doc.save(output_path, **LOSSLESS_SAVE_OPTIONS)
+    finally:
+        doc.close()
+
+    return {'total_pages': total_pages, 'images': stats}
+
+
+def _recompress_images_to_target(input_path, output_path, target_size, original_size, progress_callback=None):
+    """
+    Recompress images with the best setting whose output fits target_size.
+
+    Each resolution of TARGET_RESOLUTIONS is tried at its highest, then
+    lowest quality, best first. A pass only touches images, so this is
+    cheap next to rendering; text and vector content cannot shrink, so
+    the smallest result is kept with a warning if nothing fits.
+    """
+    temp_path = output_path + ".tmp"
+    best = None
+
+    for dpi, quality in [(dpi, q) for dpi, low, high in TARGET_RESOLUTIONS for q in (high, low)]:
+        result = _recompress_images(input_path, temp_path, {'dpi': dpi, 'image_quality': quality}, progress_callback)
+        compressed_size = os.path.getsize(temp_path)
+        logger.info(f"Images at DPI:{dpi}, Q:{quality} -> {compressed_size / 1024 / 1024:.1f}MB")
+
+        # Settings go from best to smallest, so the first that fits is the one
+        if best is None or compressed_size < best[0]:
+            os.replace(temp_path, output_path)
+            best = (compressed_size, dpi, quality, result)
+        if compressed_size <= target_size:
+            break
+
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    compressed_size, dpi, quality, result = best
+    reduction_percent = ((original_size - compressed_size) / original_size) * 100
+
+    final = {
+        'success': True,
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'reduction_percent': round(reduction_percent, 1),
+        'quality': f'DPI:{dpi}, Q:{quality}',
+        'total_pages': result['total_pages'],
+        'images': result['images']
+    }
+
+    if compressed_size > target_size:
+        final['warning'] = f'Could not reach target. Best effort: {compressed_size / 1024 / 1024:.1f}MB (target was {target_size / 1024 / 1024:.1f}MB)'
+
+    return final
+
+
+def optimize_lossless(input_path, output_path, strip_metadata=False, progress_callback=None):
+    """
+    Shrink a PDF without touching any content: nothing is rendered or
+    re-encoded lossily. Steps, each measured with an in-memory save so the
+    result reports the bytes it saved ('structure'):
+
+        unused_objects  rewrite without unused objects and old revisions
+        duplicates      merge identical objects and streams (garbage=4)
+        streams         deflate uncompressed content, image and font streams
+        fonts           subset embedded fonts to the glyphs used
+        metadata        remove document info and XMP (strip_metadata only)
+        object_streams  pack objects into compressed object streams
+
+    Steps apply in this order, so each number is what that step saved on
+    top of the ones before it (a step can cost a few bytes).
+    """
+    doc = fitz.open(input_path)
+    try:
+        total_pages = len(doc)
+        size = os.path.getsize(input_path)
+        structure = {}
+
+        def measure(step, **options):
+            nonlocal size
+            new_size = len(doc.tobytes(**options))
+            structure[step] = size - new_size
+            size = new_size
+
+        measure('unused_objects', garbage=1)
+        measure('duplicates', garbage=4)
+        deflated = {key: LOSSLESS_SAVE_OPTIONS[key] for key in ('garbage', 'deflate', 'deflate_images', 'deflate_fonts')}
+        measure('streams', **deflated)
+
+        try:
+            doc.subset_fonts()
+        except Exception as e:
+            logger.warning(f"Font subsetting skipped: {e}")
+        measure('fonts', **deflated)
+
+        if strip_metadata:
+            doc.set_metadata({})
+            doc.del_xml_metadata()
+            measure('metadata', **deflated)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        doc.save(output_path, **LOSSLESS_SAVE_OPTIONS)
+        structure['object_streams'] = size - os.path.getsize(output_path)
+    finally:
+        doc.close()
+
+    if progress_callback:
+        progress_callback(total_pages, total_pages)
+
+    return {'total_pages': total_pages, 'structure': structure}
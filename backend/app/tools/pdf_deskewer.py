@@ -4,12 +4,15 @@ PDF Deskew Tool - Automatically correct skewed/tilted scanned documents
 import fitz  # PyMuPDF
 from PIL import Image
 import cv2
+import io
 import numpy as np
 import os
-from typing import Callable, Optional
+from typing import Callable, Optional, Tuple
 from skimage.transform import rotate
 from skimage.color import rgb2gray
 
+from app.services.raster_cache import raster_cache
+
 
 def detect_skew_angle(image_array: np.ndarray) -> float:
     """
@@ -61,6 +64,19 @@ def deskew_image(image: Image.Image) -> Image.Image:
     Returns:
         Deskewed PIL Image
     """
+    return deskew_image_with_angle(image)[0]
+
+
+def deskew_image_with_angle(image: Image.Image) -> Tuple[Image.Image, float]:
+    """
+    Deskew a PIL Image and report the angle that was corrected.
+    
+    Args:
+        image: PIL Image
+    
+    Returns:
+        (deskewed PIL Image, detected skew angle in degrees)
+    """
     # Convert PIL Image to numpy array
     img_array = np.array(image)
     
@@ -69,7 +85,7 @@ def deskew_image(image: Image.Image) -> Image.Image:
     
     # If angle is very small, skip rotation
     if abs(angle) < 0.1:
-        return image
+        return image, angle
     
     # Rotate to correct skew
     # Note: rotate from skimage handles RGB images properly
@@ -77,7 +93,7 @@ def deskew_image(image: Image.Image) -> Image.Image:
     
     # Convert back to PIL Image
     rotated = rotated.astype(np.uint8)
-    return Image.fromarray(rotated)
+    return Image.fromarray(rotated), angle
 
 
 def deskew_pdf(
@@ -101,6 +117,7 @@ def deskew_pdf(
     
     try:
         doc = fitz.open(input_pdf_path)
+        doc_key = raster_cache.document_key(input_pdf_path)
         total_pages = len(doc)
         
         # Create output PDF
@@ -112,24 +129,14 @@ def deskew_pdf(
             page = doc[page_num]
             
             # Render page at high resolution for better skew detection
-            mat = fitz.Matrix(300 / 72, 300 / 72)  # 300 DPI
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            
-            # Deskew the image
-            deskewed_img = deskew_image(img)
+            img = raster_cache.page_image(page, 300, doc_key)  # 300 DPI
             
-            # Get angle that was corrected (for reporting)
-            img_array = np.array(img)
-            angle = detect_skew_angle(img_array)
+            # Deskew the image, keeping the corrected angle for reporting
+            deskewed_img, angle = deskew_image_with_angle(img)
             angles_detected.append(angle)
             
             # Convert back to PDF
             # Save deskewed image to bytes
-            import io
             img_bytes = io.BytesIO()
             deskewed_img.save(img_bytes, format='PNG')
             img_bytes.seek(0)
@@ -4,12 +4,13 @@ PDF OCR Tool - Extract text from scanned PDFs using Tesseract OCR
 import fitz  # PyMuPDF
 from PIL import Image, ImageEnhance
 import pytesseract
-import io
 import os
 import numpy as np
 from typing import Callable, Optional, List, Dict
 import json
 
+from app.services.raster_cache import raster_cache
+
 
 # Supported languages
 SUPPORTED_LANGUAGES = {
@@ -51,6 +52,7 @@ def extract_text_from_pdf(
     
     try:
         doc = fitz.open(input_pdf_path)
+        doc_key = raster_cache.document_key(input_pdf_path)
         total_pages = len(doc)
         
         results = {
@@ -66,133 +68,154 @@ def extract_text_from_pdf(
             native_text = page.get_text().strip()
             
             # Get page as image for OCR with HIGHER DPI for better accuracy
-            mat = fitz.Matrix(400 / 72, 400 / 72)  # 400 DPI for better detail
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            
-            # Enhanced preprocessing for better OCR
-            # Convert to grayscale
-            if img.mode != 'L':
-                img = img.convert('L')
-            
-            # Enhance contrast for better text recognition
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(1.5)  # 1.5x contrast boost
-            
-            # Handle auto language detection
-            # Use ONLY eng+hin for Indian documents (no Arabic)
-            ocr_lang = language
-            if language == 'auto':
-                ocr_lang = 'eng+hin'  # English + Hindi only
-            
-            # Detect columns by analyzing the image
-            # Convert to numpy array for analysis
-            img_array = np.array(img)
-            width = img_array.shape[1]
+            img = raster_cache.page_image(page, 400, doc_key)  # 400 DPI for better detail
             
-            # Check if this is a multi-column layout
-            # Simple heuristic: if width > 2000 pixels, likely 2 columns
-            is_multi_column = width > 2000
+            extracted_text = ocr_image(img, language)
             
-            extracted_text = ""
-            
-            if is_multi_column:
-                # Split into left and right columns
-                mid_point = width // 2
-                
-                # Left column
-                left_img = img.crop((0, 0, mid_point, img.height))
-                
-                # Right column  
-                right_img = img.crop((mid_point, 0, width, img.height))
-                
-                # OCR left column
-                try:
-                    config = r'--oem 3 --psm 6'  # Single block for each column
-                    left_text = pytesseract.image_to_string(left_img, lang=ocr_lang, config=config)
-                except:
-                    left_text = ""
-                
-                # OCR right column
-                try:
-                    config = r'--oem 3 --psm 6'
-                    right_text = pytesseract.image_to_string(right_img, lang=ocr_lang, config=config)
-                except:
-                    right_text = ""
-                
-                # Combine with clear separation
-                extracted_text = "=== LEFT COLUMN ===\n\n" + left_text.strip()
-                extracted_text += "\n\n\n=== RIGHT COLUMN ===\n\n" + right_text.strip()
-                
-            else:
-                # Single column - use best PSM mode
-                best_result = ""
-                
-                # Try PSM 1
-                try:
-                    config = r'--oem 3 --psm 1'
-                    result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
-                    if len(result.strip()) > len(best_result):
-                        best_result = result.strip()
-                except:
-                    pass
-                
-                # Try PSM 3
-                try:
-                    config = r'--oem 3 --psm 3'
-                    result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
-                    if len(result.strip()) > len(best_result):
-                        best_result = result.strip()
-                except:
-                    pass
-                
-                # Try PSM 6
-                try:
-                    config = r'--oem 3 --psm 6'
-                    result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
-                    if len(result.strip()) > len(best_result):
-                        best_result = result.strip()
-                except:
-                    pass
-                
-                extracted_text = best_result
-            
-            # Use OCR text if it has more content or if native text is minimal
-            if len(native_text) < 100 or len(extracted_text) > len(native_text):
-                final_text = extracted_text
-            else:
-                final_text = native_text
-            
-            results['pages'].append({
-                'page_number': page_num + 1,
-                'text': final_text,
-                'has_native_text': len(native_text) > 0,
-                'ocr_confidence': 'high' if final_text else 'none'
-            })
+            results['pages'].append(page_result(page_num + 1, native_text, extracted_text))
             
             if progress_callback:
                 progress_callback(page_num + 1, total_pages)
         
         doc.close()
         
-        # Generate full text
-        full_text = '\n\n'.join([
-            f"=== Page {p['page_number']} ===\n{p['text']}" 
-            for p in results['pages'] if p['text']
-        ])
-        
-        results['full_text'] = full_text
-        results['total_characters'] = len(full_text)
-        
-        return results
+        return finalize_results(results)
         
     except Exception as e:
         raise Exception(f"OCR failed: {str(e)}")
 
 
+def ocr_image(img: Image.Image, language: str = 'eng') -> str:
+    """
+    OCR one rendered page.
+    
+    Args:
+        img: Page image (PIL); extract_text_from_pdf renders at 400 DPI
+        language: Tesseract language code, or 'auto'
+    
+    Returns:
+        Extracted text (both columns, labelled, for two-column layouts)
+    """
+    # Enhanced preprocessing for better OCR
+    # Convert to grayscale
+    if img.mode != 'L':
+        img = img.convert('L')
+    
+    # Enhance contrast for better text recognition
+    enhancer = ImageEnhance.Contrast(img)
+    img = enhancer.enhance(1.5)  # 1.5x contrast boost
+    
+    # Handle auto language detection
+    # Use ONLY eng+hin for Indian documents (no Arabic)
+    ocr_lang = language
+    if language == 'auto':
+        ocr_lang = 'eng+hin'  # English + Hindi only
+    
+    # Detect columns by analyzing the image
+    # Convert to numpy array for analysis
+    img_array = np.array(img)
+    width = img_array.shape[1]
+    
+    # Check if this is a multi-column layout
+    # Simple heuristic: if width > 2000 pixels, likely 2 columns
+    is_multi_column = width > 2000
+    
+    extracted_text = ""
+    
+    if is_multi_column:
+        # Split into left and right columns
+        mid_point = width // 2
+        
+        # Left column
+        left_img = img.crop((0, 0, mid_point, img.height))
+        
+        # Right column  
+        right_img = img.crop((mid_point, 0, width, img.height))
+        
+        # OCR left column
+        try:
+            config = r'--oem 3 --psm 6'  # Single block for each column
+            left_text = pytesseract.image_to_string(left_img, lang=ocr_lang, config=config)
+        except:
+            left_text = ""
+        
+        # OCR right column
+        try:
+            config = r'--oem 3 --psm 6'
+            right_text = pytesseract.image_to_string(right_img, lang=ocr_lang, config=config)
+        except:
+            right_text = ""
+        
+        # Combine with clear separation
+        extracted_text = "=== LEFT COLUMN ===\n\n" + left_text.strip()
+        extracted_text += "\n\n\n=== RIGHT COLUMN ===\n\n" + right_text.strip()
+        
+    else:
+        # Single column - use best PSM mode
+        best_result = ""
+        
+        # Try PSM 1
+        try:
+            config = r'--oem 3 --psm 1'
+            result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
+            if len(result.strip()) > len(best_result):
+                best_result = result.strip()
+        except:
+            pass
+        
+        # Try PSM 3
+        try:
+            config = r'--oem 3 --psm 3'
+            result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
+            if len(result.strip()) > len(best_result):
+                best_result = result.strip()
+        except:
+            pass
+        
+        # Try PSM 6
+        try:
+            config = r'--oem 3 --psm 6'
+            result = pytesseract.image_to_string(img, lang=ocr_lang, config=config)
+            if len(result.strip()) > len(best_result):
+                best_result = result.strip()
+        except:
+            pass
+        
+        extracted_text = best_result
+    
+    return extracted_text
+
+
+def page_result(page_number: int, native_text: str, extracted_text: str) -> Dict:
+    """Per-page entry of the results dict: the better of the native and OCR text."""
+    # Use OCR text if it has more content or if native text is minimal
+    if len(native_text) < 100 or len(extracted_text) > len(native_text):
+        final_text = extracted_text
+    else:
+        final_text = native_text
+    
+    return {
+        'page_number': page_number,
+        'text': final_text,
+        'has_native_text': len(native_text) > 0,
+        'ocr_confidence': 'high' if final_text else 'none'
+    }
+
+
+def finalize_results(results: Dict) -> Dict:
+    """Add full_text and total_characters once every page is in results['pages']."""
+    # Generate full text
+    full_text = '\n\n'.join([
+        f"=== Page {p['page_number']} ===\n{p['text']}" 
+        for p in results['pages'] if p['text']
+    ])
+    
+    results['full_text'] = full_text
+    results['total_characters'] = len(full_text)
+    
+    return results
+
+
 def save_results_as_text(results: Dict, output_path: str):
     """Save OCR results as plain text file."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
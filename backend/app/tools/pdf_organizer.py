@@ -73,47 +73,3 @@ def reorder_pdf_pages(
         "output_path": output_pdf_path
     }
 
-
-def generate_page_thumbnails(
-    pdf_path: str,
-    output_dir: str,
-    thumbnail_width: int = 200,
-    format: str = "png"
-) -> List[str]:
-    """
-    Generate thumbnail images for all pages in a PDF.
-    
-    Args:
-        pdf_path: Path to PDF file
-        output_dir: Directory to save thumbnails
-        thumbnail_width: Width of thumbnails in pixels (height auto-calculated)
-        format: Image format ('png' or 'jpg')
-    
-    Returns:
-        List of thumbnail file paths
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    pdf = fitz.open(pdf_path)
-    thumbnail_paths = []
-    
-    for page_num in range(len(pdf)):
-        page = pdf[page_num]
-        
-        # Calculate zoom to achieve desired width
-        zoom = thumbnail_width / page.rect.width
-        mat = fitz.Matrix(zoom, zoom)
-        
-        # Render page to image
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Save thumbnail
-        filename = f"thumb_{page_num + 1:04d}.{format}"
-        filepath = os.path.join(output_dir, filename)
-        pix.save(filepath)
-        
-        thumbnail_paths.append(filepath)
-    
-    pdf.close()
-    
-    return thumbnail_paths
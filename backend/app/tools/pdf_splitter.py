@@ -4,17 +4,12 @@ PDF Splitter Tool - Extract specific pages from PDF files
 
 import fitz  # PyMuPDF
 from pathlib import Path
-from typing import List, Tuple
-import io
-from PIL import Image
+from typing import List
 
 
 class PDFSplitterTool:
     """Tool for splitting PDFs by extracting specific pages"""
 
-    def __init__(self, max_thumbnail_size: Tuple[int, int] = (200, 280)):
-        self.max_thumbnail_size = max_thumbnail_size
-
     def get_page_count(self, pdf_path: str) -> int:
         """Get total number of pages in PDF"""
         doc = fitz.open(pdf_path)
@@ -66,51 +61,6 @@ class PDFSplitterTool:
             'output_path': output_path
         }
 
-    def generate_thumbnail(self, pdf_path: str, page_num: int, output_path: str) -> dict:
-        """
-        Generate thumbnail for a specific page
-        
-        Args:
-            pdf_path: Path to PDF
-            page_num: 0-indexed page number
-            output_path: Path for thumbnail PNG
-            
-        Returns:
-            dict with thumbnail info
-        """
-        doc = fitz.open(pdf_path)
-        
-        if page_num < 0 or page_num >= doc.page_count:
-            doc.close()
-            raise ValueError(f"Invalid page number: {page_num}")
-
-        page = doc[page_num]
-        
-        # Render at higher resolution for quality
-        zoom = 2.0
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat)
-
-        # Convert to PIL Image
-        img_data = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_data))
-
-        # Resize to thumbnail size
-        img.thumbnail(self.max_thumbnail_size, Image.Resampling.LANCZOS)
-
-        # Save
-        img.save(output_path, "PNG", optimize=True)
-
-        width, height = img.size
-        doc.close()
-
-        return {
-            'page_number': page_num,
-            'width': width,
-            'height': height,
-            'path': output_path
-        }
-
     def parse_page_ranges(self, range_str: str, total_pages: int) -> List[int]:
         """
         Parse page range string into list of 0-indexed page numbers
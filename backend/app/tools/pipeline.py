@@ -0,0 +1,369 @@
+"""
+Pipeline Tool - Run several tools over one document in a single job
+
+Running deskew, then OCR, then compress as separate jobs renders every page
+three times and writes (and re-reads) two intermediate PDFs; crop, resize,
+compress re-encodes the image at each step. A pipeline opens its input once,
+hands the decoded page or image from stage to stage in memory and encodes
+only the final output.
+
+PDF steps:   deskew, ocr, compress
+Image steps: crop, resize, rotate, filters, compress
+`compress` decides how the output is encoded, so it must be the last step.
+"""
+import io
+import os
+from typing import Callable, Dict, List, Optional
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+from pydantic import ValidationError
+
+from app.schemas.image import (
+    ApplyFiltersRequest,
+    CompressRequest,
+    CropRequest,
+    ResizeRequest,
+    TransformRequest,
+)
+from app.services.raster_cache import raster_cache
+from app.tools.image_compressor import ImageCompressorTool
+from app.tools.image_cropper import ImageCropperTool
+from app.tools.image_filters import ImageFiltersTool
+from app.tools.image_resizer import ImageResizerTool
+from app.tools.image_rotate import ImageRotateTool
+from app.tools.pdf_compressor import QUALITY_SETTINGS, encode_page_image
+from app.tools.pdf_deskewer import deskew_image_with_angle
+from app.tools.pdf_ocr import (
+    SUPPORTED_LANGUAGES,
+    finalize_results,
+    ocr_image,
+    page_result,
+    save_results_as_json,
+    save_results_as_text,
+)
+
+
+# Step name -> options it accepts
+PDF_STEPS = {
+    'deskew': set(),
+    'ocr': {'language'},
+    'compress': {'quality'},
+}
+IMAGE_STEPS = {
+    'crop': {'x', 'y', 'width', 'height', 'aspect_ratio', 'center_crop'},
+    'resize': {'width', 'height', 'scale_percent', 'preset', 'maintain_aspect', 'resampling'},
+    'rotate': {'rotation', 'flip_h', 'flip_v'},
+    'filters': {
+        'brightness', 'contrast', 'saturation', 'sharpness', 'blur',
+        'sharpen', 'edge_enhance', 'grayscale', 'sepia'
+    },
+    'compress': {'quality', 'target_size_kb', 'max_width', 'max_height', 'output_format', 'preset'},
+}
+# Image step -> the options model its single-image endpoint takes
+IMAGE_STEP_MODELS = {
+    'crop': CropRequest,
+    'resize': ResizeRequest,
+    'rotate': TransformRequest,
+    'filters': ApplyFiltersRequest,
+    'compress': CompressRequest,
+}
+MAX_STEPS = 10
+
+# Render resolution the standalone tools use
+DESKEW_DPI = 300
+OCR_DPI = 400
+
+# Output file names inside the job's output directory
+PDF_OUTPUT = "output.pdf"
+OCR_TEXT_OUTPUT = "ocr.txt"
+OCR_JSON_OUTPUT = "ocr.json"
+
+
+def validate_steps(kind: str, steps: List[Dict]) -> List[Dict]:
+    """
+    Check a pipeline definition for a 'pdf' or 'image' input.
+
+    Args:
+        kind: 'pdf' or 'image'
+        steps: [{'op': 'deskew', 'options': {...}}, ...] in execution order
+
+    Returns:
+        The steps with options defaulted to {}
+
+    Raises:
+        ValueError: If a step is unknown, misplaced or has invalid options
+    """
+    allowed = PDF_STEPS if kind == 'pdf' else IMAGE_STEPS
+
+    if not steps:
+        raise ValueError("Pipeline needs at least one step")
+    if len(steps) > MAX_STEPS:
+        raise ValueError(f"Pipeline can have at most {MAX_STEPS} steps")
+
+    normalized = []
+    for index, step in enumerate(steps):
+        op = step.get('op')
+        options = step.get('options') or {}
+
+        if op not in allowed:
+            raise ValueError(f"Unknown {kind} step '{op}'. Allowed: {', '.join(allowed)}")
+
+        unknown = set(options) - allowed[op]
+        if unknown:
+            raise ValueError(f"Unknown option(s) for '{op}': {', '.join(sorted(unknown))}")
+
+        if op == 'compress' and index != len(steps) - 1:
+            raise ValueError("'compress' must be the last step")
+
+        if kind == 'pdf' and any(s['op'] == op for s in normalized):
+            raise ValueError(f"'{op}' can only appear once in a PDF pipeline")
+
+        if kind == 'image':
+            # Check option types as the tool's own endpoint would; keep only
+            # the options given, so equal pipelines share a cache entry
+            try:
+                options = IMAGE_STEP_MODELS[op](**options).dict(exclude_unset=True)
+            except ValidationError as e:
+                raise ValueError(f"Invalid options for '{op}': {e}")
+
+        normalized.append({'op': op, 'options': options})
+
+    if kind == 'pdf':
+        options = {s['op']: s['options'] for s in normalized}
+        language = options.get('ocr', {}).get('language', 'eng')
+        if not isinstance(language, str) or language not in SUPPORTED_LANGUAGES:
+            raise ValueError(f"Unsupported language: {language}")
+        quality = options.get('compress', {}).get('quality', 'medium')
+        if not isinstance(quality, str) or quality not in QUALITY_SETTINGS:
+            raise ValueError(f"Invalid quality: {quality}. Must be 'low', 'medium', or 'high'")
+
+    return normalized
+
+
+def _encode_page(img: Image.Image, dpi: int, compress_settings: Optional[Dict]) -> bytes:
+    if compress_settings is None:
+        # Lossless, like deskew_pdf
+        output = io.BytesIO()
+        img.save(output, format='PNG')
+        return output.getvalue()
+
+    # Downsample to the preset's DPI instead of rendering the page again
+    scale = compress_settings['dpi'] / dpi
+    if scale < 1:
+        img = img.resize(
+            (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+            Image.Resampling.LANCZOS
+        )
+    return encode_page_image(img, compress_settings['image_quality'])
+
+
+def run_pdf_pipeline(
+    input_pdf_path: str,
+    output_dir: str,
+    steps: List[Dict],
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """
+    Run deskew / OCR / compress steps over a PDF, one page at a time.
+
+    Each page is rendered once: at 300 DPI when deskewing (later steps see
+    the deskewed raster), otherwise at the highest DPI any step uses.
+    A PDF is written when a step changes the pages (deskew, compress);
+    OCR writes ocr.txt and ocr.json.
+
+    Args:
+        input_pdf_path: Path to source PDF
+        output_dir: Directory for the output files
+        steps: Validated steps (see validate_steps)
+        progress_callback: Optional callback(current_page, total_pages)
+
+    Returns:
+        dict with per-step results and the output file names
+    """
+    if not os.path.exists(input_pdf_path):
+        raise FileNotFoundError(f"PDF not found: {input_pdf_path}")
+
+    options = {step['op']: step['options'] for step in steps}
+    compress_settings = None
+    if 'compress' in options:
+        compress_settings = QUALITY_SETTINGS[options['compress'].get('quality', 'medium')]
+
+    if 'deskew' in options:
+        dpi = DESKEW_DPI
+    else:
+        dpi = max(
+            OCR_DPI if 'ocr' in options else 0,
+            compress_settings['dpi'] if compress_settings else 0
+        )
+
+    writes_pdf = 'deskew' in options or 'compress' in options
+    language = options.get('ocr', {}).get('language', 'eng')
+
+    doc = fitz.open(input_pdf_path)
+    doc_key = raster_cache.document_key(input_pdf_path)
+    out_doc = fitz.open() if writes_pdf else None
+    total_pages = len(doc)
+    ocr_results = {'total_pages': total_pages, 'language': language, 'pages': []}
+    angles = []
+
+    try:
+        for page_num in range(total_pages):
+            page = doc[page_num]
+            img = raster_cache.page_image(page, dpi, doc_key)
+
+            for step in steps:
+                if step['op'] == 'deskew':
+                    img, angle = deskew_image_with_angle(img)
+                    angles.append(angle)
+                elif step['op'] == 'ocr':
+                    native_text = page.get_text().strip()
+                    ocr_results['pages'].append(
+                        page_result(page_num + 1, native_text, ocr_image(img, language))
+                    )
+
+            if out_doc is not None:
+                rect = page.rect
+                new_page = out_doc.new_page(width=rect.width, height=rect.height)
+                new_page.insert_image(rect, stream=_encode_page(img, dpi, compress_settings))
+
+            if progress_callback:
+                progress_callback(page_num + 1, total_pages)
+
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = {}
+
+        if out_doc is not None:
+            out_doc.save(os.path.join(output_dir, PDF_OUTPUT), garbage=3, deflate=True, clean=True)
+            outputs['document'] = PDF_OUTPUT
+    finally:
+        doc.close()
+        if out_doc is not None:
+            out_doc.close()
+
+    result = {
+        'kind': 'pdf',
+        'steps': [step['op'] for step in steps],
+        'total_pages': total_pages,
+        'render_dpi': dpi,
+        'original_size': os.path.getsize(input_pdf_path)
+    }
+
+    if 'document' in outputs:
+        result['output_size'] = os.path.getsize(os.path.join(output_dir, PDF_OUTPUT))
+
+    if 'deskew' in options:
+        result['deskew'] = {
+            'avg_angle': float(np.mean([abs(a) for a in angles])) if angles else 0.0,
+            'angles_corrected': angles
+        }
+
+    if 'ocr' in options:
+        finalize_results(ocr_results)
+        save_results_as_text(ocr_results, os.path.join(output_dir, OCR_TEXT_OUTPUT))
+        save_results_as_json(ocr_results, os.path.join(output_dir, OCR_JSON_OUTPUT))
+        outputs['text'] = OCR_TEXT_OUTPUT
+        outputs['json'] = OCR_JSON_OUTPUT
+        result['ocr'] = {
+            'language': language,
+            'total_characters': ocr_results['total_characters']
+        }
+
+    if compress_settings:
+        result['compress'] = {'quality': options['compress'].get('quality', 'medium')}
+
+    result['outputs'] = outputs
+    return result
+
+
+def run_image_pipeline(
+    input_path: str,
+    output_dir: str,
+    steps: List[Dict],
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """
+    Run crop / resize / rotate / filters steps on an image and encode it once.
+
+    The final `compress` step (if any) chooses format, quality and size
+    limits; without one the image is saved in its original format at
+    quality 95.
+
+    Args:
+        input_path: Path to source image
+        output_dir: Directory for the output file
+        steps: Validated steps (see validate_steps)
+        progress_callback: Optional callback(steps_done, total_steps)
+
+    Returns:
+        dict with per-step results and the output file name
+    """
+    img = Image.open(input_path)
+    original_format = img.format or 'PNG'
+    original_dimensions = img.size
+    total = len(steps) + (0 if steps[-1]['op'] == 'compress' else 1)
+
+    stages = []
+    for index, step in enumerate(steps):
+        op, opts = step['op'], step['options']
+
+        if op == 'crop':
+            img, info = ImageCropperTool().crop(img, **opts)
+            stages.append({'op': op, **info})
+        elif op == 'resize':
+            img, info = ImageResizerTool().resize(img, **opts)
+            stages.append({'op': op, **info})
+        elif op == 'rotate':
+            img = ImageRotateTool.transform(
+                img, opts.get('rotation', 0), opts.get('flip_h', False), opts.get('flip_v', False)
+            )
+            stages.append({'op': op, **opts})
+        elif op == 'filters':
+            img, applied_filters = ImageFiltersTool().filter_image(img, **opts)
+            stages.append({'op': op, 'applied_filters': applied_filters})
+
+        if op != 'compress' and progress_callback:
+            progress_callback(index + 1, total)
+
+    # Final encode
+    compress = steps[-1]['options'] if steps[-1]['op'] == 'compress' else {}
+    compressor = ImageCompressorTool()
+
+    quality = compress.get('quality', 95)
+    if compress.get('preset') in compressor.QUALITY_PRESETS:
+        quality = compressor.QUALITY_PRESETS[compress['preset']]
+    quality = max(1, min(100, quality))
+
+    target_format = (compress.get('output_format') or original_format).upper()
+    if target_format == 'JPG':
+        target_format = 'JPEG'
+    extension = 'jpg' if target_format == 'JPEG' else target_format.lower()
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_name = f"output.{extension}"
+    output_path = os.path.join(output_dir, output_name)
+
+    img, quality = compressor.compress(
+        img, output_path, target_format, quality,
+        target_size_kb=compress.get('target_size_kb'),
+        max_width=compress.get('max_width'),
+        max_height=compress.get('max_height')
+    )
+
+    if progress_callback:
+        progress_callback(total, total)
+
+    return {
+        'kind': 'image',
+        'steps': [step['op'] for step in steps],
+        'stages': stages,
+        'original_dimensions': original_dimensions,
+        'output_dimensions': img.size,
+        'original_format': original_format,
+        'format': target_format,
+        'quality': quality,
+        'original_size': os.path.getsize(input_path),
+        'output_size': os.path.getsize(output_path),
+        'outputs': {'document': output_name}
+    }
@@ -1,10 +1,15 @@
 import asyncio
+import json
+import signal
+import threading
 from datetime import datetime
+import fitz
 from app.db.session import SessionLocal
 from app.db.models import Job
-from app.services.pdf_engine import pdf_engine
-from app.services.zip_generator import zip_generator
+from app.services.pdf_engine import DEFAULT_QUALITY, pdf_engine
 from app.services.storage import storage
+from app.services.cancellation import JobCancelled, abandon_job, finish_job
+from app.services.progress import ProgressWriter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,46 +18,96 @@ def process_job(job_id: str):
     db = SessionLocal()
     job = db.query(Job).filter(Job.id == job_id).first()
     
-    if not job:
+    if not job or job.status == "cancelled":
         db.close()
         return
 
+    # Paths
+    input_file = job.input_path
+    job_dir = storage.get_job_dir(job_id)
+    output_dir = job_dir / "output"
+    zip_path = job_dir / "pages.zip"
+    owner = job.lease_owner
+    
+    progress_callback = ProgressWriter(db, job_id, owner, update_total=True)
+
     try:
-        job.status = "processing"
+        # Publish the page count before the first page is rendered, so the
+        # results endpoint can show "n of total" from the start
+        with fitz.open(input_file) as doc:
+            job.total_pages = len(doc)
         db.commit()
         
-        # Paths
-        input_file = job.input_path
-        job_dir = storage.get_job_dir(job_id)
-        output_dir = job_dir / "output"
-        
-        # Run conversion (blocking call in async wrapper potentially needed for high load, but ok for MVP)
-        # For true async in FastAPI with CPU bound tasks, run_in_executor is better, 
-        # but for simplicity we run direct since we are in a background task
+        params = json.loads(job.params) if job.params else {}
+        quality = params.get("quality", DEFAULT_QUALITY)
         
-        total_pages, file_paths = pdf_engine.process_pdf(
-            input_path=input_file,
-            output_dir=str(output_dir),
-            dpi=job.dpi,
-            fmt=job.output_format
-        )
+        # Runs on a job queue thread; pages are rendered by executor workers
+        if params.get("zip_only"):
+            # Pages are encoded straight into the archive, no page files
+            total_pages = pdf_engine.render_to_zip(
+                input_path=input_file,
+                zip_path=str(zip_path),
+                dpi=job.dpi,
+                fmt=job.output_format,
+                progress_callback=progress_callback,
+                quality=quality
+            )
+            job.zip_path = str(zip_path)
+        else:
+            total_pages, _ = pdf_engine.process_pdf(
+                input_path=input_file,
+                output_dir=str(output_dir),
+                dpi=job.dpi,
+                fmt=job.output_format,
+                progress_callback=progress_callback,
+                quality=quality
+            )
+            # No pages.zip: the download route streams one from the page files
         
         job.total_pages = total_pages
-        job.processed_pages = total_pages # In MVP we update all at once
-        
-        # Create ZIP if requested
-        # We assume ZIP is always part of requirements for now or could be a flag
-        zip_path = job_dir / "pages.zip"
-        zip_generator.create_zip(file_paths, str(zip_path))
-        job.zip_path = str(zip_path)
+        job.processed_pages = total_pages
+        job.updated_at = datetime.utcnow()
         
-        job.status = "completed"
+        finish_job(db, job, owner, "completed", str(output_dir), str(zip_path))
         
+    except JobCancelled:
+        abandon_job(db, job, owner, str(output_dir), str(zip_path))
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}")
-        job.status = "failed"
         job.error_message = str(e)
-    finally:
         job.updated_at = datetime.utcnow()
-        db.commit()
+        finish_job(db, job, owner, "failed", str(output_dir), str(zip_path))
+    finally:
         db.close()
+
+
+def main():
+    """
+    Standalone queue worker: `python -m app.worker`
+
+    Claims jobs from the shared jobs table and runs them on a local executor.
+    Start as many as needed on any host that shares the database and storage;
+    set JOB_QUEUE_EMBEDDED=false on the API to keep it from processing jobs itself.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    from app.db.session import engine
+    from app.db.schema import upgrade_schema
+    from app.services.executor import executor
+    from app.services.job_queue import job_queue
+
+    upgrade_schema(engine)
+    executor.start()
+    job_queue.start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    stop.wait()
+
+    job_queue.stop()
+    executor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark target-size PDF compression against the grid search it replaced.
+
+Usage (from backend/):
+    python scripts/bench_compress_target.py document.pdf --percent 50,70
+    python scripts/bench_compress_target.py document.pdf --max-mb 2 --no-cache
+
+For each target, runs:
+    grid    the previous search: _compress_with_settings for each of 15
+            DPI/quality settings, then once more for the winner
+    search  compress_pdf's target mode (render once per DPI, bisect quality)
+and prints wall time, full passes over the document and output size.
+The raster cache is pointed at a temporary directory emptied before each
+run; --no-cache disables it, so every pass renders its pages.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.raster_cache import raster_cache  # noqa: E402
+from app.tools.pdf_compressor import _compress_with_settings, compress_pdf  # noqa: E402
+
+GRID = [
+    (72, 30), (72, 40), (72, 50), (72, 60),
+    (100, 45), (100, 55), (100, 65), (100, 75),
+    (150, 60), (150, 70), (150, 80),
+    (200, 70), (200, 80), (200, 90),
+    (300, 85),
+]
+
+
+def grid_search(pdf: str, output_path: str, target_size: float) -> int:
+    """The old _compress_to_target; returns the number of passes."""
+    temp_path = output_path + ".tmp"
+    best, closest = None, None
+    for dpi, quality in GRID:
+        _compress_with_settings(pdf, temp_path, {'dpi': dpi, 'image_quality': quality})
+        size = os.path.getsize(temp_path)
+        if size <= target_size:
+            if not best or size > best[0]:
+                best = (size, dpi, quality)
+        elif not closest or size < closest[0]:
+            closest = (size, dpi, quality)
+
+    _, dpi, quality = best or closest
+    _compress_with_settings(pdf, output_path, {'dpi': dpi, 'image_quality': quality})
+    os.remove(temp_path)
+    return len(GRID) + 1
+
+
+def clear_cache():
+    shutil.rmtree(raster_cache.root, ignore_errors=True)
+    os.makedirs(raster_cache.root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF to compress")
+    parser.add_argument("--percent", default="", help="Comma-separated compress_by_percent targets")
+    parser.add_argument("--max-mb", default="", help="Comma-separated max_file_size_mb targets")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the raster cache")
+    args = parser.parse_args()
+
+    # A private cache directory, emptied before each run
+    raster_cache.root = Path(tempfile.mkdtemp(prefix="bench_raster_cache_"))
+    if args.no_cache:
+        raster_cache.enabled = False
+
+    original_size = os.path.getsize(args.pdf)
+    targets = [("percent", int(p), original_size * (1 - int(p) / 100)) for p in args.percent.split(",") if p]
+    targets += [("max_mb", float(m), float(m) * 1024 * 1024) for m in args.max_mb.split(",") if m]
+    if not targets:
+        parser.error("give --percent and/or --max-mb")
+
+    output_dir = tempfile.mkdtemp(prefix="bench_compress_")
+    output_path = os.path.join(output_dir, "compressed.pdf")
+    print(f"{args.pdf}: {original_size / 1024 / 1024:.1f}MB, raster cache {'off' if args.no_cache else 'on (cleared per run)'}")
+    print(f"{'target':>16} {'method':>7} {'seconds':>9} {'passes':>7} {'size MB':>8} {'setting':>14}")
+    try:
+        for kind, value, target_size in targets:
+            label = f"{kind}={value}"
+
+            clear_cache()
+            start = time.perf_counter()
+            passes = grid_search(args.pdf, output_path, target_size)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(output_path)
+            print(f"{label:>16} {'grid':>7} {elapsed:>9.2f} {passes:>7} {size / 1024 / 1024:>8.2f}")
+
+            clear_cache()
+            start = time.perf_counter()
+            result = compress_pdf(
+                args.pdf, output_path,
+                compress_by_percent=value if kind == "percent" else None,
+                max_file_size_mb=value if kind == "max_mb" else None
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:>16} {'search':>7} {elapsed:>9.2f} {result['passes']:>7} "
+                f"{result['compressed_size'] / 1024 / 1024:>8.2f} {result['quality']:>14}"
+            )
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        shutil.rmtree(raster_cache.root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark the ways of moving a rendered page from PyMuPDF to Pillow/NumPy.
+
+Usage (from backend/):
+    python scripts/bench_pixmap.py document.pdf --dpi 300,400 --pages 5
+
+For each DPI, renders the first --pages pages once and times, per page:
+    png        pix.tobytes("png") + Image.open (the old path)
+    frombytes  Image.frombytes over pix.samples (copies the samples first)
+    image      pixmap_to_image
+    array      pixmap_to_array
+Rendering itself is not included.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app.services.pixmaps import pixmap_to_array, pixmap_to_image  # noqa: E402
+
+
+def via_png(pix):
+    img = Image.open(io.BytesIO(pix.tobytes("png")))
+    img.load()
+    return img
+
+
+def via_frombytes(pix):
+    return Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+
+
+METHODS = {
+    "png": via_png,
+    "frombytes": via_frombytes,
+    "image": pixmap_to_image,
+    "array": pixmap_to_array,
+}
+
+
+def time_method(fn, pixmaps, repeat: int) -> float:
+    """Best of `repeat` runs, in milliseconds per page."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pix in pixmaps:
+            fn(pix)
+        elapsed = (time.perf_counter() - start) / len(pixmaps)
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF to render")
+    parser.add_argument("--dpi", default="300,400", help="Comma-separated DPIs")
+    parser.add_argument("--pages", type=int, default=5, help="Pages rendered per DPI")
+    parser.add_argument("--gray", action="store_true", help="Render grayscale instead of RGB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per method (best is kept)")
+    args = parser.parse_args()
+
+    colorspace = fitz.csGRAY if args.gray else fitz.csRGB
+    doc = fitz.open(args.pdf)
+    pages = min(args.pages, len(doc))
+
+    print(f"{args.pdf}: {pages} pages, {'gray' if args.gray else 'rgb'}")
+    print(f"{'dpi':>5} {'method':>10} {'ms/page':>9} {'vs png':>8}")
+
+    for dpi in (int(d) for d in args.dpi.split(",")):
+        mat = fitz.Matrix(dpi / 72, dpi / 72)
+        pixmaps = [doc.load_page(i).get_pixmap(matrix=mat, colorspace=colorspace) for i in range(pages)]
+
+        baseline = None
+        for name, fn in METHODS.items():
+            ms = time_method(fn, pixmaps, args.repeat)
+            baseline = baseline or ms
+            print(f"{dpi:>5} {name:>10} {ms:>9.2f} {baseline / ms:>7.1f}x")
+
+    doc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark PDFEngine.process_pdf with different numbers of render workers.
+
+Usage (from backend/):
+    python scripts/bench_render.py document.pdf --dpi 300 --workers 1,0
+    python scripts/bench_render.py document.pdf --fmt jpg --quality 80 --zip
+
+Runs the shipped pdf_engine on an executor configured from settings (the
+same EXECUTOR_* and PDF_RENDER_* values as the API), so the speed-up is the
+one a job gets. Worker count 0 is the default sizing from free executor
+capacity; counts above the executor's pdf_to_images capacity only queue.
+
+Prints wall time, pages/s and speed-up over the first worker count for each
+run. Output files are written to a temporary directory and deleted. With
+--zip, pages are encoded straight into a ZIP (render_to_zip) instead.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.executor import executor  # noqa: E402
+from app.services.pdf_engine import DEFAULT_QUALITY, IMAGE_FORMATS, PDFEngine, pdf_engine  # noqa: E402
+
+
+def run(engine: PDFEngine, args, workers: int) -> float:
+    output_dir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        start = time.perf_counter()
+        if args.zip:
+            engine.render_to_zip(
+                args.pdf, os.path.join(output_dir, "pages.zip"),
+                dpi=args.dpi, fmt=args.fmt, workers=workers, quality=args.quality
+            )
+        else:
+            engine.process_pdf(args.pdf, output_dir, dpi=args.dpi, fmt=args.fmt, workers=workers, quality=args.quality)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF to render")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--fmt", default="png", choices=IMAGE_FORMATS)
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY, help="JPEG/WebP quality")
+    parser.add_argument("--zip", action="store_true", help="Render straight into a ZIP")
+    parser.add_argument("--workers", default="1,0", help="Comma-separated worker counts (0 = automatic)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per worker count (best is kept)")
+    args = parser.parse_args()
+
+    import fitz
+    with fitz.open(args.pdf) as doc:
+        total_pages = len(doc)
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+
+    executor.start()
+    print(f"{args.pdf}: {total_pages} pages at {args.dpi} DPI ({args.fmt}), {os.cpu_count()} CPUs")
+    print(
+        f"executor: {executor.max_workers} workers, pdf_to_images limit {executor.limit_for('pdf_to_images')}, "
+        f"shards from {pdf_engine.parallel_min_pages} pages"
+    )
+    # Untimed run first, so the pool's workers starting up is not measured
+    run(pdf_engine, args, 0)
+
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speed-up':>9}")
+
+    baseline = None
+    for workers in worker_counts:
+        elapsed = min(run(pdf_engine, args, workers) for _ in range(args.repeat))
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {total_pages / elapsed:>9.1f} {baseline / elapsed:>8.2f}x")
+
+    executor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -72,25 +72,26 @@ export default function CompressPdfPage() {
 
             setProcessing(true);
 
-            const pollInterval = setInterval(async () => {
+            const stopWatching = api.watchJob(response.job_id, async (event) => {
+                if (event.status === 'queued' || event.status === 'pending' || event.status === 'processing') return;
+                stopWatching();
                 try {
                     const status = await api.getCompressJobStatus(response.job_id);
-
                     if (status.status === 'completed') {
-                        clearInterval(pollInterval);
                         setProcessing(false);
                         setResult(status);
-                    } else if (status.status === 'failed') {
-                        clearInterval(pollInterval);
+                    } else {
                         setError(status.error || 'Compression failed');
                         setProcessing(false);
                     }
                 } catch (err) {
-                    clearInterval(pollInterval);
                     setError('Failed to check status');
                     setProcessing(false);
                 }
-            }, 1500);
+            }, () => {
+                setError('Failed to check status');
+                setProcessing(false);
+            });
         } catch (err) {
             setError(err instanceof Error ? err.message : 'Upload failed');
             setUploading(false);
@@ -124,24 +124,26 @@ export default function OrganizePdfPage() {
             const pageOrder = pages.map(p => p.number - 1);
             await api.processOrganizePdf(jobId, pageOrder);
 
-            const pollInterval = setInterval(async () => {
+            const stopWatching = api.watchJob(jobId, async (event) => {
+                if (event.status === 'queued' || event.status === 'pending' || event.status === 'processing') return;
+                stopWatching();
                 try {
                     const status = await api.getOrganizeJobStatus(jobId);
                     if (status.status === 'completed') {
-                        clearInterval(pollInterval);
                         setProcessing(false);
                         setResult(status);
-                    } else if (status.status === 'failed') {
-                        clearInterval(pollInterval);
+                    } else {
                         setError(status.error || 'Organization failed');
                         setProcessing(false);
                     }
                 } catch (err) {
-                    clearInterval(pollInterval);
                     setError('Failed to check status');
                     setProcessing(false);
                 }
-            }, 1500);
+            }, () => {
+                setError('Failed to check status');
+                setProcessing(false);
+            });
         } catch (err) {
             setError(err instanceof Error ? err.message : 'Processing failed');
             setProcessing(false);
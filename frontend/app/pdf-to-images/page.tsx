@@ -13,28 +13,28 @@ export default function PdfToImagesPage() {
     const [error, setError] = useState<string | null>(null);
     const [isDragging, setIsDragging] = useState(false);
 
-    // Poll for job status
+    // Watch job status (pushed by the server)
     const pollJobStatus = useCallback(async (jobId: string) => {
-        const intervalId = setInterval(async () => {
-            try {
-                const status = await api.getJobStatus(jobId);
-                setJob(status);
+        const stopWatching = api.watchJob(jobId, async (event) => {
+            setJob((current) => current ? { ...current, status: event.status as Job['status'], progress: event.progress ?? current.progress, error: event.error } : current);
 
-                if (status.status === 'completed') {
-                    clearInterval(intervalId);
+            if (event.status === 'completed') {
+                stopWatching();
+                try {
                     const jobResults = await api.getJobResults(jobId);
                     setResults(jobResults);
-                } else if (status.status === 'failed') {
-                    clearInterval(intervalId);
-                    setError(status.error || 'Processing failed');
+                } catch (err) {
+                    setError('Failed to load results');
                 }
-            } catch (err) {
-                clearInterval(intervalId);
-                setError('Failed to check job status');
+            } else if (event.status !== 'queued' && event.status !== 'processing') {
+                stopWatching();
+                setError(event.error || 'Processing failed');
             }
-        }, 1500);
+        }, () => {
+            setError('Failed to check job status');
+        });
 
-        return () => clearInterval(intervalId);
+        return stopWatching;
     }, []);
 
     // Handle file upload
@@ -1,9 +1,11 @@
 // API client for Tools24Now backend
 
-import type { Job, JobResults, CreateJobResponse, MergeJobResponse, FileItem } from './types';
+import type { Job, JobEvent, JobResults, CreateJobResponse, MergeJobResponse, FileItem } from './types';
 
 export const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:9000/api/v1';
 
+const TERMINAL_JOB_STATUSES = ['completed', 'failed', 'cancelled', 'expired', 'not_found'];
+
 class APIClient {
     private baseURL: string;
 
@@ -31,6 +33,68 @@ class APIClient {
         return response.json();
     }
 
+    /**
+     * Watch any tool job for status/progress changes.
+     * Uses Server-Sent Events, falling back to long-polling if the stream fails.
+     * Calls onError if the job cannot be watched at all. Returns a function that stops watching.
+     */
+    watchJob(jobId: string, onEvent: (event: JobEvent) => void, onError?: (err: Error) => void): () => void {
+        let stopped = false;
+        let source: EventSource | null = null;
+
+        const stop = () => {
+            stopped = true;
+            source?.close();
+        };
+
+        const longPoll = async (version: string) => {
+            while (!stopped) {
+                const response = await fetch(`${this.baseURL}/jobs/${jobId}/wait?version=${version}&timeout=25`);
+                if (!response.ok) {
+                    throw new Error(response.status === 404 ? 'Job not found' : `HTTP ${response.status}`);
+                }
+                const event: JobEvent = await response.json();
+                if (stopped) return;
+                if (event.version !== version) {
+                    version = event.version;
+                    onEvent(event);
+                }
+                if (TERMINAL_JOB_STATUSES.includes(event.status)) return;
+            }
+        };
+
+        const fallback = (version: string) => {
+            longPoll(version).catch((err) => {
+                if (!stopped) onError?.(err instanceof Error ? err : new Error('Failed to check status'));
+            });
+        };
+
+        if (typeof EventSource === 'undefined') {
+            fallback('');
+            return stop;
+        }
+
+        let lastVersion = '';
+        source = new EventSource(`${this.baseURL}/jobs/${jobId}/events`);
+        source.addEventListener('status', (message) => {
+            const event: JobEvent = JSON.parse((message as MessageEvent).data);
+            lastVersion = event.version;
+            if (TERMINAL_JOB_STATUSES.includes(event.status)) {
+                // Close before the server ends the stream so EventSource does not reconnect
+                source?.close();
+            }
+            if (!stopped) onEvent(event);
+        });
+        source.onerror = () => {
+            // Stream dropped or never opened (proxy, 404): long-polling picks up
+            // from the last version seen and reports errors properly
+            source?.close();
+            if (!stopped) fallback(lastVersion);
+        };
+
+        return stop;
+    }
+
     /**
      * Get job status (for polling)
      */
@@ -133,7 +197,7 @@ class APIClient {
      * Get thumbnail URL for a specific page
      */
     getThumbnailURL(jobId: string, pageNumber: number): string {
-        const filename = `thumb_${String(pageNumber).padStart(4, '0')}.png`;
+        const filename = `thumb_${String(pageNumber).padStart(4, '0')}.webp`;
         return `${this.baseURL}/organize-pdf/jobs/${jobId}/thumbnails/${filename}`;
     }
 
@@ -220,7 +284,8 @@ class APIClient {
         file: File,
         quality: string,
         compressByPercent?: number,
-        maxFileSizeMb?: number
+        maxFileSizeMb?: number,
+        method?: 'rasterize' | 'images' | 'lossless'
     ): Promise<CreateJobResponse> {
         const formData = new FormData();
         formData.append('file', file);
@@ -232,6 +297,9 @@ class APIClient {
         if (maxFileSizeMb) {
             formData.append('max_file_size_mb', maxFileSizeMb.toString());
         }
+        if (method) {
+            formData.append('method', method);
+        }
 
         const response = await fetch(`${this.baseURL}/compress-pdf/jobs`, {
             method: 'POST',
@@ -260,6 +328,19 @@ class APIClient {
         }
     }
 
+    /**
+     * Estimated output size of each quality preset, before processing
+     */
+    async estimateCompressPdf(jobId: string): Promise<any> {
+        const response = await fetch(`${this.baseURL}/compress-pdf/jobs/${jobId}/estimate`);
+
+        if (!response.ok) {
+            throw new Error(`Failed to estimate compression: ${response.status}`);
+        }
+
+        return response.json();
+    }
+
     /**
      * Get compress job status with compression info
      */
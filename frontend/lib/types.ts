@@ -14,6 +14,18 @@ export interface Job {
     expires_at: string;
 }
 
+export interface JobEvent {
+    job_id: string;
+    version: string;
+    status: string;
+    progress?: {
+        percent: number;
+        processed_pages?: number;
+        total_pages?: number;
+    };
+    error?: string | null;
+}
+
 export interface JobResults {
     job_id: string;
     status: string;